@@ -0,0 +1,140 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import FrozenSet, List, Optional, Tuple
+import numpy as np
+from models import ChatResponse
+
+logger = logging.getLogger(__name__)
+
+
+class _CacheEntry:
+    __slots__ = ("slot", "scope", "chunk_ids", "document_ids", "response", "created_at")
+
+    def __init__(self, slot: int, scope: Tuple[str, ...], chunk_ids: FrozenSet[str],
+                 document_ids: FrozenSet[str], response: ChatResponse, created_at: float):
+        self.slot = slot
+        self.scope = scope
+        self.chunk_ids = chunk_ids
+        self.document_ids = document_ids
+        self.response = response
+        self.created_at = created_at
+
+
+class AnswerCache:
+    """
+    Semantic cache of chat answers keyed by question embedding.
+
+    A lookup hits when a past question is at least `threshold` cosine-similar,
+    was asked against the same document filter, and retrieval returned the
+    same set of chunks, so the cached answer was grounded in exactly the
+    context Claude would see now. Embeddings live in one preallocated matrix,
+    so a lookup is a single matrix-vector product.
+
+    Entries are evicted least-recently-used beyond `max_entries` and expire
+    after `ttl` seconds. Deleting a document drops every answer citing it.
+    """
+
+    def __init__(self, dimension: int = 384, max_entries: int = 1000, threshold: float = 0.95, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((max_entries, dimension), dtype=np.float32)
+        self._active = np.zeros(max_entries, dtype=bool)
+        self._entries: "OrderedDict[int, _CacheEntry]" = OrderedDict()
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _scope(document_ids: Optional[List[str]]) -> Tuple[str, ...]:
+        return tuple(sorted(document_ids)) if document_ids else ()
+
+    def lookup(self, embedding: List[float], document_ids: Optional[List[str]], chunk_ids: List[str]) -> Optional[ChatResponse]:
+        query = self._normalize(embedding)
+        scope = self._scope(document_ids)
+        chunk_set = frozenset(chunk_ids)
+        now = time.time()
+
+        with self._lock:
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            scores = self._matrix @ query
+            scores[~self._active] = -1.0
+            for slot in np.argsort(scores)[::-1]:
+                if scores[slot] < self.threshold:
+                    break
+                entry = self._entries[int(slot)]
+                if now - entry.created_at > self.ttl:
+                    self._evict(entry.slot)
+                    continue
+                if entry.scope == scope and entry.chunk_ids == chunk_set:
+                    self._entries.move_to_end(entry.slot)
+                    self.hits += 1
+                    return entry.response
+
+            self.misses += 1
+            return None
+
+    def store(self, embedding: List[float], document_ids: Optional[List[str]], response: ChatResponse):
+        # Only cache grounded answers; error replies come back without sources
+        if not response.sources:
+            return
+        chunk_ids = frozenset(s.chunk_id for s in response.sources if s.chunk_id)
+        if not chunk_ids:
+            return
+
+        with self._lock:
+            if not self._free_slots:
+                oldest = next(iter(self._entries))
+                self._evict(oldest)
+            slot = self._free_slots.pop()
+            self._matrix[slot] = self._normalize(embedding)
+            self._active[slot] = True
+            self._entries[slot] = _CacheEntry(
+                slot,
+                self._scope(document_ids),
+                chunk_ids,
+                frozenset(s.document_id for s in response.sources),
+                response,
+                time.time()
+            )
+
+    def _evict(self, slot: int):
+        self._entries.pop(slot, None)
+        self._active[slot] = False
+        self._free_slots.append(slot)
+
+    def invalidate_documents(self, document_ids: List[str]) -> int:
+        """
+        Drop cached answers that cite any of the given documents.
+        """
+        targets = set(document_ids)
+        with self._lock:
+            stale = [slot for slot, entry in self._entries.items() if entry.document_ids & targets]
+            for slot in stale:
+                self._evict(slot)
+        if stale:
+            logger.info(f"Invalidated {len(stale)} cached answers")
+        return len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
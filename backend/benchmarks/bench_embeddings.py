@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+"""
+Compare embedding backends: PyTorch sentence-transformers vs ONNX Runtime
+(fp32 and int8). Each backend runs in its own process so load time and peak
+RSS are measured in isolation; embeddings are then compared against the
+PyTorch vectors by cosine similarity.
+
+Export the ONNX models first (from the backend directory):
+    python embeddings.py ./data/onnx/all-MiniLM-L6-v2
+then:
+    python benchmarks/bench_embeddings.py --onnx-dir ./data/onnx/all-MiniLM-L6-v2 --threads 4
+"""
+
+import os
+import sys
+import time
+import json
+import random
+import argparse
+import resource
+import tempfile
+import statistics
+import subprocess
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+WORDS = ("the model results suggest retrieval quality depends on chunk size overlap and embedding "
+         "choice for research documents with tables figures methods and related work").split()
+
+
+def make_texts(n: int, n_words: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(n_words)) for _ in range(n)]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def run_backend(args):
+    """Child process: load one backend, time it, and save its embeddings."""
+    start = time.perf_counter()
+    if args.backend == "torch":
+        from embeddings import SentenceTransformerBackend
+        if args.threads:
+            import torch
+            torch.set_num_threads(args.threads)
+        model = SentenceTransformerBackend(args.torch_model)
+    else:
+        from embeddings import OnnxBackend
+        model = OnnxBackend(args.onnx_dir, quantized=args.backend == "onnx-int8", threads=args.threads)
+    load_seconds = time.perf_counter() - start
+
+    chunks = make_texts(args.chunks, 600)
+    queries = make_texts(args.queries, 12, seed=1)
+
+    model.encode(chunks[:4])  # warm-up
+    start = time.perf_counter()
+    chunk_embeddings = np.asarray(model.encode(chunks), dtype=np.float32)
+    ingest_seconds = time.perf_counter() - start
+
+    latencies = []
+    query_embeddings = []
+    for query in queries:
+        start = time.perf_counter()
+        query_embeddings.append(np.asarray(model.encode([query]), dtype=np.float32)[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    np.save(os.path.join(args.out, f"{args.backend}_chunks.npy"), chunk_embeddings)
+    np.save(os.path.join(args.out, f"{args.backend}_queries.npy"), np.vstack(query_embeddings))
+    print(json.dumps({
+        "load_s": load_seconds,
+        "chunks_per_s": len(chunks) / ingest_seconds,
+        "query_p50_ms": statistics.median(latencies),
+        "query_p99_ms": float(np.percentile(latencies, 99)),
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--onnx-dir", default="./data/onnx/all-MiniLM-L6-v2")
+    parser.add_argument("--torch-model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--chunks", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        return run_backend(args)
+
+    out = tempfile.mkdtemp(prefix="bench_embeddings_")
+    results = {}
+    for backend in args.backends.split(","):
+        cmd = [sys.executable, os.path.abspath(__file__), "--backend", backend, "--out", out,
+               "--onnx-dir", args.onnx_dir, "--torch-model", args.torch_model,
+               "--chunks", str(args.chunks), "--queries", str(args.queries)]
+        if args.threads:
+            cmd += ["--threads", str(args.threads)]
+        proc = subprocess.run(cmd, capture_output=True, text=True, cwd=BACKEND_DIR)
+        if proc.returncode != 0:
+            print(f"{backend}: failed\n{proc.stderr[-2000:]}")
+            continue
+        results[backend] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    reference = "torch" if "torch" in results else None
+    print(f"{'backend':<10} {'load s':>7} {'chunks/s':>9} {'q p50 ms':>9} {'q p99 ms':>9} {'RSS MB':>8} {'cos mean':>9} {'cos min':>8}")
+    for backend, r in results.items():
+        agreement = ""
+        if reference and backend != reference:
+            cos = np.concatenate([
+                cosine_rows(np.load(os.path.join(out, f"{backend}_{kind}.npy")),
+                            np.load(os.path.join(out, f"{reference}_{kind}.npy")))
+                for kind in ("chunks", "queries")
+            ])
+            agreement = f"{cos.mean():>9.5f} {cos.min():>8.5f}"
+        print(f"{backend:<10} {r['load_s']:>7.2f} {r['chunks_per_s']:>9.1f} {r['query_p50_ms']:>9.2f} "
+              f"{r['query_p99_ms']:>9.2f} {r['peak_rss_mb']:>8.0f} {agreement}")
+
+
+if __name__ == "__main__":
+    main()
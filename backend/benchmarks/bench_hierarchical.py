@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+"""
+Compare flat chunk search with hierarchical document-then-chunk search:
+recall@k against exact (brute-force) nearest neighbours, and query latency.
+
+Two corpora are supported:
+  * synthetic (default): clustered unit vectors inserted directly into a
+    throwaway Chroma store, documents drawn around topic centroids and
+    chunks around their document, queries perturbed copies of random chunks
+  * --pdf-dir: every PDF in a directory, chunked and embedded with the
+    configured embedding backend; queries are sentences sampled from them
+
+Run from the backend directory:
+    python benchmarks/bench_hierarchical.py --documents 2000 --chunks-per-doc 30 --top-docs 10,25,50,100
+    python benchmarks/bench_hierarchical.py --pdf-dir ../sources --top-docs 5,10,20
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from typing import Dict, List
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from vector_store import VectorStore
+from document_processor import PDFProcessor
+
+
+def build_synthetic(store: VectorStore, args, rng: np.random.Generator) -> List[np.ndarray]:
+    """Insert a clustered corpus and return query vectors."""
+    def unit(x):
+        return x / np.linalg.norm(x, axis=-1, keepdims=True)
+
+    topics = unit(rng.standard_normal((args.topics, args.dim)))
+    chunk_vectors = []
+    batch_ids, batch_vectors, batch_meta = [], [], []
+    for d in range(args.documents):
+        center = unit(topics[rng.integers(args.topics)] + args.doc_spread * unit(rng.standard_normal(args.dim)))
+        chunks = unit(center + args.chunk_spread * unit(rng.standard_normal((args.chunks_per_doc, args.dim))))
+        chunk_vectors.append(chunks)
+        for i, vector in enumerate(chunks):
+            batch_ids.append(f"doc{d}-chunk{i}")
+            batch_vectors.append(vector.tolist())
+            batch_meta.append({"document_id": f"doc{d}", "document_name": f"doc{d}.pdf", "chunk_index": i,
+                               "start_char": 0, "end_char": 0, "file_type": "pdf"})
+        if len(batch_ids) >= 2000 or d == args.documents - 1:
+            store.collection.add(ids=batch_ids, embeddings=batch_vectors, metadatas=batch_meta,
+                                 documents=[""] * len(batch_ids))
+            batch_ids, batch_vectors, batch_meta = [], [], []
+
+    all_chunks = np.vstack(chunk_vectors)
+    picks = rng.integers(len(all_chunks), size=args.queries)
+    return list(unit(all_chunks[picks] + args.query_noise * unit(rng.standard_normal((args.queries, args.dim)))))
+
+
+def build_from_pdfs(store: VectorStore, args, rng: np.random.Generator) -> List[np.ndarray]:
+    processor = PDFProcessor(tempfile.mkdtemp())
+    sentences = []
+    for name in sorted(os.listdir(args.pdf_dir)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        document = processor.process_pdf(os.path.join(args.pdf_dir, name), name)
+        store.add_document(document)
+        for chunk in document.chunks:
+            sentences.extend(s for s in chunk.content.split(". ") if len(s.split()) >= 8)
+    picks = rng.choice(len(sentences), size=min(args.queries, len(sentences)), replace=False)
+    return [np.asarray(v, dtype=np.float32) for v in store.embedding_model.encode([sentences[i] for i in picks])]
+
+
+def exact_top_k(store: VectorStore, queries: List[np.ndarray], k: int) -> List[set]:
+    data = store.collection.get(include=["embeddings"])
+    ids = np.array(data["ids"])
+    matrix = np.asarray(data["embeddings"], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    truth = []
+    for query in queries:
+        scores = matrix @ (query / np.linalg.norm(query))
+        truth.append(set(ids[np.argpartition(-scores, k)[:k]]))
+    return truth
+
+
+def measure(store: VectorStore, queries, truth, k: int, top_docs: int) -> Dict[str, float]:
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        results = store.search("", n_results=k, query_embedding=query.tolist(), top_documents=top_docs)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len({r.chunk_id for r in results} & expected) / k)
+    ms = np.array(latencies) * 1000
+    return {"recall": float(np.mean(recalls)), "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", help="benchmark on real PDFs instead of synthetic vectors")
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--chunks-per-doc", type=int, default=30)
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--doc-spread", type=float, default=0.8, help="document distance from its topic")
+    parser.add_argument("--chunk-spread", type=float, default=0.6, help="chunk distance from its document")
+    parser.add_argument("--query-noise", type=float, default=0.5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--top-docs", default="10,25,50,100", help="route sizes to compare")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    random.seed(args.seed)
+    store = VectorStore(tempfile.mkdtemp(prefix="able2_hier_"))
+
+    start = time.perf_counter()
+    queries = build_from_pdfs(store, args, rng) if args.pdf_dir else build_synthetic(store, args, rng)
+    indexed = store.rebuild_document_index()
+    print(f"Indexed {store.get_chunk_count()} chunks in {indexed} documents "
+          f"({time.perf_counter() - start:.1f}s), {len(queries)} queries, k={args.k}")
+
+    truth = exact_top_k(store, queries, args.k)
+    # Warm up Chroma's caches so the first configuration is not penalized
+    measure(store, queries[:10], truth[:10], args.k, 0)
+
+    print(f"{'search':<16} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for top_docs in [0] + [int(m) for m in args.top_docs.split(",")]:
+        r = measure(store, queries, truth, args.k, top_docs)
+        label = "flat" if top_docs == 0 else f"top {top_docs} docs"
+        print(f"{label:<16} {r['recall']:>9.3f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
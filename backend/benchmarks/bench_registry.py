@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+"""
+Resident memory of the in-memory document registry, before and after
+records replaced full Documents.
+
+Builds a throwaway metadata store of synthetic documents, then loads it in a
+fresh interpreter per mode and reports the growth in RSS, also after
+malloc_trim() hands memory freed while parsing back to the OS (glibc only):
+  * documents: what DocumentManager used to hold, a Pydantic Document with
+    every chunk per document plus a DocumentSummary for the listing
+  * records: the slotted DocumentRecord registry it holds now
+Both include the sorted listing keys.
+
+Run from the backend directory (Linux, reads /proc/self/statm):
+    python benchmarks/bench_registry.py --documents 5000 --chunks-per-doc 20
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import uuid
+import random
+import ctypes
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from models import Document, DocumentChunk, DocumentSummary
+from metadata_store import MetadataStore
+
+WORDS = ("retrieval augmented generation improves factual accuracy when the retrieved passages are "
+         "relevant diverse and concise while chunk size overlap and ranking strategy all affect").split()
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def trimmed_rss_bytes() -> int:
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+    return rss_bytes()
+
+
+def build_store(path: str, documents: int, chunks_per_doc: int, words_per_chunk: int, streamed_share: float):
+    store = MetadataStore(path)
+    start = datetime.now() - timedelta(days=30)
+    batch = []
+    for d in range(documents):
+        doc_id = str(uuid.uuid4())
+        # Streamed documents keep text for their first three chunks only
+        keep = 3 if random.random() < streamed_share else chunks_per_doc
+        chunks = [
+            DocumentChunk(
+                id=str(uuid.uuid4()), document_id=doc_id,
+                content=" ".join(random.choices(WORDS, k=words_per_chunk)) if i < keep else "",
+                chunk_index=i, start_char=i * 3000, end_char=i * 3000 + 3600,
+                page_start=i + 1, page_end=i + 2,
+            )
+            for i in range(chunks_per_doc)
+        ]
+        batch.append(Document(
+            id=doc_id, name=f"paper-{d}.pdf", file_type="pdf", file_path=f"./sources/{doc_id}.pdf",
+            summary=" ".join(random.choices(WORDS, k=40))[:300], chunks=chunks,
+            created_at=start + timedelta(seconds=d), file_size=random.randrange(10**5, 10**7),
+        ))
+        if len(batch) >= 500:
+            store.put_many(batch)
+            batch = []
+    if batch:
+        store.put_many(batch)
+    store.close()
+
+
+def measure(path: str, mode: str) -> dict:
+    """Runs in a fresh interpreter: load the registry one way and report RSS growth."""
+    store = MetadataStore(path)
+    gc.collect()
+    before = rss_bytes()
+    started = time.perf_counter()
+
+    if mode == "documents":
+        with store._transaction(write=False) as cur:
+            rows = cur.execute("SELECT id, data FROM documents").fetchall()
+        registry = {doc_id: store._deserialize(data) for doc_id, data in rows}
+        del rows
+        summaries = {
+            doc_id: DocumentSummary(id=doc.id, name=doc.name, file_type=doc.file_type, summary=doc.summary,
+                                    created_at=doc.created_at, file_size=doc.file_size)
+            for doc_id, doc in registry.items()
+        }
+    else:
+        registry, _ = store.load_records()
+        summaries = None
+    sort_keys = sorted((-doc.created_at.timestamp(), doc.id) for doc in registry.values())
+
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    grown = rss_bytes() - before
+    trimmed = trimmed_rss_bytes() - before
+    return {"mode": mode, "documents": len(registry), "load_s": elapsed,
+            "rss_mb": grown / 2**20, "trimmed_rss_mb": trimmed / 2**20,
+            "mb_per_1k": trimmed / 2**20 * 1000 / max(len(registry), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=5000)
+    parser.add_argument("--chunks-per-doc", type=int, default=20)
+    parser.add_argument("--words-per-chunk", type=int, default=600)
+    parser.add_argument("--streamed-share", type=float, default=0.0,
+                        help="fraction of documents ingested in streaming mode (chunk text mostly dropped)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--measure", nargs=2, metavar=("DB", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure)))
+        return
+
+    random.seed(args.seed)
+    path = os.path.join(tempfile.mkdtemp(prefix="able2_registry_"), "document_metadata.db")
+    started = time.perf_counter()
+    build_store(path, args.documents, args.chunks_per_doc, args.words_per_chunk, args.streamed_share)
+    print(f"Built {args.documents} documents x {args.chunks_per_doc} chunks "
+          f"({os.path.getsize(path) / 2**20:.0f} MB on disk, {time.perf_counter() - started:.1f}s)")
+
+    print(f"{'registry':<10} {'RSS MB':>8} {'trimmed':>8} {'MB/1k docs':>11} {'load s':>7}")
+    for mode in ("documents", "records"):
+        output = subprocess.run([sys.executable, __file__, "--measure", path, mode],
+                                capture_output=True, text=True, check=True).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<10} {r['rss_mb']:>8.1f} {r['trimmed_rss_mb']:>8.1f} {r['mb_per_1k']:>11.2f} {r['load_s']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark JSON encoding, field projection and gzip compression for the
+/chat and /documents payloads.
+
+Run from the backend directory:
+    python benchmarks/bench_responses.py
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import random
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+
+from models import ChatResponse, SourceInfo, DocumentSummary
+from serialization import orjson, parse_fields, project, project_list
+
+WORDS = "the model results suggest retrieval quality depends on chunk size overlap and embedding choice".split()
+
+
+def random_text(n_words: int) -> str:
+    return " ".join(random.choice(WORDS) for _ in range(n_words))
+
+
+def make_chat_response(n_sources: int = 5) -> ChatResponse:
+    return ChatResponse(
+        answer=random_text(250),
+        sources=[
+            SourceInfo(
+                document_id=f"doc-{i}",
+                document_name=f"Paper {i}.pdf",
+                chunk_content=random_text(600),
+                relevance_score=random.random(),
+                chunk_id=f"chunk-{i}",
+                chunk_index=i,
+                page_start=i + 1,
+                page_end=i + 2
+            )
+            for i in range(n_sources)
+        ],
+        timestamp=datetime.now()
+    )
+
+
+def make_documents(n_docs: int = 1000):
+    return [
+        DocumentSummary(
+            id=f"doc-{i}",
+            name=f"Paper {i}.pdf",
+            file_type="pdf",
+            summary=random_text(50),
+            created_at=datetime.now(),
+            file_size=random.randint(10_000, 5_000_000)
+        )
+        for i in range(n_docs)
+    ]
+
+
+def timeit(fn, repeat: int = 200) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def report(label: str, data) -> None:
+    stdlib = lambda: json.dumps(jsonable_encoder(data)).encode()
+    body = stdlib()
+    print(f"\n{label}")
+    print(f"  stdlib json (jsonable_encoder): {timeit(stdlib):7.3f} ms  {len(body):>9,} bytes")
+    if orjson is not None:
+        fast = lambda: orjson.dumps(data)
+        print(f"  orjson:                         {timeit(fast):7.3f} ms  {len(fast()):>9,} bytes")
+    for level in (1, 5, 9):
+        compress = lambda: gzip.compress(body, compresslevel=level)
+        print(f"  gzip level {level}:                   {timeit(compress, 50):7.3f} ms  {len(compress()):>9,} bytes")
+
+
+def main():
+    random.seed(0)
+
+    chat = make_chat_response()
+    report("/chat (full sources)", chat.dict())
+    report("/chat fields=answer,sources.document_name,sources.page_start",
+           project(chat.dict(), parse_fields("answer,sources.document_name,sources.page_start")))
+
+    documents = [doc.dict() for doc in make_documents()]
+    report("/documents (1000 documents)", documents)
+    report("/documents fields=id,name", project_list(documents, parse_fields("id,name")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+"""
+Minimal local stand-in for the Anthropic Messages API.
+
+Answers POST /v1/messages after a configurable latency and can be told to
+reject a fraction of requests with 429 (plus retry-after) or 529 overloaded
+errors. Used to exercise the request scheduler and by the load-test harness;
+point ClaudeClient at it with ANTHROPIC_BASE_URL=http://127.0.0.1:<port>.
+
+    python benchmarks/fake_claude_api.py --port 8765 --latency 0.5 --rate-limit 0.2
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeClaudeAPI:
+    def __init__(self, latency: float = 0.0, rate_limit_fraction: float = 0.0,
+                 overload_fraction: float = 0.0, retry_after: float = 1.0):
+        self.latency = latency
+        self.rate_limit_fraction = rate_limit_fraction
+        self.overload_fraction = overload_fraction
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.counts = {"ok": 0, "rate_limited": 0, "overloaded": 0}
+        self.server = None
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, headers=None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("content-length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                roll = random.random()
+
+                if roll < api.rate_limit_fraction:
+                    with api.lock:
+                        api.counts["rate_limited"] += 1
+                    return self._send(429, {
+                        "type": "error",
+                        "error": {"type": "rate_limit_error", "message": "Rate limited"}
+                    }, {"retry-after": str(api.retry_after)})
+
+                if roll < api.rate_limit_fraction + api.overload_fraction:
+                    with api.lock:
+                        api.counts["overloaded"] += 1
+                    return self._send(529, {
+                        "type": "error",
+                        "error": {"type": "overloaded_error", "message": "Overloaded"}
+                    })
+
+                time.sleep(api.latency)
+                prompt = request.get("messages", [{}])[0].get("content", "")
+                with api.lock:
+                    api.counts["ok"] += 1
+                self._send(200, {
+                    "id": "msg_fake",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": request.get("model", "fake"),
+                    "content": [{"type": "text", "text": f"Stub answer for a {len(prompt)}-character prompt."}],
+                    "stop_reason": "end_turn",
+                    "stop_sequence": None,
+                    "usage": {"input_tokens": len(prompt) // 4, "output_tokens": 12}
+                })
+
+        return Handler
+
+    def start(self, port: int = 0) -> str:
+        """Serve in a background thread and return the base URL."""
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per successful response")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--overload", type=float, default=0.0, help="fraction of requests answered with 529")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    api = FakeClaudeAPI(args.latency, args.rate_limit, args.overload, args.retry_after)
+    print(f"Fake Claude API listening on {api.start(args.port)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
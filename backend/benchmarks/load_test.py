@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+"""
+End-to-end HTTP load test for the Able2 API.
+
+Starts the fake Claude API (benchmarks/fake_claude_api.py) and the real app
+under uvicorn pointed at it through ANTHROPIC_BASE_URL, with throwaway data
+directories, then drives a mix of synthetic PDF uploads, chats and document
+listings at a fixed concurrency. Reports throughput, p50/p99 latency and
+error rate per endpoint, and can compare against a saved run. Executor pool
+queue depth and wait times from /metrics are printed after the run.
+
+Run from the backend directory (needs httpx and the app's dependencies):
+    python benchmarks/load_test.py --concurrency 16 --duration 60 --llm-latency 1.5 --save run.json
+    python benchmarks/load_test.py --concurrency 16 --duration 60 --compare run.json
+Or target a server that is already running:
+    python benchmarks/load_test.py --url http://localhost:8000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_claude_api import FakeClaudeAPI
+
+WORDS = ("retrieval augmented generation improves factual accuracy when the retrieved passages are "
+         "relevant diverse and concise while chunk size overlap and ranking strategy all affect "
+         "latency cost and answer quality in research assistants").split()
+
+QUESTIONS = [
+    "What are the main findings?",
+    "Summarize the methodology.",
+    "How does chunk size affect answer quality?",
+    "What limitations do the authors mention?",
+    "Which ranking strategy performed best?",
+]
+
+
+def make_pdf(pages: int, words_per_page: int = 400) -> bytes:
+    """Build a text PDF with PyMuPDF, the same library the app parses with."""
+    import fitz
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        text = " ".join(random.choice(WORDS) for _ in range(words_per_page))
+        page.insert_textbox(fitz.Rect(36, 36, 576, 806), text, fontsize=8)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, duration: float) -> Dict[str, Dict[str, float]]:
+        report = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            ms = np.array(values) * 1000
+            report[endpoint] = {
+                "requests": len(values),
+                "throughput_rps": len(values) / duration,
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p99_ms": float(np.percentile(ms, 99)),
+                "error_rate": self.errors.get(endpoint, 0) / len(values),
+            }
+        return report
+
+
+async def run_load(base_url: str, concurrency: int, duration: float, mix: Dict[str, float],
+                   pdfs: List[bytes], timeout: float, unique_questions: bool = False) -> Dict[str, Dict[str, float]]:
+    stats = Stats()
+    endpoints = list(mix)
+    weights = [mix[e] for e in endpoints]
+    deadline = time.monotonic() + duration
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+        async def upload():
+            files = {"file": (f"synthetic-{random.randrange(10**9)}.pdf", random.choice(pdfs), "application/pdf")}
+            return await client.post("/upload", files=files)
+
+        async def chat():
+            question = random.choice(QUESTIONS)
+            if unique_questions:
+                # Defeat the semantic answer cache so every chat reaches the LLM
+                question += f" (case {random.randrange(10**6)}: {' '.join(random.sample(WORDS, 6))})"
+            return await client.post("/chat", json={"question": question})
+
+        async def documents():
+            return await client.get("/documents")
+
+        async def health():
+            return await client.get("/health")
+
+        actions = {"upload": upload, "chat": chat, "documents": documents, "health": health}
+
+        async def worker():
+            while time.monotonic() < deadline:
+                endpoint = random.choices(endpoints, weights)[0]
+                start = time.perf_counter()
+                try:
+                    response = await actions[endpoint]()
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                stats.record(endpoint, time.perf_counter() - start, ok)
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    return stats.summary(elapsed)
+
+
+def start_app(port: int, llm_url: str, data_dir: str, workers: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "ANTHROPIC_API_KEY": "load-test",
+        "ANTHROPIC_BASE_URL": llm_url,
+        "VECTOR_DB_PATH": os.path.join(data_dir, "vectordb"),
+        "SOURCES_PATH": os.path.join(data_dir, "sources"),
+        "METADATA_DB_PATH": os.path.join(data_dir, "document_metadata.db"),
+        # The stub is not rate limited; keep the scheduler out of the measurement
+        "CLAUDE_REQUESTS_PER_MINUTE": "100000",
+        "CLAUDE_TOKENS_PER_MINUTE": "100000000",
+        "CLAUDE_MAX_CONCURRENCY": "64",
+    })
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"]
+    if workers > 1:
+        cmd += ["--workers", str(workers)]
+    log = open(os.path.join(data_dir, "app.log"), "w")
+    print(f"App log: {log.name}")
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_healthy(base_url: str, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"App at {base_url} did not become healthy within {timeout}s")
+
+
+def print_report(report: Dict[str, Dict[str, float]], baseline: Optional[Dict[str, Dict[str, float]]] = None):
+    print(f"{'endpoint':<10} {'requests':>8} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for endpoint, r in report.items():
+        line = (f"{endpoint:<10} {r['requests']:>8} {r['throughput_rps']:>8.2f} {r['p50_ms']:>9.1f} "
+                f"{r['p99_ms']:>9.1f} {r['error_rate']:>6.1%}")
+        if baseline and endpoint in baseline:
+            b = baseline[endpoint]
+            line += (f"   vs baseline: req/s {_delta(r['throughput_rps'], b['throughput_rps'])}, "
+                     f"p99 {_delta(r['p99_ms'], b['p99_ms'])}")
+        print(line)
+
+
+def _delta(current: float, previous: float) -> str:
+    if not previous:
+        return "n/a"
+    return f"{(current - previous) / previous:+.0%}"
+
+
+def regressions(report, baseline, max_regression: float) -> List[str]:
+    found = []
+    for endpoint, b in baseline.items():
+        r = report.get(endpoint)
+        if r is None:
+            continue
+        if b["p99_ms"] and r["p99_ms"] > b["p99_ms"] * (1 + max_regression):
+            found.append(f"{endpoint}: p99 {b['p99_ms']:.0f} -> {r['p99_ms']:.0f} ms")
+        if b["throughput_rps"] and r["throughput_rps"] < b["throughput_rps"] * (1 - max_regression):
+            found.append(f"{endpoint}: throughput {b['throughput_rps']:.2f} -> {r['throughput_rps']:.2f} req/s")
+        if r["error_rate"] > b["error_rate"] + 0.01:
+            found.append(f"{endpoint}: error rate {b['error_rate']:.1%} -> {r['error_rate']:.1%}")
+    return found
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("upload", "chat", "documents", "health"):
+            raise argparse.ArgumentTypeError(f"Unknown endpoint in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def print_executor_metrics(base_url: str):
+    try:
+        pools = httpx.get(f"{base_url}/metrics", timeout=5).json()["executors"]
+    except (httpx.HTTPError, KeyError, ValueError):
+        return
+    print(f"\n{'pool':<5} {'workers':>7} {'jobs':>7} {'max queued':>10} {'wait p50':>9} {'wait p99':>9} {'run p99':>9}")
+    for name, p in pools.items():
+        print(f"{name:<5} {p['workers']:>7} {p['completed']:>7} {p['max_queued']:>10} "
+              f"{p['wait_ms']['p50']:>9.1f} {p['wait_ms']['p99']:>9.1f} {p['run_ms']['p99']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="target an already running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("upload=1,chat=6,documents=3"))
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="stub Claude response time in seconds")
+    parser.add_argument("--pdf-pages", type=int, default=5)
+    parser.add_argument("--unique-questions", action="store_true",
+                        help="vary every question so the answer cache never hits")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --save")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="fractional p99/throughput change vs baseline that fails the run")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    pdfs = [make_pdf(args.pdf_pages) for _ in range(4)] if "upload" in args.mix else []
+
+    llm = app = None
+    base_url = args.url
+    try:
+        if base_url is None:
+            llm = FakeClaudeAPI(latency=args.llm_latency)
+            llm_url = llm.start()
+            app = start_app(args.port, llm_url, tempfile.mkdtemp(prefix="able2_load_"), args.workers)
+            base_url = f"http://127.0.0.1:{args.port}"
+            wait_until_healthy(base_url)
+
+        # Seed a document so the first chats have something to retrieve
+        if pdfs:
+            httpx.post(f"{base_url}/upload", files={"file": ("seed.pdf", pdfs[0], "application/pdf")},
+                       timeout=args.timeout)
+
+        report = asyncio.run(run_load(base_url, args.concurrency, args.duration, args.mix, pdfs,
+                                      args.timeout, args.unique_questions))
+        print_executor_metrics(base_url)
+    finally:
+        if app is not None:
+            app.terminate()
+            app.wait(timeout=30)
+        if llm is not None:
+            llm.stop()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    print(f"\nconcurrency={args.concurrency} duration={args.duration}s workers={args.workers} "
+          f"llm_latency={args.llm_latency}s mix={args.mix}")
+    print_report(report, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k not in ("save", "compare")},
+                       "results": report}, f, indent=2)
+
+    if baseline:
+        found = regressions(report, baseline, args.max_regression)
+        if found:
+            print("\nRegressions:\n  " + "\n  ".join(found))
+            sys.exit(1)
+        print("\nNo regressions beyond threshold")
+
+
+if __name__ == "__main__":
+    main()
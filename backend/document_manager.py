@@ -1,22 +1,58 @@
 import os
 import json
+import uuid
+import base64
+import bisect
 import logging
-from typing import List, Optional, Dict
+import threading
+from typing import List, Optional, Dict, Tuple
 from datetime import datetime
-from models import Document, DocumentSummary
+from models import Document, DocumentRecord, DocumentSummary
 from vector_store import VectorStore
 from document_processor import PDFProcessor
+from metadata_store import MetadataStore
 
 logger = logging.getLogger(__name__)
 
+
+class DocumentBusyError(Exception):
+    """Another update of the same document is in progress."""
+
+
 class DocumentManager:
     def __init__(self, sources_path: str, vector_store: VectorStore, pdf_processor: PDFProcessor):
         self.metadata_path = os.path.join(sources_path, '..', 'document_metadata.json')
         self.vector_store = vector_store
         self.pdf_processor = pdf_processor
-        self.documents = self._load_metadata()
+
+        # Shared across worker processes; the JSON file is only read once to migrate
+        db_path = os.getenv("METADATA_DB_PATH", os.path.join(sources_path, '..', 'document_metadata.db'))
+        self.store = MetadataStore(db_path)
+        self._migrate_legacy_metadata()
+        self.store.prune_changes()
+        self._store_id = self.store.store_id
+        self._worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        # Registry of lightweight records; full Documents, chunks included,
+        # are read from the metadata store only when asked for. The listing
+        # index keeps sort keys newest first, maintained on add/delete.
+        # Handlers run on executor threads, so the registry is locked
+        self._lock = threading.RLock()
+        self._sort_keys: List[Tuple[float, str]] = []
+        self.documents, self.version = self.store.load_records()
+        self._rebuild_index()
+        self.store.report_position(self._worker_id, self.version)
         logger.info(f"Loaded {len(self.documents)} documents from metadata")
 
+    def _migrate_legacy_metadata(self):
+        if self.store.get_meta('json_migrated'):
+            return
+        legacy = self._load_metadata()
+        if legacy:
+            self.store.put_many(list(legacy.values()))
+            logger.info(f"Migrated {len(legacy)} documents from {self.metadata_path}")
+        self.store.set_meta('json_migrated', '1')
+
     def _load_metadata(self) -> Dict[str, Document]:
         if not os.path.exists(self.metadata_path):
             return {}
@@ -41,44 +77,294 @@ class DocumentManager:
         
         return documents
 
-    def _save_metadata(self):
-        try:
-            with open(self.metadata_path, 'w') as f:
-                # Convert Document objects to dictionaries for JSON serialization
-                data_to_save = {doc_id: doc.dict() for doc_id, doc in self.documents.items()}
-                json.dump(data_to_save, f, indent=4, default=str)
-        except IOError as e:
-            logger.error(f"Error saving document metadata: {e}")
+    @staticmethod
+    def _sort_key(doc: DocumentRecord) -> Tuple[float, str]:
+        # Negated timestamp so ascending order is newest first; id breaks ties
+        return (-doc.created_at.timestamp(), doc.id)
+
+    def _rebuild_index(self):
+        self._sort_keys = sorted(self._sort_key(doc) for doc in self.documents.values())
+
+    def _index_add(self, document: DocumentRecord):
+        bisect.insort(self._sort_keys, self._sort_key(document))
+
+    def _index_remove(self, document: DocumentRecord):
+        key = self._sort_key(document)
+        pos = bisect.bisect_left(self._sort_keys, key)
+        if pos < len(self._sort_keys) and self._sort_keys[pos] == key:
+            del self._sort_keys[pos]
+
+    def _apply_change(self, doc_id: str, document: Optional[DocumentRecord]):
+        previous = self.documents.pop(doc_id, None)
+        if previous:
+            self._index_remove(previous)
+        if document:
+            self.documents[doc_id] = document
+            self._index_add(document)
+
+    def refresh(self):
+        """
+        Bring this worker's in-memory view up to date with changes committed by
+        other processes. Costs a single indexed query when nothing changed.
+        """
+        with self._lock:
+            result = self.store.changes_since(self.version)
+            if result is None:
+                self.documents, self.version = self.store.load_records()
+                self._rebuild_index()
+                return
+            changed, seq = result
+            for doc_id, document in changed:
+                self._apply_change(doc_id, document)
+            self.version = seq
+
+    def prune_changes(self, reader_ttl: Optional[float] = None) -> int:
+        """
+        Report how far this worker has replayed the change log, then trim
+        the log. Every worker calls this periodically; one that stops doing
+        so is treated as gone and no longer holds entries back.
+        """
+        with self._lock:
+            self.refresh()
+            self.store.report_position(self._worker_id, self.version)
+        return self.store.prune_changes(reader_ttl)
+
+    def other_live_workers(self) -> int:
+        """How many other processes sharing this metadata store are running, e.g. API workers."""
+        return sum(1 for worker_id in self.store.live_readers() if worker_id != self._worker_id)
+
+    def unregister_worker(self):
+        """
+        Stop counting as a live worker straight away, rather than once this
+        process's last report expires. Call on shutdown.
+        """
+        self.store.remove_reader(self._worker_id)
+
+    @property
+    def etag(self) -> str:
+        """
+        Strong ETag for the document listing, derived from the shared change
+        sequence so every worker hands out the same tag for the same state.
+        """
+        with self._lock:
+            self.refresh()
+            return f'"{self._store_id}-{self.version}"'
 
     def add_document(self, document: Document) -> bool:
-        if document.id in self.documents:
+        if not self.store.put(document):
             logger.warning(f"Document with ID {document.id} already exists.")
             return False
-        self.documents[document.id] = document
-        self._save_metadata()
+        self.record_manifest(document)
+        self.refresh()
         return True
 
+    def ingest_streaming(self, file_path: str, original_filename: str, window_size: int = 32) -> Document:
+        """
+        Chunk, embed and index a large PDF one window at a time. Vectors are
+        written as windows complete; on failure the partial vectors are
+        removed. The caller still stores the returned Document via add_document.
+
+        Until then the vectors have no metadata, so a manifest entry marks the
+        ingest as in flight, refreshed every window, and the reconciler does
+        not take its chunks for orphans however long the file takes.
+        """
+        doc_id = str(uuid.uuid4())
+        self.store.put_manifest(doc_id, None, 0, file_path, None, None, status='ingesting')
+
+        def on_window(chunks):
+            self.vector_store.add_chunks(doc_id, original_filename, "pdf", chunks)
+            self.store.touch_manifest(doc_id)
+
+        try:
+            document = self.pdf_processor.process_pdf_streaming(
+                file_path,
+                original_filename,
+                doc_id,
+                on_window=on_window,
+                window_size=window_size
+            )
+            self.vector_store.index_document(doc_id)
+            self.store.touch_manifest(doc_id)
+            return document
+        except Exception:
+            self.vector_store.delete_document(doc_id)
+            self.store.delete_manifest([doc_id])
+            raise
+
+    def ingest_new_version(self, doc_id: str, file_path: str, keep_content: int = 3) -> Tuple[Document, Dict[str, int]]:
+        """
+        Replace a document's source with a new version of the file, keeping
+        its id. Chunks are diffed against the stored ones so only changed
+        text is re-embedded; the metadata switches to the new version in one
+        commit once the vector store holds it, and only then is the previous
+        source file removed.
+
+        The document is claimed for the whole update (its manifest status is
+        'updating'), so a second upload or the reconciler cannot rewrite its
+        vectors underneath this one, and the final commit never brings back a
+        document deleted in the meantime. Raises KeyError for unknown or
+        deleted documents and DocumentBusyError while another update runs.
+
+        Returns the updated Document and counts of reused, embedded and
+        deleted chunks.
+        """
+        previous_status = self.store.begin_update(doc_id)
+        if previous_status is None:
+            raise DocumentBusyError(f"Document {doc_id} is already being updated")
+
+        try:
+            current = self.store.get(doc_id)
+            if current is None:
+                raise KeyError(doc_id)
+
+            # Streamed documents keep most chunk text only in the vector store
+            old_chunks = self.vector_store.get_document_chunks(doc_id)
+            chunks, reused = self.pdf_processor.plan_new_version(doc_id, old_chunks, file_path)
+            self.vector_store.apply_version(doc_id, current.name, current.file_type, chunks, reused)
+
+            streamed = any(not chunk.content for chunk in current.chunks)
+            summary = current.summary
+            if [c.content for c in chunks[:keep_content]] != [c.content for c in old_chunks[:keep_content]]:
+                summary = self.pdf_processor._generate_summary(chunks[:keep_content])
+            document = current.copy(update={
+                "file_path": file_path,
+                "file_size": os.path.getsize(file_path),
+                "summary": summary,
+                "chunks": [
+                    chunk if not streamed or chunk.chunk_index < keep_content else chunk.copy(update={"content": ""})
+                    for chunk in chunks
+                ],
+                "version": current.version + 1,
+            })
+        except Exception:
+            self.store.set_manifest_status(doc_id, previous_status)
+            raise
+
+        if not self.store.update(document):
+            # Deleted while the new version was indexed; drop what was added
+            self.vector_store.delete_document(doc_id)
+            raise KeyError(doc_id)
+        self.record_manifest(document)
+        self.refresh()
+
+        if current.file_path != file_path:
+            self.pdf_processor.delete_file(current.file_path)
+
+        stats = {
+            "reused_chunks": len(reused),
+            "embedded_chunks": len(chunks) - len(reused),
+            "deleted_chunks": len(old_chunks) - len(reused),
+        }
+        logger.info(f"Stored version {document.version} of {current.name}: {stats}")
+        return document, stats
+
+    def record_manifest(self, document: Document, status: str = 'ok'):
+        """
+        Record what a consistent copy of this document looks like: source
+        checksum, size and mtime, and how many chunks the vector store holds.
+        """
+        checksum = file_size = file_mtime = None
+        try:
+            stat = os.stat(document.file_path)
+            file_size, file_mtime = stat.st_size, stat.st_mtime
+            checksum = self.pdf_processor.file_checksum(document.file_path)
+        except OSError as e:
+            logger.warning(f"Could not checksum {document.file_path}: {e}")
+            status = 'missing_file'
+        self.store.put_manifest(
+            document.id, checksum, len(document.chunks), document.file_path,
+            file_size, file_mtime, status
+        )
+
+    def update_summaries(self, summaries: Dict[str, Tuple[int, str]]) -> set:
+        """
+        Replace the summaries of several documents in one metadata commit,
+        given as doc_id -> (version the summary was generated from, summary).
+        Deleted documents are skipped; returns the ids of those that moved to
+        a newer version, whose summaries were not written.
+        """
+        if not summaries:
+            return set()
+        superseded = self.store.update_summaries(summaries)
+        self.refresh()
+        return superseded
+
     def get_document(self, doc_id: str) -> Optional[Document]:
-        return self.documents.get(doc_id)
+        """
+        The full Document, chunks included, read from the metadata store.
+        """
+        if self.get_record(doc_id) is None:
+            return None
+        return self.store.get(doc_id)
+
+    def get_record(self, doc_id: str) -> Optional[DocumentRecord]:
+        with self._lock:
+            self.refresh()
+            return self.documents.get(doc_id)
 
     def get_all_documents(self) -> List[DocumentSummary]:
-        summaries = []
-        for doc in self.documents.values():
-            summaries.append(
-                DocumentSummary(
-                    id=doc.id,
-                    name=doc.name,
-                    file_type=doc.file_type,
-                    summary=doc.summary,
-                    created_at=doc.created_at,
-                    file_size=doc.file_size,
-                )
-            )
-        # Sort by creation date, newest first
-        return sorted(summaries, key=lambda x: x.created_at, reverse=True)
+        with self._lock:
+            self.refresh()
+            # Sorted by creation date, newest first
+            return [self.documents[doc_id].to_summary() for _, doc_id in self._sort_keys]
+
+    def list_documents(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        name: Optional[str] = None,
+        file_type: Optional[str] = None,
+    ) -> Tuple[List[DocumentSummary], Optional[str]]:
+        """
+        Return a page of document summaries, newest first, and the cursor for
+        the next page (None when there are no more results).
+
+        Cursors encode the sort key of the last returned document, so pages
+        stay stable while documents are added or deleted between requests.
+        """
+        with self._lock:
+            self.refresh()
+            start = 0
+            if cursor:
+                start = bisect.bisect_right(self._sort_keys, self._decode_cursor(cursor))
+
+            name_filter = name.lower() if name else None
+            items: List[DocumentSummary] = []
+            next_cursor = None
+            for pos in range(start, len(self._sort_keys)):
+                key = self._sort_keys[pos]
+                record = self.documents[key[1]]
+                if file_type and record.file_type != file_type:
+                    continue
+                if name_filter and name_filter not in record.name.lower():
+                    continue
+                if limit is not None and len(items) >= limit:
+                    next_cursor = self._encode_cursor(self._sort_key_for(items[-1]))
+                    break
+                items.append(record.to_summary())
+
+            return items, next_cursor
+
+    @staticmethod
+    def _sort_key_for(summary: DocumentSummary) -> Tuple[float, str]:
+        return (-summary.created_at.timestamp(), summary.id)
+
+    @staticmethod
+    def _encode_cursor(key: Tuple[float, str]) -> str:
+        raw = json.dumps([key[0], key[1]]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[float, str]:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            ts, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return (float(ts), str(doc_id))
+        except Exception:
+            raise ValueError("Invalid cursor")
 
     def delete_document(self, doc_id: str) -> bool:
-        document = self.get_document(doc_id)
+        document = self.get_record(doc_id)
         if not document:
             return False
 
@@ -92,12 +378,60 @@ class DocumentManager:
             logger.error(f"Failed to delete file {document.file_path}.")
 
         # 3. Delete from metadata
-        if doc_id in self.documents:
-            del self.documents[doc_id]
-            self._save_metadata()
+        if self.store.delete(doc_id):
+            self.refresh()
             logger.info(f"Successfully deleted document {doc_id}")
             return True
         return False
 
+    def delete_documents(
+        self,
+        doc_ids: Optional[List[str]] = None,
+        name: Optional[str] = None,
+        file_type: Optional[str] = None,
+    ) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Delete many documents with one vector store call and one metadata commit.
+
+        Targets are the given ids, or every document matching the name/type
+        filters when no ids are given. Returns a status per id ("deleted",
+        "not_found" or "failed") and the source file paths still to be removed,
+        which callers can delete off the request path.
+        """
+        self.refresh()
+        if doc_ids is None:
+            doc_ids = [s.id for s in self.list_documents(name=name, file_type=file_type)[0]]
+
+        results: Dict[str, str] = {}
+        targets: List[DocumentRecord] = []
+        for doc_id in dict.fromkeys(doc_ids):
+            document = self.documents.get(doc_id)
+            if document:
+                targets.append(document)
+            else:
+                results[doc_id] = "not_found"
+
+        if not targets:
+            return results, []
+
+        target_ids = [doc.id for doc in targets]
+        if not self.vector_store.delete_documents(target_ids):
+            for doc_id in target_ids:
+                results[doc_id] = "failed"
+            return results, []
+
+        self.store.delete_many(target_ids)
+        self.refresh()
+        for doc_id in target_ids:
+            results[doc_id] = "deleted"
+        logger.info(f"Bulk deleted {len(target_ids)} documents")
+        return results, [doc.file_path for doc in targets]
+
+    def delete_files(self, file_paths: List[str]):
+        for file_path in file_paths:
+            if not self.pdf_processor.delete_file(file_path):
+                logger.error(f"Failed to delete file {file_path}.")
+
     def get_document_count(self) -> int:
+        self.refresh()
         return len(self.documents)
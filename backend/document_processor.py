@@ -1,7 +1,10 @@
 import uuid
+import hashlib
+import bisect
 import fitz
 import os
-from typing import List, Tuple
+import shutil
+from typing import BinaryIO, Callable, Dict, Iterator, List, Tuple, Optional
 from datetime import datetime
 from models import Document, DocumentChunk
 import logging
@@ -10,6 +13,12 @@ logger = logging.getLogger(__name__)
 
 
 class PDFProcessor:
+    # Target words per chunk and overlap words between consecutive chunks
+    CHUNK_SIZE = 600
+    OVERLAP_SIZE = 100
+    # Target maximum words per small-to-big child
+    CHILD_SIZE = 60
+    
     def __init__(self, sources_path: str):
         self.sources_path = sources_path
         os.makedirs(sources_path, exist_ok=True)
@@ -21,14 +30,14 @@ class PDFProcessor:
         try:
             doc_id = str(uuid.uuid4())
             
-            # Extract text from PDF
-            text_content = self._extract_text_from_pdf(file_path)
+            # Extract text from PDF, remembering where each page starts
+            text_content, page_word_offsets = self._extract_text_with_pages(file_path)
             
             if not text_content.strip():
                 raise ValueError("PDF contains no extractable text")
             
             # Create chunks
-            chunks = self._create_chunks(text_content, doc_id)
+            chunks = self._create_chunks(text_content, doc_id, page_word_offsets)
             
             # Generate summary from first few chunks
             summary = self._generate_summary(chunks[:3])
@@ -54,27 +63,160 @@ class PDFProcessor:
             logger.error(f"Error processing PDF {original_filename}: {str(e)}")
             raise
     
-    def _extract_text_from_pdf(self, file_path: str) -> str:
+    def process_pdf_streaming(
+        self,
+        file_path: str,
+        original_filename: str,
+        doc_id: str,
+        on_window: Callable[[List[DocumentChunk]], None],
+        window_size: int = 32,
+        keep_content: int = 3
+    ) -> Document:
+        """
+        Process a PDF page by page, handing chunks to `on_window` in windows
+        of `window_size`, so peak memory does not depend on document length.
+        
+        Chunk boundaries match process_pdf. Only the first `keep_content`
+        chunks keep their text in the returned Document (enough for the
+        summary); the rest are recorded with empty content, as their text
+        lives in the vector store.
+        """
+        try:
+            chunks = []
+            window = []
+            for chunk in self._iter_chunks(file_path, doc_id):
+                window.append(chunk)
+                if len(window) >= window_size:
+                    on_window(window)
+                    window = []
+                chunks.append(chunk if chunk.chunk_index < keep_content else chunk.copy(update={"content": ""}))
+            if window:
+                on_window(window)
+            
+            if not chunks:
+                raise ValueError("PDF contains no extractable text")
+            
+            document = Document(
+                id=doc_id,
+                name=original_filename,
+                file_type="pdf",
+                file_path=file_path,
+                summary=self._generate_summary(chunks[:keep_content]),
+                chunks=chunks,
+                created_at=datetime.now(),
+                file_size=os.path.getsize(file_path)
+            )
+            
+            logger.info(f"Successfully stream-processed PDF: {original_filename} -> {len(chunks)} chunks")
+            return document
+            
+        except Exception as e:
+            logger.error(f"Error processing PDF {original_filename}: {str(e)}")
+            raise
+    
+    def _iter_chunks(self, file_path: str, doc_id: str) -> Iterator[DocumentChunk]:
+        """
+        Yield chunks while reading one page at a time. Only the words of the
+        chunk being built are buffered.
+        """
+        chunk_size = self.CHUNK_SIZE
+        overlap_size = self.OVERLAP_SIZE
+        
+        buffer: List[str] = []        # words from buffer_start onwards
+        buffer_pages: List[int] = []  # page number of each buffered word
+        buffer_start = 0              # global index of buffer[0]
+        chars_before = 0              # characters in the words before buffer[0]
+        chunk_index = 0
+        
+        def make_chunk(n_words: int) -> DocumentChunk:
+            content = " ".join(buffer[:n_words])
+            # Same offsets as _create_chunks: words before the chunk plus one space per word
+            start_char = chars_before + buffer_start
+            page_breaks = []
+            for i in range(1, n_words):
+                page_breaks.extend([i] * (buffer_pages[i] - buffer_pages[i - 1]))
+            return DocumentChunk(
+                id=str(uuid.uuid4()),
+                document_id=doc_id,
+                content=content,
+                chunk_index=chunk_index,
+                start_char=start_char,
+                end_char=start_char + len(content),
+                page_start=buffer_pages[0],
+                page_end=buffer_pages[n_words - 1],
+                page_breaks=page_breaks
+            )
+        
+        doc = fitz.open(file_path)
+        try:
+            for page_num in range(doc.page_count):
+                words = doc[page_num].get_text().split()
+                buffer.extend(words)
+                buffer_pages.extend([page_num + 1] * len(words))
+                
+                # Emit only once a word beyond the chunk exists, so the final
+                # chunk is decided at end of input exactly as _create_chunks does
+                while len(buffer) > chunk_size:
+                    yield make_chunk(chunk_size)
+                    advance = chunk_size - overlap_size
+                    chars_before += sum(len(word) for word in buffer[:advance])
+                    buffer_start += advance
+                    del buffer[:advance]
+                    del buffer_pages[:advance]
+                    chunk_index += 1
+        finally:
+            doc.close()
+        
+        if buffer:
+            yield make_chunk(len(buffer))
+    
+    def _extract_text_with_pages(self, file_path: str) -> Tuple[str, List[int]]:
         """
-        Extract text content from PDF using PyMuPDF.
+        Extract text content from PDF along with the index of the first word
+        of each page, so chunks can be mapped back to page numbers.
         """
         try:
             doc = fitz.open(file_path)
-            text_content = ""
+            page_texts = []
+            page_word_offsets = []
+            word_count = 0
             
             for page_num in range(doc.page_count):
-                page = doc[page_num]
-                text_content += page.get_text()
-                text_content += "\n\n"
+                page_text = doc[page_num].get_text()
+                page_word_offsets.append(word_count)
+                word_count += len(page_text.split())
+                page_texts.append(page_text)
             
             doc.close()
-            return text_content.strip()
+            return "\n\n".join(page_texts).strip(), page_word_offsets
             
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {str(e)}")
             raise
     
-    def _create_chunks(self, text: str, doc_id: str) -> List[DocumentChunk]:
+    @staticmethod
+    def _page_for_word(page_word_offsets: List[int], word_idx: int) -> int:
+        """
+        Return the 1-based page number containing the given word index.
+        """
+        return bisect.bisect_right(page_word_offsets, word_idx)
+    
+    @staticmethod
+    def _page_breaks(page_word_offsets: List[int], start_idx: int, end_idx: int) -> List[int]:
+        """
+        Page breaks of the chunk covering words start_idx to end_idx, as
+        stored in DocumentChunk.page_breaks.
+        """
+        return [offset - start_idx for offset in page_word_offsets if start_idx < offset < end_idx]
+    
+    @staticmethod
+    def page_in_chunk(page_start: int, page_breaks: List[int], word_idx: int) -> int:
+        """
+        Return the page number of a chunk's word_idx-th word.
+        """
+        return page_start + bisect.bisect_right(page_breaks, word_idx)
+    
+    def _create_chunks(self, text: str, doc_id: str, page_word_offsets: Optional[List[int]] = None) -> List[DocumentChunk]:
         """
         Create intelligent chunks from text content.
         Target 500-800 words per chunk with overlap.
@@ -85,8 +227,8 @@ class PDFProcessor:
         if not words:
             return chunks
         
-        chunk_size = 600  # Target words per chunk
-        overlap_size = 100  # Overlap words between chunks
+        chunk_size = self.CHUNK_SIZE
+        overlap_size = self.OVERLAP_SIZE
         
         start_idx = 0
         chunk_index = 0
@@ -103,13 +245,22 @@ class PDFProcessor:
                 start_char += 1  # Account for space
             end_char = start_char + len(chunk_content)
             
+            page_start = page_end = page_breaks = None
+            if page_word_offsets:
+                page_start = self._page_for_word(page_word_offsets, start_idx)
+                page_end = self._page_for_word(page_word_offsets, end_idx - 1)
+                page_breaks = self._page_breaks(page_word_offsets, start_idx, end_idx)
+            
             chunk = DocumentChunk(
                 id=str(uuid.uuid4()),
                 document_id=doc_id,
                 content=chunk_content,
                 chunk_index=chunk_index,
                 start_char=start_char,
-                end_char=end_char
+                end_char=end_char,
+                page_start=page_start,
+                page_end=page_end,
+                page_breaks=page_breaks
             )
             
             chunks.append(chunk)
@@ -122,6 +273,188 @@ class PDFProcessor:
             chunk_index += 1
         
         return chunks
+
+    def plan_new_version(
+        self,
+        doc_id: str,
+        old_chunks: List[DocumentChunk],
+        file_path: str
+    ) -> Tuple[List[DocumentChunk], Dict[str, DocumentChunk]]:
+        """
+        Chunk a new version of a document, carrying over as many chunks of
+        the current version (`old_chunks`, with their text) as possible.
+
+        The old and new word sequences are compared for their common prefix
+        and suffix. Old chunks lying wholly inside either keep their ids,
+        suffix chunks moving to their new offsets, and only the stretch in
+        between is re-chunked, overlapping its neighbours by OVERLAP_SIZE so
+        chunks and children still tile the document. A re-chunked chunk whose
+        text hash matches an old chunk also keeps that chunk's id.
+
+        Returns the new chunks in order and, for every chunk id carried over,
+        the old chunk it came from.
+        """
+        text, page_word_offsets = self._extract_text_with_pages(file_path)
+        words = text.split()
+        if not words:
+            raise ValueError("PDF contains no extractable text")
+
+        old_chunks = sorted(old_chunks, key=lambda c: c.chunk_index)
+        old_words, old_ranges = self._join_chunks(old_chunks)
+        if not old_ranges:
+            # Unexpected layout: fall back to plain chunking plus hash matches
+            old_words = []
+
+        limit = min(len(old_words), len(words))
+        prefix = 0
+        while prefix < limit and old_words[prefix] == words[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old_words[-1 - suffix] == words[-1 - suffix]:
+            suffix += 1
+
+        n = len(old_ranges)
+        shift = len(words) - len(old_words)
+        head = 0
+        while head < n and old_ranges[head][1] <= prefix:
+            head += 1
+        tail = n
+        while tail > head and old_ranges[tail - 1][0] >= len(old_words) - suffix:
+            tail -= 1
+
+        # Re-chunk a short last head chunk (the old document's end) rather
+        # than leave it inside the new one, so repeated versions do not
+        # fragment the document
+        min_size = self.CHUNK_SIZE // 2
+        if head and old_ranges[head - 1][1] < len(words) and \
+                old_ranges[head - 1][1] - old_ranges[head - 1][0] < min_size:
+            head -= 1
+
+        # The changed stretch starts inside the last kept head chunk's overlap
+        # and ends covering the first kept tail chunk's. It is spread evenly
+        # over as few chunks as fit, which are at least half full unless there
+        # is only one; a short single chunk takes in the next tail chunk, and
+        # so does the stretch when that chunk (a document shorter than the
+        # overlap) would lie entirely inside it
+        mid_start = old_ranges[head - 1][1] - self.OVERLAP_SIZE if head else 0
+        while True:
+            if tail == n:
+                mid_end = len(words)
+                break
+            mid_end = min(old_ranges[tail][0] + shift + self.OVERLAP_SIZE, len(words))
+            if mid_end - mid_start >= min_size and old_ranges[tail][1] + shift > mid_end:
+                break
+            tail += 1
+
+        ranges = list(old_ranges[:head])
+        if mid_end > mid_start + (self.OVERLAP_SIZE if head else 0):
+            step = self.CHUNK_SIZE - self.OVERLAP_SIZE
+            span = mid_end - mid_start - self.OVERLAP_SIZE
+            count = max(1, -(-span // step))
+            start = mid_start
+            for i in range(count):
+                end = mid_start + self.OVERLAP_SIZE + round((i + 1) * span / count)
+                ranges.append((start, end))
+                start = end - self.OVERLAP_SIZE
+        first_tail = len(ranges)
+        ranges.extend((start + shift, end + shift) for start, end in old_ranges[tail:])
+
+        kept = {i: old_chunks[i] for i in range(head)}
+        kept.update({first_tail + i: chunk for i, chunk in enumerate(old_chunks[tail:])})
+        by_hash = {
+            hashlib.sha256(chunk.content.encode()).hexdigest(): chunk
+            for i, chunk in enumerate(old_chunks)
+            if i >= head and (i < tail or not old_ranges)
+        }
+
+        # Character offset of every word, matching _create_chunks
+        char_starts = []
+        position = 0
+        for word in words:
+            char_starts.append(position)
+            position += len(word) + 1
+
+        chunks = []
+        reused = {}
+        for index, (start, end) in enumerate(ranges):
+            content = " ".join(words[start:end])
+            old = kept.get(index)
+            if old is None:
+                old = by_hash.pop(hashlib.sha256(content.encode()).hexdigest(), None)
+            page_start = page_end = page_breaks = None
+            if page_word_offsets:
+                page_start = self._page_for_word(page_word_offsets, start)
+                page_end = self._page_for_word(page_word_offsets, end - 1)
+                page_breaks = self._page_breaks(page_word_offsets, start, end)
+            chunk = DocumentChunk(
+                id=old.id if old else str(uuid.uuid4()),
+                document_id=doc_id,
+                content=content,
+                chunk_index=index,
+                start_char=char_starts[start],
+                end_char=char_starts[start] + len(content),
+                page_start=page_start,
+                page_end=page_end,
+                page_breaks=page_breaks
+            )
+            if old is not None:
+                reused[chunk.id] = old
+            chunks.append(chunk)
+
+        logger.info(
+            f"Planned new version of {doc_id}: {len(reused)} of {len(chunks)} chunks carried over, "
+            f"{len(old_chunks) - len(reused)} dropped"
+        )
+        return chunks, reused
+
+    def _join_chunks(self, chunks: List[DocumentChunk]) -> Tuple[List[str], List[Tuple[int, int]]]:
+        """
+        Rebuild a document's words from its ordered chunks, returning them with
+        each chunk's word range, or no ranges if the chunks do not overlap the
+        way the chunkers lay them out.
+        """
+        words: List[str] = []
+        ranges = []
+        for chunk in chunks:
+            chunk_words = chunk.content.split()
+            if not ranges:
+                start = 0
+                words.extend(chunk_words)
+            else:
+                start = len(words) - self.OVERLAP_SIZE
+                if len(chunk_words) <= self.OVERLAP_SIZE or words[start:] != chunk_words[:self.OVERLAP_SIZE]:
+                    return words, []
+                words.extend(chunk_words[self.OVERLAP_SIZE:])
+            ranges.append((start, start + len(chunk_words)))
+        return words, ranges
+
+    @classmethod
+    def child_spans(cls, words: List[str], chunk_index: int) -> List[Tuple[int, int]]:
+        """
+        Split a chunk's words into sentence-window children for small-to-big
+        retrieval, as (start_word, end_word) ranges within the chunk.
+        
+        Every chunk after the first repeats the previous chunk's last
+        OVERLAP_SIZE words, so its children start after them and the children
+        of all chunks cover the document exactly once. A child closes at a
+        sentence end once it has half of CHILD_SIZE words, and is cut at
+        CHILD_SIZE words otherwise; a short remainder at the end of the chunk
+        joins the last child.
+        """
+        first = 0 if chunk_index == 0 else min(cls.OVERLAP_SIZE, len(words))
+        spans = []
+        span_start = first
+        for i in range(first, len(words)):
+            length = i + 1 - span_start
+            if length >= cls.CHILD_SIZE or (length >= cls.CHILD_SIZE // 2 and words[i].endswith(('.', '!', '?'))):
+                spans.append((span_start, i + 1))
+                span_start = i + 1
+        if span_start < len(words):
+            if spans and len(words) - span_start < cls.CHILD_SIZE // 4:
+                spans[-1] = (spans[-1][0], len(words))
+            else:
+                spans.append((span_start, len(words)))
+        return spans
     
     def _generate_summary(self, chunks: List[DocumentChunk]) -> str:
         """
@@ -167,6 +500,39 @@ class PDFProcessor:
             logger.error(f"Error saving file {filename}: {str(e)}")
             raise
     
+    @staticmethod
+    def file_checksum(file_path: str) -> str:
+        """
+        SHA-256 of a file, read in 1 MiB blocks.
+        """
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def save_uploaded_fileobj(self, fileobj: BinaryIO, filename: str) -> str:
+        """
+        Stream an uploaded file object to the sources directory without
+        reading it into memory.
+        """
+        file_id = str(uuid.uuid4())
+        file_extension = os.path.splitext(filename)[1]
+        file_path = os.path.join(self.sources_path, f"{file_id}{file_extension}")
+        
+        try:
+            with open(file_path, 'wb') as f:
+                shutil.copyfileobj(fileobj, f, 1024 * 1024)
+            
+            logger.info(f"Saved file: {filename} -> {file_path}")
+            return file_path
+            
+        except Exception as e:
+            logger.error(f"Error saving file {filename}: {str(e)}")
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+    
     def delete_file(self, file_path: str) -> bool:
         """
         Delete a file from the sources directory.
@@ -0,0 +1,167 @@
+import os
+import inspect
+import logging
+from typing import List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+HF_MODEL_ID = f"sentence-transformers/{MODEL_NAME}"
+
+# all-MiniLM-L6-v2 truncates inputs at 256 word pieces
+MAX_SEQ_LENGTH = 256
+
+
+class SentenceTransformerBackend:
+    """
+    The original PyTorch path via sentence-transformers.
+    """
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        # Imported lazily so the ONNX backend never pays for importing torch
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.name = model_name
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts)
+
+
+class OnnxBackend:
+    """
+    all-MiniLM-L6-v2 exported to ONNX and run with ONNX Runtime on CPU.
+
+    Reproduces the sentence-transformers pipeline: word-piece tokenization
+    truncated to 256 tokens, mean pooling over the attention mask, then L2
+    normalization. `quantized` selects the dynamically quantized int8 model
+    written by export_onnx.
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = False, threads: Optional[int] = None, batch_size: int = 32):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_file = "model_int8.onnx" if quantized else "model.onnx"
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        self.batch_size = batch_size
+        self.name = f"{MODEL_NAME} (onnx{'-int8' if quantized else ''})"
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        outputs = []
+        for start in range(0, len(texts), self.batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + self.batch_size])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+            token_embeddings = self.session.run(None, feeds)[0]
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            outputs.append(pooled / np.clip(norms, 1e-12, None))
+
+        return np.vstack(outputs).astype(np.float32)
+
+
+def create_embedding_backend(backend: Optional[str] = None, model_dir: Optional[str] = None, threads: Optional[int] = None):
+    """
+    Build the embedding backend named by `backend` (or EMBEDDING_BACKEND):
+    "torch" (default), "onnx" or "onnx-int8". ONNX backends load from
+    `model_dir` (or ONNX_MODEL_DIR), as written by export_onnx.
+    """
+    backend = (backend or os.getenv("EMBEDDING_BACKEND", "torch")).lower()
+    if backend == "torch":
+        return SentenceTransformerBackend()
+
+    if backend in ("onnx", "onnx-int8"):
+        model_dir = model_dir or os.getenv("ONNX_MODEL_DIR", "./data/onnx/all-MiniLM-L6-v2")
+        if threads is None and os.getenv("EMBEDDING_THREADS"):
+            threads = int(os.getenv("EMBEDDING_THREADS"))
+        logger.info(f"Using ONNX embedding backend from {model_dir}")
+        return OnnxBackend(model_dir, quantized=backend == "onnx-int8", threads=threads)
+
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+def export_onnx(output_dir: str, model_id: str = HF_MODEL_ID, quantize: bool = True):
+    """
+    Export the transformer behind all-MiniLM-L6-v2 to ONNX, plus a
+    dynamically quantized int8 copy. Needs torch and transformers, which
+    are only required at export time.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = AutoModel.from_pretrained(model_id)
+    model.eval()
+    tokenizer.save_pretrained(output_dir)
+
+    class _Encoder(torch.nn.Module):
+        # Keyword call keeps the export independent of forward()'s positional order
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.transformer(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            ).last_hidden_state
+
+    sample = tokenizer(["an example sentence"], return_tensors="pt")
+    model_path = os.path.join(output_dir, "model.onnx")
+    axes = {0: "batch", 1: "sequence"}
+    # Newer torch defaults to the dynamo exporter; the classic one handles BERT fine
+    export_kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs["dynamo"] = False
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(model),
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            model_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": axes,
+                "attention_mask": axes,
+                "token_type_ids": axes,
+                "last_hidden_state": axes,
+            },
+            opset_version=14,
+            **export_kwargs,
+        )
+    logger.info(f"Exported ONNX model to {model_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantized_path = os.path.join(output_dir, "model_int8.onnx")
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        logger.info(f"Wrote int8 model to {quantized_path}")
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    export_onnx(sys.argv[1] if len(sys.argv) > 1 else "./data/onnx/all-MiniLM-L6-v2")
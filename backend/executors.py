@@ -0,0 +1,150 @@
+import time
+import asyncio
+import logging
+import threading
+import functools
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Job:
+    __slots__ = ("started", "cancelled")
+
+    def __init__(self):
+        self.started = False
+        self.cancelled = False
+
+
+class StageExecutor:
+    """
+    A bounded thread pool for one kind of blocking work, with metrics: jobs
+    waiting for a worker (queue depth), running and finished, and wait and
+    run time percentiles over the last `window` jobs.
+
+    Callers await run() from the event loop. A job whose caller is cancelled
+    before a worker picks it up is dropped rather than run.
+    """
+
+    def __init__(self, name: str, max_workers: int, window: int = 1000):
+        self.name = name
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-stage")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._max_queued = 0
+        self._waits: deque = deque(maxlen=window)
+        self._runs: deque = deque(maxlen=window)
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) on this pool and return its result. Context
+        variables are carried over, as with asyncio.to_thread.
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        job = _Job()
+        with self._lock:
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+        try:
+            return await loop.run_in_executor(self._pool, self._call, job, time.monotonic(), call)
+        except asyncio.CancelledError:
+            with self._lock:
+                if not job.started:
+                    job.cancelled = True
+                    self._queued -= 1
+            raise
+
+    def _call(self, job: _Job, submitted: float, call: Callable) -> Any:
+        started = time.monotonic()
+        with self._lock:
+            if job.cancelled:
+                return None
+            job.started = True
+            self._queued -= 1
+            self._running += 1
+            self._waits.append(started - submitted)
+        failed = False
+        try:
+            return call()
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._failed += failed
+                self._runs.append(time.monotonic() - started)
+
+    @staticmethod
+    def _percentiles_ms(values: List[float]) -> Dict[str, float]:
+        if not values:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+        values = sorted(values)
+
+        def pick(q: float) -> float:
+            return round(values[min(int(q * len(values)), len(values) - 1)] * 1000, 2)
+
+        return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": round(values[-1] * 1000, 2)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits, runs = list(self._waits), list(self._runs)
+            counts = {
+                "workers": self.max_workers,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "max_queued": self._max_queued,
+            }
+        return dict(counts, wait_ms=self._percentiles_ms(waits), run_ms=self._percentiles_ms(runs))
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class Executors:
+    """
+    One pool per kind of blocking work, so a backlog in one cannot starve
+    the others or the event loop:
+      * cpu: PDF parsing, chunking, embedding and vector search
+      * io: metadata store, Chroma reads and deletes, file writes
+      * llm: calls to Claude, which wait seconds on the network and on the
+        request scheduler's rate limits
+
+    These are thread pools rather than process pools: the embedding model,
+    Chroma client and metadata connection are shared in-process state, and
+    the heavy work (PyMuPDF, torch/ONNX Runtime, Chroma) runs in native code
+    that releases the GIL.
+    """
+
+    def __init__(self, cpu_workers: int, io_workers: int, llm_workers: int):
+        self.cpu = StageExecutor("cpu", cpu_workers)
+        self.io = StageExecutor("io", io_workers)
+        self.llm = StageExecutor("llm", llm_workers)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {pool.name: pool.stats() for pool in (self.cpu, self.io, self.llm)}
+
+    def shutdown(self):
+        for pool in (self.cpu, self.io, self.llm):
+            pool.shutdown()
+
+
+async def run_blocking(pool: Optional[StageExecutor], fn: Callable, *args, **kwargs) -> Any:
+    """
+    Run fn on the given pool, or on asyncio's default executor for components
+    constructed without one.
+    """
+    if pool is None:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    return await pool.run(fn, *args, **kwargs)
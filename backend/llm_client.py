@@ -3,16 +3,34 @@ from typing import List, Optional
 import logging
 from datetime import datetime
 from models import SourceInfo, ChatResponse
+from request_scheduler import RequestScheduler, INTERACTIVE, BACKGROUND
 
 logger = logging.getLogger(__name__)
 
 
 class ClaudeClient:
-    def __init__(self, api_key: str):
-        self.client = anthropic.Anthropic(api_key=api_key)
+    def __init__(self, api_key: str, scheduler: Optional[RequestScheduler] = None, base_url: Optional[str] = None):
+        # Retries are owned by the scheduler so they respect its rate limits
+        self.client = anthropic.Anthropic(api_key=api_key, base_url=base_url, max_retries=0)
         self.model = "claude-3-sonnet-20240229"
+        self.scheduler = scheduler or RequestScheduler()
         logger.info("Initialized Claude client")
     
+    def _create_message(self, priority: int, **kwargs):
+        """
+        Send a messages.create call through the scheduler. Token usage is
+        estimated up front (about 4 characters per token) and corrected from
+        the response's usage once it returns.
+        """
+        prompt_chars = sum(len(message["content"]) for message in kwargs["messages"])
+        estimated_tokens = prompt_chars // 4 + kwargs.get("max_tokens", 0)
+        return self.scheduler.call(
+            lambda: self.client.messages.create(**kwargs),
+            priority=priority,
+            estimated_tokens=estimated_tokens,
+            actual_tokens=lambda response: response.usage.input_tokens + response.usage.output_tokens
+        )
+    
     def generate_response(self, question: str, sources: List[SourceInfo]) -> ChatResponse:
         """
         Generate a response to a question using relevant source information.
@@ -24,8 +42,9 @@ class ClaudeClient:
             # Create the prompt
             prompt = self._create_prompt(question, context)
             
-            # Call Claude API
-            response = self.client.messages.create(
+            # Call Claude API; interactive requests jump ahead of background work
+            response = self._create_message(
+                INTERACTIVE,
                 model=self.model,
                 max_tokens=1000,
                 temperature=0.1,
@@ -98,9 +117,10 @@ Please provide a helpful and accurate response based on the source documents pro
 
         return prompt
     
-    def generate_document_summary(self, text_content: str, document_name: str) -> str:
+    def generate_document_summary(self, text_content: str, document_name: str, fallback: bool = True) -> str:
         """
         Generate a summary for a document using Claude.
+        With fallback disabled, errors are raised instead of returning a placeholder.
         """
         try:
             # Limit text content for summary (first 2000 characters)
@@ -114,7 +134,8 @@ Please provide a helpful and accurate response based on the source documents pro
 
 Summary:"""
 
-            response = self.client.messages.create(
+            response = self._create_message(
+                BACKGROUND,
                 model=self.model,
                 max_tokens=200,
                 temperature=0.1,
@@ -132,6 +153,8 @@ Summary:"""
             
         except Exception as e:
             logger.error(f"Error generating document summary: {str(e)}")
+            if not fallback:
+                raise
             return f"Summary could not be generated. Document content extracted from {document_name}."
     
     def test_connection(self) -> bool:
@@ -139,7 +162,8 @@ Summary:"""
         Test the connection to Claude API.
         """
         try:
-            response = self.client.messages.create(
+            response = self._create_message(
+                INTERACTIVE,
                 model=self.model,
                 max_tokens=10,
                 messages=[
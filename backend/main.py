@@ -1,5 +1,6 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Query, Header, Request, Response, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse
 import os
 import shutil
@@ -10,12 +11,20 @@ from dotenv import load_dotenv
 
 from models import (
     ChatRequest, ChatResponse, DocumentSummary, HealthResponse, 
-    ErrorResponse, Document
+    ErrorResponse, Document, BulkDeleteRequest, BulkDeleteResponse,
+    SourceInfo, ChunkResponse, DocumentVersionResponse
 )
 from document_processor import PDFProcessor
 from vector_store import VectorStore
 from llm_client import ClaudeClient
-from document_manager import DocumentManager
+from document_manager import DocumentManager, DocumentBusyError
+from summary_queue import SummaryQueue
+from request_scheduler import RequestScheduler
+from answer_cache import AnswerCache
+from reconciler import Reconciler
+from profiling import RequestProfiler
+from executors import Executors
+from serialization import fast_json_response, parse_fields, project, project_list
 
 # Load environment variables
 load_dotenv()
@@ -38,19 +47,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Profile-Id"],
 )
 
+# Compress responses for clients that send Accept-Encoding: gzip; small
+# payloads are left alone since compressing them costs more than it saves
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=int(os.getenv("GZIP_MIN_SIZE", "1024")),
+    compresslevel=int(os.getenv("GZIP_LEVEL", "5"))
+)
+
+# Upload size cap, and the size above which uploads are ingested in streaming mode
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024)
+STREAMING_INGEST_BYTES = int(float(os.getenv("STREAMING_INGEST_MB", "10")) * 1024 * 1024)
+
+# Length of the preview text sent in compact source references
+SNIPPET_LENGTH = 200
+
 # Global variables for components
 pdf_processor = None
 vector_store = None
 claude_client = None
 document_manager = None
+summary_queue = None
+answer_cache = None
+reconciler = None
+request_profiler = None
+executors = None
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize components on startup."""
-    global pdf_processor, vector_store, claude_client, document_manager
+    global pdf_processor, vector_store, claude_client, document_manager, summary_queue, answer_cache, reconciler
+    global request_profiler, executors
     
     try:
         # Get configuration from environment
@@ -62,10 +93,27 @@ async def startup_event():
             logger.error("ANTHROPIC_API_KEY not found in environment variables")
             raise ValueError("ANTHROPIC_API_KEY is required")
         
+        # Blocking work runs on a pool per stage so the event loop stays free
+        executors = Executors(
+            cpu_workers=int(os.getenv("CPU_POOL_SIZE", str(os.cpu_count() or 4))),
+            io_workers=int(os.getenv("IO_POOL_SIZE", "16")),
+            llm_workers=int(os.getenv("LLM_POOL_SIZE", "16"))
+        )
+        
         # Initialize components
         pdf_processor = PDFProcessor(sources_path)
         vector_store = VectorStore(vector_db_path)
-        claude_client = ClaudeClient(anthropic_api_key)
+        scheduler = RequestScheduler(
+            max_concurrency=int(os.getenv("CLAUDE_MAX_CONCURRENCY", "4")),
+            requests_per_minute=float(os.getenv("CLAUDE_REQUESTS_PER_MINUTE", "50")),
+            tokens_per_minute=float(os.getenv("CLAUDE_TOKENS_PER_MINUTE", "40000")),
+            max_retries=int(os.getenv("CLAUDE_MAX_RETRIES", "5"))
+        )
+        claude_client = ClaudeClient(
+            anthropic_api_key,
+            scheduler=scheduler,
+            base_url=os.getenv("ANTHROPIC_BASE_URL")
+        )
         
         # Initialize document manager (this will load existing documents)
         document_manager = DocumentManager(sources_path, vector_store, pdf_processor)
@@ -74,6 +122,46 @@ async def startup_event():
         if not claude_client.test_connection():
             logger.warning("Claude API connection test failed")
         
+        answer_cache = AnswerCache(
+            max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+            ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+        )
+        
+        # Upgrade extractive summaries with Claude in the background
+        summary_queue = SummaryQueue(
+            document_manager,
+            claude_client,
+            concurrency=int(os.getenv("SUMMARY_CONCURRENCY", "2")),
+            batch_size=int(os.getenv("SUMMARY_BATCH_SIZE", "8")),
+            executors=executors
+        )
+        if os.getenv("SUMMARY_QUEUE_ENABLED", "true").lower() == "true":
+            summary_queue.start()
+        
+        # Check metadata, files and vectors agree, a small batch at a time,
+        # so startup cost stays flat as the corpus grows
+        reconciler = Reconciler(
+            document_manager,
+            batch_size=int(os.getenv("RECONCILE_BATCH_SIZE", "20")),
+            interval=float(os.getenv("RECONCILE_INTERVAL", "60")),
+            orphan_grace=float(os.getenv("ORPHAN_GRACE_SECONDS", "600")),
+            executors=executors
+        )
+        reconciler.start()
+        
+        # Sample stacks of slow requests, and of any request an admin asks to profile
+        slow_request_seconds = float(os.getenv("SLOW_REQUEST_SECONDS", "10"))
+        profiling_admin_token = os.getenv("PROFILING_ADMIN_TOKEN")
+        if slow_request_seconds > 0 or profiling_admin_token:
+            request_profiler = RequestProfiler(
+                os.getenv("PROFILE_DIR", "./data/profiles"),
+                ring_size=int(os.getenv("PROFILE_RING_SIZE", "50")),
+                slow_threshold=slow_request_seconds,
+                interval=float(os.getenv("PROFILE_SAMPLE_MS", "10")) / 1000,
+                admin_token=profiling_admin_token
+            )
+        
         logger.info("Application startup completed successfully")
         
     except Exception as e:
@@ -81,6 +169,53 @@ async def startup_event():
         raise
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background work on shutdown."""
+    if summary_queue is not None:
+        await summary_queue.stop()
+    if reconciler is not None:
+        await reconciler.stop()
+    if request_profiler is not None:
+        request_profiler.stop()
+    if executors is not None:
+        executors.shutdown()
+    if document_manager is not None:
+        document_manager.unregister_worker()
+
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """
+    Capture a stack profile when an admin asks for one (X-Profile: 1 or
+    ?profile=1 plus X-Admin-Token) or when the request turns out slow.
+    """
+    if request_profiler is None:
+        return await call_next(request)
+    
+    requested = request.headers.get("X-Profile") == "1" or request.query_params.get("profile") == "1"
+    if requested and not request_profiler.is_admin(request.headers.get("X-Admin-Token")):
+        return JSONResponse(status_code=403, content={"detail": "Profiling requires a valid admin token"})
+    
+    token = request_profiler.begin(requested)
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        # Most requests were never captured; only a capture's write leaves the event loop
+        finished = request_profiler.finish(token)
+        profile_id = None
+        if finished is not None:
+            profile_id = await executors.io.run(
+                request_profiler.save, *finished, request.method, request.url.path, status_code
+            )
+    
+    if requested and profile_id:
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
 @app.get("/")
 async def root():
     """Health check endpoint."""
@@ -91,8 +226,8 @@ async def root():
 async def health_check():
     """System health check."""
     try:
-        vector_health = vector_store.health_check()
-        document_count = document_manager.get_document_count()
+        vector_health = await executors.io.run(vector_store.health_check)
+        document_count = await executors.io.run(document_manager.get_document_count)
         
         return HealthResponse(
             status="healthy" if vector_health["status"] == "healthy" else "degraded",
@@ -111,6 +246,21 @@ async def health_check():
         )
 
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Queue depth, worker use and wait/run latency of each executor pool, the
+    Claude scheduler's queues, throttling retries and failures, and the
+    answer cache's size and hit rate.
+    """
+    return {
+        "executors": executors.stats(),
+        "claude_scheduler": claude_client.scheduler.stats(),
+        "answer_cache": answer_cache.stats(),
+        "timestamp": datetime.now()
+    }
+
+
 @app.post("/upload")
 async def upload_document(file: UploadFile = File(...)):
     """Upload and process a PDF document."""
@@ -122,47 +272,54 @@ async def upload_document(file: UploadFile = File(...)):
                 detail="Only PDF files are supported"
             )
         
-        if file.size > 50 * 1024 * 1024:  # 50MB limit
+        if file.size and file.size > MAX_UPLOAD_BYTES:
             raise HTTPException(
                 status_code=400,
-                detail="File size exceeds 50MB limit"
+                detail=f"File size exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)}MB limit"
             )
         
-        # Read file content
-        file_content = await file.read()
-        
-        # Save file to sources directory
-        file_path = pdf_processor.save_uploaded_file(file_content, file.filename)
+        # Stream the upload to the sources directory rather than reading it into memory
+        file_path = await executors.io.run(pdf_processor.save_uploaded_fileobj, file.file, file.filename)
         
         try:
-            # Validate PDF
-            if not pdf_processor.validate_pdf(file_path):
-                pdf_processor.delete_file(file_path)
+            if os.path.getsize(file_path) > MAX_UPLOAD_BYTES:
                 raise HTTPException(
                     status_code=400,
-                    detail="Invalid or corrupted PDF file"
+                    detail=f"File size exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)}MB limit"
                 )
             
-            # Process PDF
-            document = pdf_processor.process_pdf(file_path, file.filename)
-            
-            # Add to vector store
-            if not vector_store.add_document(document):
-                pdf_processor.delete_file(file_path)
+            # Validate PDF
+            if not await executors.cpu.run(pdf_processor.validate_pdf, file_path):
                 raise HTTPException(
-                    status_code=500,
-                    detail="Failed to add document to vector store"
+                    status_code=400,
+                    detail="Invalid or corrupted PDF file"
                 )
             
+            if os.path.getsize(file_path) >= STREAMING_INGEST_BYTES:
+                # Large files: pages -> chunks -> embeddings -> vector store in fixed windows
+                document = await executors.cpu.run(document_manager.ingest_streaming, file_path, file.filename)
+            else:
+                # Process PDF
+                document = await executors.cpu.run(pdf_processor.process_pdf, file_path, file.filename)
+                
+                # Add to vector store
+                if not await executors.cpu.run(vector_store.add_document, document):
+                    raise HTTPException(
+                        status_code=500,
+                        detail="Failed to add document to vector store"
+                    )
+            
             # Store document metadata persistently
-            if not document_manager.add_document(document):
-                pdf_processor.delete_file(file_path)
-                vector_store.delete_document(document.id)
+            if not await executors.io.run(document_manager.add_document, document):
+                await executors.io.run(vector_store.delete_document, document.id)
                 raise HTTPException(
                     status_code=500,
                     detail="Failed to save document metadata"
                 )
             
+            # Better summary arrives later; never block the upload on Claude
+            await executors.io.run(summary_queue.enqueue, document.id)
+            
             # Return document summary
             return DocumentSummary(
                 id=document.id,
@@ -175,7 +332,7 @@ async def upload_document(file: UploadFile = File(...)):
             
         except Exception as e:
             # Cleanup on failure
-            pdf_processor.delete_file(file_path)
+            await executors.io.run(pdf_processor.delete_file, file_path)
             raise
         
     except HTTPException:
@@ -189,33 +346,61 @@ async def upload_document(file: UploadFile = File(...)):
 
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat_with_documents(request: ChatRequest):
-    """Chat with uploaded documents."""
+async def chat_with_documents(request: ChatRequest, fields: Optional[str] = None):
+    """
+    Chat with uploaded documents.
+
+    `fields` optionally restricts the response to a comma-separated list of
+    fields, e.g. "answer,sources.document_name,sources.page_start".
+    """
     try:
+        selection = parse_fields(fields)
         if not request.question.strip():
             raise HTTPException(
                 status_code=400,
                 detail="Question cannot be empty"
             )
         
-        # Search for relevant sources
-        sources = vector_store.search(
+        if request.mmr_lambda is not None and not 0 <= request.mmr_lambda <= 1:
+            raise HTTPException(
+                status_code=400,
+                detail="mmr_lambda must be between 0 and 1"
+            )
+        
+        # Search for relevant sources, keeping the embedding for the answer cache
+        query_embedding = await executors.cpu.run(vector_store.embed_query, request.question)
+        sources = await executors.cpu.run(
+            vector_store.search,
             query=request.question,
             n_results=5,
-            document_ids=request.document_ids
+            document_ids=request.document_ids,
+            query_embedding=query_embedding,
+            mmr_lambda=request.mmr_lambda
         )
         
         if not sources:
-            return ChatResponse(
+            response = ChatResponse(
                 answer="I couldn't find any relevant information in the uploaded documents to answer your question. Please make sure you have uploaded relevant PDF documents.",
                 sources=[],
                 timestamp=datetime.now()
             )
+            return fast_json_response(project(response.dict(), selection))
+        
+        # Near-duplicate question over the same retrieved chunks: reuse the answer
+        cached = answer_cache.lookup(
+            query_embedding, request.document_ids, [source.chunk_id for source in sources]
+        )
+        if cached is not None:
+            response = cached.copy(update={"timestamp": datetime.now()})
+        else:
+            # Generate response using Claude; the scheduler may block, so keep it off the event loop
+            response = await executors.llm.run(claude_client.generate_response, request.question, sources)
+            answer_cache.store(query_embedding, request.document_ids, response.copy())
         
-        # Generate response using Claude
-        response = await claude_client.generate_response(request.question, sources)
+        if request.compact_sources:
+            response.sources = [_compact_source(source) for source in response.sources]
         
-        return response
+        return fast_json_response(project(response.dict(), selection))
         
     except HTTPException:
         raise
@@ -227,12 +412,95 @@ async def chat_with_documents(request: ChatRequest):
         )
 
 
-@app.get("/documents", response_model=List[DocumentSummary])
-async def get_documents():
-    """Get list of all uploaded documents."""
+def _compact_source(source: SourceInfo) -> SourceInfo:
+    """
+    Replace a source's full chunk text with a short snippet. The full text is
+    served by /chunks/{chunk_id}, with ?start=&end= for small-to-big spans.
+    """
+    content = source.chunk_content or ""
+    snippet = content if len(content) <= SNIPPET_LENGTH else content[:SNIPPET_LENGTH] + "..."
+    return source.copy(update={"chunk_content": None, "snippet": snippet})
+
+
+@app.get("/chunks/{chunk_id}", response_model=ChunkResponse)
+async def get_chunk(
+    chunk_id: str,
+    neighbors: int = Query(0, ge=0, le=5),
+    start: Optional[int] = Query(None, ge=0),
+    end: Optional[int] = Query(None, ge=1)
+):
+    """
+    Get a chunk's full text and, optionally, its neighbouring chunks. Given
+    the start and end offsets of a small-to-big source, get that span's text
+    and pages instead.
+    """
     try:
-        return document_manager.get_all_documents()
+        if (start is None) != (end is None):
+            raise HTTPException(
+                status_code=400,
+                detail="start and end must be given together"
+            )
+        try:
+            result = await executors.io.run(vector_store.get_chunk, chunk_id, neighbors=neighbors, start=start, end=end)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if result is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Chunk not found"
+            )
+        
+        chunk, neighbor_chunks = result
+        return ChunkResponse(chunk=chunk, neighbors=neighbor_chunks)
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Get chunk error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to retrieve chunk: {str(e)}"
+        )
+
+
+@app.get("/documents", response_model=List[DocumentSummary])
+async def get_documents(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    name: Optional[str] = None,
+    file_type: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    """
+    Get uploaded documents, newest first.
+
+    Supports cursor pagination (the next cursor is returned in the
+    X-Next-Cursor header), name/type filters and `fields` projection.
+    Responses carry an ETag so unchanged polls are answered with 304 Not
+    Modified.
+    """
+    try:
+        selection = parse_fields(fields)
+        etag = await executors.io.run(lambda: document_manager.etag)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+        documents, next_cursor = await executors.io.run(
+            document_manager.list_documents,
+            limit=limit, cursor=cursor, name=name, file_type=file_type
+        )
+
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        return fast_json_response(
+            project_list([doc.dict() for doc in documents], selection),
+            headers=headers
+        )
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Get documents error: {str(e)}")
         raise HTTPException(
@@ -241,12 +509,52 @@ async def get_documents():
         )
 
 
+@app.post("/documents/bulk-delete", response_model=BulkDeleteResponse)
+async def bulk_delete_documents(request: BulkDeleteRequest, background_tasks: BackgroundTasks):
+    """Delete many documents by id or by name/type filter."""
+    try:
+        if request.document_ids is None and not (request.name or request.file_type):
+            raise HTTPException(
+                status_code=400,
+                detail="Provide document_ids or a name/file_type filter"
+            )
+
+        results, file_paths = await executors.io.run(
+            document_manager.delete_documents,
+            doc_ids=request.document_ids,
+            name=request.name,
+            file_type=request.file_type
+        )
+
+        answer_cache.invalidate_documents(
+            [doc_id for doc_id, status in results.items() if status == "deleted"]
+        )
+        
+        # Source files are no longer referenced; remove them after responding
+        if file_paths:
+            background_tasks.add_task(document_manager.delete_files, file_paths)
+
+        return BulkDeleteResponse(
+            results=results,
+            deleted_count=sum(1 for status in results.values() if status == "deleted")
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Bulk delete error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Bulk delete failed: {str(e)}"
+        )
+
+
 @app.delete("/documents/{doc_id}")
 async def delete_document(doc_id: str):
     """Delete a document and all its data."""
     try:
         # Check if document exists
-        document = document_manager.get_document(doc_id)
+        document = await executors.io.run(document_manager.get_record, doc_id)
         if not document:
             raise HTTPException(
                 status_code=404,
@@ -254,7 +562,8 @@ async def delete_document(doc_id: str):
             )
         
         # Delete using document manager (handles all cleanup)
-        if document_manager.delete_document(doc_id):
+        if await executors.io.run(document_manager.delete_document, doc_id):
+            answer_cache.invalidate_documents([doc_id])
             return {"message": "Document deleted successfully", "document_id": doc_id}
         else:
             raise HTTPException(
@@ -272,6 +581,101 @@ async def delete_document(doc_id: str):
         )
 
 
+@app.post("/documents/{doc_id}/versions", response_model=DocumentVersionResponse)
+async def upload_document_version(doc_id: str, file: UploadFile = File(...)):
+    """
+    Upload a revised PDF for an existing document. Only chunks whose text
+    changed are re-embedded; the document keeps its id.
+    """
+    try:
+        previous = await executors.io.run(document_manager.get_record, doc_id)
+        if not previous:
+            raise HTTPException(
+                status_code=404,
+                detail="Document not found"
+            )
+
+        if not file.filename.lower().endswith('.pdf'):
+            raise HTTPException(
+                status_code=400,
+                detail="Only PDF files are supported"
+            )
+
+        file_path = await executors.io.run(pdf_processor.save_uploaded_fileobj, file.file, file.filename)
+
+        try:
+            if os.path.getsize(file_path) > MAX_UPLOAD_BYTES:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"File size exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)}MB limit"
+                )
+
+            if not await executors.cpu.run(pdf_processor.validate_pdf, file_path):
+                raise HTTPException(
+                    status_code=400,
+                    detail="Invalid or corrupted PDF file"
+                )
+
+            document, stats = await executors.cpu.run(document_manager.ingest_new_version, doc_id, file_path)
+
+        except Exception as e:
+            await executors.io.run(pdf_processor.delete_file, file_path)
+            if isinstance(e, KeyError):
+                raise HTTPException(status_code=404, detail="Document not found")
+            if isinstance(e, DocumentBusyError):
+                raise HTTPException(status_code=409, detail="Another version of this document is being uploaded")
+            raise
+
+        answer_cache.invalidate_documents([doc_id])
+        if document.summary != previous.summary:
+            await executors.io.run(summary_queue.enqueue, doc_id)
+
+        return DocumentVersionResponse(
+            document=DocumentSummary(
+                id=document.id,
+                name=document.name,
+                file_type=document.file_type,
+                summary=document.summary,
+                created_at=document.created_at,
+                file_size=document.file_size
+            ),
+            version=document.version,
+            **stats
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Version upload error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Version upload failed: {str(e)}"
+        )
+
+
+def _require_profiler_admin(admin_token: Optional[str]) -> RequestProfiler:
+    if request_profiler is None or not request_profiler.is_admin(admin_token):
+        raise HTTPException(status_code=403, detail="Profiles require a valid admin token")
+    return request_profiler
+
+
+@app.get("/admin/profiles")
+async def list_profiles(x_admin_token: Optional[str] = Header(None)):
+    """List stored request profiles, newest first."""
+    profiler = _require_profiler_admin(x_admin_token)
+    return {"profiles": await executors.io.run(profiler.list_profiles)}
+
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Return one stored request profile."""
+    profiler = _require_profiler_admin(x_admin_token)
+    profile = await executors.io.run(profiler.get_profile, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return fast_json_response(profile)
+
+
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
     """Global exception handler."""
@@ -288,4 +692,9 @@ async def general_exception_handler(request, exc):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        # Workers share metadata through SQLite; set CHROMA_HOST so they share vectors too
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,511 @@
+import os
+import sys
+import json
+import uuid
+import sqlite3
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+from models import Document, DocumentRecord
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataStore:
+    """
+    SQLite (WAL mode) backed document metadata shared by every worker process.
+
+    Each write runs in its own transaction and appends to a change log, so
+    other processes can cheaply detect and replay changes instead of
+    re-reading the whole store.
+    """
+
+    # Change log entries kept around for workers that are catching up
+    CHANGE_LOG_RETENTION = 10000
+    # A worker that has not reported its change log position for this long
+    # is presumed gone; if it comes back it reloads everything
+    READER_TTL = 600.0
+    # An 'updating' claim older than this belongs to a worker that died mid-update
+    UPDATE_CLAIM_TTL = 3600.0
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._create_schema()
+
+        logger.info(f"Initialized metadata store at {db_path}")
+
+    def _create_schema(self):
+        with self._transaction() as cur:
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "id TEXT PRIMARY KEY, created_at TEXT NOT NULL, data TEXT NOT NULL)"
+            )
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS changes ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, doc_id TEXT NOT NULL, op TEXT NOT NULL)"
+            )
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS readers ("
+                "worker_id TEXT PRIMARY KEY, seq INTEGER NOT NULL, seen_at REAL NOT NULL)"
+            )
+            cur.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS summary_jobs ("
+                "doc_id TEXT PRIMARY KEY, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "claimed_at REAL)"
+            )
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS manifest ("
+                "doc_id TEXT PRIMARY KEY, checksum TEXT, chunk_count INTEGER NOT NULL, "
+                "file_path TEXT NOT NULL, file_size INTEGER, file_mtime REAL, "
+                "status TEXT NOT NULL DEFAULT 'ok', verified_at REAL NOT NULL DEFAULT 0)"
+            )
+            cur.execute("CREATE INDEX IF NOT EXISTS manifest_verified ON manifest (verified_at)")
+            cur.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('store_id', ?)", (uuid.uuid4().hex[:8],))
+
+    def _transaction(self, write: bool = True):
+        return _Transaction(self._conn, self._lock, write)
+
+    @property
+    def store_id(self) -> str:
+        return self.get_meta('store_id')
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._transaction() as cur:
+            cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def claim(self, key: str, stale_after: float) -> bool:
+        """
+        Atomically claim a one-off job shared by every worker. Succeeds when
+        nobody holds `key`, or its holder has not refreshed the claim (with
+        touch_claim) for `stale_after` seconds and presumably died.
+        """
+        now = time.time()
+        with self._transaction() as cur:
+            row = cur.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            if row and now - float(row[0]) < stale_after:
+                return False
+            cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(now)))
+        return True
+
+    def touch_claim(self, key: str):
+        self.set_meta(key, str(time.time()))
+
+    def release_claim(self, key: str):
+        with self._transaction() as cur:
+            cur.execute("DELETE FROM meta WHERE key = ?", (key,))
+
+    @staticmethod
+    def _serialize(document: Document) -> str:
+        return json.dumps(document.dict(), default=str)
+
+    @staticmethod
+    def _deserialize(data: str) -> Document:
+        doc_data = json.loads(data)
+        if isinstance(doc_data.get('created_at'), str):
+            doc_data['created_at'] = datetime.fromisoformat(doc_data['created_at'])
+        return Document(**doc_data)
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()
+        return row[0] == 0
+
+    # Record fields are read with SQLite's JSON functions, so listing every
+    # document never builds the chunk lists in Python
+    _RECORD_QUERY = (
+        "SELECT id, json_extract(data, '$.name'), json_extract(data, '$.file_type'), "
+        "json_extract(data, '$.file_path'), json_extract(data, '$.summary'), created_at, "
+        "json_extract(data, '$.file_size'), json_array_length(data, '$.chunks'), "
+        "COALESCE(json_extract(data, '$.version'), 1) FROM documents"
+    )
+
+    @staticmethod
+    def _to_record(row) -> DocumentRecord:
+        doc_id, name, file_type, file_path, summary, created_at, file_size, chunk_count, version = row
+        return DocumentRecord(
+            doc_id, name, sys.intern(file_type), file_path, summary,
+            datetime.fromisoformat(created_at), file_size, chunk_count, version
+        )
+
+    def load_records(self) -> Tuple[Dict[str, DocumentRecord], int]:
+        """
+        Load the record of every document along with the change sequence it
+        reflects.
+        """
+        with self._transaction(write=False) as cur:
+            seq = self._current_seq(cur)
+            rows = cur.execute(self._RECORD_QUERY).fetchall()
+
+        records = {}
+        for row in rows:
+            try:
+                records[row[0]] = self._to_record(row)
+            except Exception as e:
+                logger.warning(f"Skipping invalid document metadata for ID {row[0]}: {e}")
+        return records, seq
+
+    def get(self, doc_id: str) -> Optional[Document]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        return self._deserialize(row[0]) if row else None
+
+    def put(self, document: Document, replace: bool = False) -> bool:
+        """
+        Insert a document, or overwrite it when replace is set.
+        Returns False if the document already exists and replace is not set.
+        """
+        verb = "INSERT OR REPLACE" if replace else "INSERT"
+        try:
+            with self._transaction() as cur:
+                cur.execute(
+                    f"{verb} INTO documents (id, created_at, data) VALUES (?, ?, ?)",
+                    (document.id, document.created_at.isoformat(), self._serialize(document))
+                )
+                cur.execute("INSERT INTO changes (doc_id, op) VALUES (?, 'put')", (document.id,))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def update(self, document: Document) -> bool:
+        """
+        Overwrite a document that still exists. Returns False, without
+        resurrecting it, if it was deleted in the meantime.
+        """
+        with self._transaction() as cur:
+            cur.execute(
+                "UPDATE documents SET created_at = ?, data = ? WHERE id = ?",
+                (document.created_at.isoformat(), self._serialize(document), document.id)
+            )
+            if not cur.rowcount:
+                return False
+            cur.execute("INSERT INTO changes (doc_id, op) VALUES (?, 'put')", (document.id,))
+        return True
+
+    def put_many(self, documents: List[Document]):
+        with self._transaction() as cur:
+            for document in documents:
+                cur.execute(
+                    "INSERT OR REPLACE INTO documents (id, created_at, data) VALUES (?, ?, ?)",
+                    (document.id, document.created_at.isoformat(), self._serialize(document))
+                )
+                cur.execute("INSERT INTO changes (doc_id, op) VALUES (?, 'put')", (document.id,))
+
+    def update_summaries(self, summaries: Dict[str, Tuple[int, str]]) -> set:
+        """
+        Set the summaries of documents, given as doc_id -> (version, summary).
+        Only the summary field is rewritten, in place, and only while the
+        document is still at the version the summary was generated from, so
+        a deleted document is never resurrected and a new version never gets
+        its predecessor's summary. Returns the ids of documents that moved to
+        another version, whose summaries were not written.
+        """
+        superseded = set()
+        with self._transaction() as cur:
+            for doc_id, (version, summary) in summaries.items():
+                cur.execute(
+                    "UPDATE documents SET data = json_set(data, '$.summary', ?) "
+                    "WHERE id = ? AND COALESCE(json_extract(data, '$.version'), 1) = ?",
+                    (summary, doc_id, version)
+                )
+                if cur.rowcount:
+                    cur.execute("INSERT INTO changes (doc_id, op) VALUES (?, 'put')", (doc_id,))
+                elif cur.execute("SELECT 1 FROM documents WHERE id = ?", (doc_id,)).fetchone():
+                    superseded.add(doc_id)
+        return superseded
+
+    def delete(self, doc_id: str) -> bool:
+        return self.delete_many([doc_id]) == 1
+
+    def delete_many(self, doc_ids: List[str]) -> int:
+        deleted = 0
+        with self._transaction() as cur:
+            for doc_id in doc_ids:
+                cur.execute("DELETE FROM manifest WHERE doc_id = ?", (doc_id,))
+                cur.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+                if cur.rowcount:
+                    deleted += 1
+                    cur.execute("INSERT INTO changes (doc_id, op) VALUES (?, 'delete')", (doc_id,))
+        return deleted
+
+    def current_seq(self) -> int:
+        with self._lock:
+            return self._current_seq(self._conn)
+
+    @staticmethod
+    def _current_seq(cur) -> int:
+        row = cur.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()
+        return row[0]
+
+    def changes_since(self, seq: int) -> Optional[Tuple[List[Tuple[str, Optional[DocumentRecord]]], int]]:
+        """
+        Return (doc_id, record-or-None) pairs changed after seq and the new
+        sequence number, or None if the change log no longer reaches back to
+        seq and the caller must reload everything.
+        """
+        with self._transaction(write=False) as cur:
+            oldest = cur.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+            latest = self._current_seq(cur)
+            if latest == seq:
+                return [], seq
+            if oldest is None or oldest > seq + 1:
+                return None
+
+            doc_ids = [row[0] for row in cur.execute(
+                "SELECT DISTINCT doc_id FROM changes WHERE seq > ?", (seq,)
+            ).fetchall()]
+            changed = []
+            for doc_id in doc_ids:
+                row = cur.execute(self._RECORD_QUERY + " WHERE id = ?", (doc_id,)).fetchone()
+                changed.append((doc_id, self._to_record(row) if row else None))
+        return changed, latest
+
+    def report_position(self, worker_id: str, seq: int):
+        """Record the change sequence a worker has caught up to, so pruning leaves it what it still needs."""
+        with self._transaction() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO readers (worker_id, seq, seen_at) VALUES (?, ?, ?)",
+                (worker_id, seq, time.time())
+            )
+
+    def remove_reader(self, worker_id: str):
+        with self._transaction() as cur:
+            cur.execute("DELETE FROM readers WHERE worker_id = ?", (worker_id,))
+
+    def live_readers(self, reader_ttl: Optional[float] = None) -> List[str]:
+        """Workers that reported their change log position within `reader_ttl` seconds."""
+        live_since = time.time() - (self.READER_TTL if reader_ttl is None else reader_ttl)
+        with self._lock:
+            rows = self._conn.execute("SELECT worker_id FROM readers WHERE seen_at >= ?", (live_since,)).fetchall()
+        return [row[0] for row in rows]
+
+    def prune_changes(self, reader_ttl: Optional[float] = None) -> int:
+        """
+        Drop change log entries beyond the retention window, but never ones a
+        live worker (one that reported its position within `reader_ttl`
+        seconds) has yet to replay. Returns the number of entries dropped.
+        """
+        live_since = time.time() - (self.READER_TTL if reader_ttl is None else reader_ttl)
+        with self._transaction() as cur:
+            cur.execute("DELETE FROM readers WHERE seen_at < ?", (live_since,))
+            oldest_needed = cur.execute("SELECT MIN(seq) FROM readers").fetchone()[0]
+            cutoff = self._current_seq(cur) - self.CHANGE_LOG_RETENTION
+            if oldest_needed is not None:
+                cutoff = min(cutoff, oldest_needed)
+            cur.execute("DELETE FROM changes WHERE seq <= ?", (cutoff,))
+            return cur.rowcount
+
+    def put_manifest(self, doc_id: str, checksum: Optional[str], chunk_count: int, file_path: str,
+                     file_size: Optional[int], file_mtime: Optional[float], status: str = 'ok'):
+        with self._transaction() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO manifest "
+                "(doc_id, checksum, chunk_count, file_path, file_size, file_mtime, status, verified_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (doc_id, checksum, chunk_count, file_path, file_size, file_mtime, status, time.time())
+            )
+
+    def begin_update(self, doc_id: str, stale_after: Optional[float] = None) -> Optional[str]:
+        """
+        Claim a document for an update that rewrites its vectors, by setting
+        its manifest status to 'updating'; every worker sees the claim.
+        Returns the previous status, to be restored if the update is
+        abandoned, or None if another update holds the document. Raises
+        KeyError if the document no longer exists.
+        """
+        stale_after = self.UPDATE_CLAIM_TTL if stale_after is None else stale_after
+        now = time.time()
+        with self._transaction() as cur:
+            if not cur.execute("SELECT 1 FROM documents WHERE id = ?", (doc_id,)).fetchone():
+                raise KeyError(doc_id)
+            row = cur.execute("SELECT status, verified_at FROM manifest WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is None:
+                cur.execute(
+                    "INSERT INTO manifest (doc_id, chunk_count, file_path, status, verified_at) "
+                    "VALUES (?, 0, '', 'updating', ?)",
+                    (doc_id, now)
+                )
+                return 'ok'
+            status, claimed_at = row
+            if status == 'updating' and now - claimed_at < stale_after:
+                return None
+            cur.execute("UPDATE manifest SET status = 'updating', verified_at = ? WHERE doc_id = ?", (now, doc_id))
+        return 'ok' if status == 'updating' else status
+
+    def set_manifest_status(self, doc_id: str, status: str):
+        with self._transaction() as cur:
+            cur.execute("UPDATE manifest SET status = ? WHERE doc_id = ?", (status, doc_id))
+
+    def touch_manifest(self, doc_id: str):
+        """Refresh a manifest entry's timestamp, e.g. as an in-flight ingest's heartbeat."""
+        with self._transaction() as cur:
+            cur.execute("UPDATE manifest SET verified_at = ? WHERE doc_id = ?", (time.time(), doc_id))
+
+    def ingesting_ids(self, doc_ids: List[str], since: float) -> set:
+        """Ids among doc_ids with an ingest in flight that reported progress after `since`."""
+        if not doc_ids:
+            return set()
+        placeholders = ",".join("?" * len(doc_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT doc_id FROM manifest WHERE status = 'ingesting' AND verified_at >= ? "
+                f"AND doc_id IN ({placeholders})",
+                [since] + list(doc_ids)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def get_manifest(self, doc_id: str) -> Optional[Dict]:
+        with self._lock:
+            cur = self._conn.execute("SELECT * FROM manifest WHERE doc_id = ?", (doc_id,))
+            row = cur.fetchone()
+            columns = [c[0] for c in cur.description]
+        return dict(zip(columns, row)) if row else None
+
+    def least_recently_verified(self, limit: int) -> List[str]:
+        """
+        Document ids due for verification: those with no manifest entry
+        first, then by oldest verification time.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT d.id FROM documents d LEFT JOIN manifest m ON m.doc_id = d.id "
+                "ORDER BY COALESCE(m.verified_at, -1) LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def stale_manifest_ids(self, limit: int, ingest_since: float = 0.0) -> List[str]:
+        """
+        Manifest entries whose document metadata no longer exists, other than
+        ingests still in flight (progress reported after `ingest_since`).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT m.doc_id FROM manifest m LEFT JOIN documents d ON d.id = m.doc_id "
+                "WHERE d.id IS NULL AND NOT (m.status = 'ingesting' AND m.verified_at >= ?) LIMIT ?",
+                (ingest_since, limit)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def delete_manifest(self, doc_ids: List[str]):
+        with self._transaction() as cur:
+            for doc_id in doc_ids:
+                cur.execute("DELETE FROM manifest WHERE doc_id = ?", (doc_id,))
+
+    def has_documents(self, doc_ids: List[str]) -> set:
+        if not doc_ids:
+            return set()
+        placeholders = ",".join("?" * len(doc_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM documents WHERE id IN ({placeholders})", list(doc_ids)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def enqueue_summary(self, doc_id: str):
+        with self._transaction() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO summary_jobs (doc_id, status, attempts) VALUES (?, 'pending', 0)",
+                (doc_id,)
+            )
+
+    def claim_summary_jobs(self, limit: int, stale_after: float) -> List[Tuple[str, int, float]]:
+        """
+        Atomically claim up to `limit` pending jobs, including jobs claimed by
+        a worker that died more than `stale_after` seconds ago.
+        Returns (doc_id, attempts, claimed_at) triples; claimed_at identifies
+        the claim when the job is finished.
+        """
+        now = time.time()
+        with self._transaction() as cur:
+            rows = cur.execute(
+                "SELECT doc_id, attempts FROM summary_jobs "
+                "WHERE status = 'pending' OR (status = 'running' AND claimed_at < ?) "
+                "ORDER BY rowid LIMIT ?",
+                (now - stale_after, limit)
+            ).fetchall()
+            for doc_id, _ in rows:
+                cur.execute(
+                    "UPDATE summary_jobs SET status = 'running', claimed_at = ?, attempts = attempts + 1 "
+                    "WHERE doc_id = ?",
+                    (now, doc_id)
+                )
+        return [(doc_id, attempts + 1, now) for doc_id, attempts in rows]
+
+    def finish_summary_jobs(self, done: List[Tuple[str, float]], retry: List[Tuple[str, float]],
+                            failed: List[Tuple[str, float]], requeue: List[Tuple[str, float]] = ()):
+        """
+        Settle claimed jobs, each given as (doc_id, claimed_at). A job that was
+        re-enqueued or re-claimed since belongs to someone else and is left
+        alone. Requeued jobs go back to pending with a fresh attempt count.
+        """
+        with self._transaction() as cur:
+            for doc_id, claimed_at in done:
+                cur.execute("DELETE FROM summary_jobs WHERE doc_id = ? AND claimed_at = ?", (doc_id, claimed_at))
+            for doc_id, claimed_at in retry:
+                cur.execute(
+                    "UPDATE summary_jobs SET status = 'pending', claimed_at = NULL WHERE doc_id = ? AND claimed_at = ?",
+                    (doc_id, claimed_at)
+                )
+            for doc_id, claimed_at in failed:
+                cur.execute(
+                    "UPDATE summary_jobs SET status = 'failed' WHERE doc_id = ? AND claimed_at = ?",
+                    (doc_id, claimed_at)
+                )
+            for doc_id, claimed_at in requeue:
+                cur.execute(
+                    "UPDATE summary_jobs SET status = 'pending', claimed_at = NULL, attempts = 0 "
+                    "WHERE doc_id = ? AND claimed_at = ?",
+                    (doc_id, claimed_at)
+                )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _Transaction:
+    """
+    Serializes access to the shared connection and wraps the block in a
+    transaction. Writes use BEGIN IMMEDIATE so concurrent writers from other
+    processes wait on SQLite's lock instead of failing mid-write; reads get a
+    consistent snapshot without blocking writers.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, lock: threading.Lock, write: bool = True):
+        self._conn = conn
+        self._lock = lock
+        self._write = write
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._conn.execute("BEGIN IMMEDIATE" if self._write else "BEGIN")
+        except Exception:
+            self._lock.release()
+            raise
+        return self._conn.cursor()
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._conn.execute("COMMIT")
+            else:
+                self._conn.execute("ROLLBACK")
+        finally:
+            self._lock.release()
+        return False
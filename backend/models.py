@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Dict
 from datetime import datetime
 
 
@@ -10,6 +10,11 @@ class DocumentChunk(BaseModel):
     chunk_index: int
     start_char: int
     end_char: int
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+    # Word positions in the chunk where a new page begins, once per page
+    # passed (pages without text included)
+    page_breaks: Optional[List[int]] = None
 
 
 class Document(BaseModel):
@@ -21,18 +26,64 @@ class Document(BaseModel):
     chunks: List[DocumentChunk]
     created_at: datetime
     file_size: int
+    version: int = 1
+
+
+class DocumentRecord:
+    """
+    The fields of a Document needed to list, look up and delete it, without
+    its chunks. One is kept in memory per document, so it is a slotted class
+    rather than a Pydantic model; the full Document is loaded from the
+    metadata store on demand.
+    """
+    __slots__ = ("id", "name", "file_type", "file_path", "summary", "created_at", "file_size",
+                 "chunk_count", "version")
+
+    def __init__(self, id: str, name: str, file_type: str, file_path: str, summary: str,
+                 created_at: datetime, file_size: int, chunk_count: int = 0, version: int = 1):
+        self.id = id
+        self.name = name
+        self.file_type = file_type
+        self.file_path = file_path
+        self.summary = summary
+        self.created_at = created_at
+        self.file_size = file_size
+        self.chunk_count = chunk_count
+        self.version = version
+
+    def to_summary(self) -> "DocumentSummary":
+        return DocumentSummary(
+            id=self.id,
+            name=self.name,
+            file_type=self.file_type,
+            summary=self.summary,
+            created_at=self.created_at,
+            file_size=self.file_size,
+        )
 
 
 class ChatRequest(BaseModel):
     question: str
     document_ids: Optional[List[str]] = None
+    compact_sources: bool = False
+    # Maximal marginal relevance trade-off (0-1); None keeps plain top-k
+    mmr_lambda: Optional[float] = None
 
 
 class SourceInfo(BaseModel):
     document_id: str
     document_name: str
-    chunk_content: str
+    chunk_content: Optional[str] = None
     relevance_score: float
+    chunk_id: Optional[str] = None
+    chunk_index: Optional[int] = None
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+    snippet: Optional[str] = None
+    # Set for small-to-big spans, which can cover several chunks: the span's
+    # offsets in the document, for /chunks/{chunk_id}?start=&end=
+    start_char: Optional[int] = None
+    end_char: Optional[int] = None
 
 
 class ChatResponse(BaseModel):
@@ -50,6 +101,42 @@ class DocumentSummary(BaseModel):
     file_size: int
 
 
+class ChunkInfo(BaseModel):
+    id: str
+    document_id: str
+    document_name: str
+    chunk_index: int
+    content: str
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+    start_char: Optional[int] = None
+    end_char: Optional[int] = None
+
+
+class ChunkResponse(BaseModel):
+    chunk: ChunkInfo
+    neighbors: List[ChunkInfo]
+
+
+class BulkDeleteRequest(BaseModel):
+    document_ids: Optional[List[str]] = None
+    name: Optional[str] = None
+    file_type: Optional[str] = None
+
+
+class BulkDeleteResponse(BaseModel):
+    results: Dict[str, str]
+    deleted_count: int
+
+
+class DocumentVersionResponse(BaseModel):
+    document: DocumentSummary
+    version: int
+    reused_chunks: int
+    embedded_chunks: int
+    deleted_chunks: int
+
+
 class HealthResponse(BaseModel):
     status: str
     vector_db_status: str
@@ -0,0 +1,251 @@
+import os
+import re
+import sys
+import hmac
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_PROFILE_ID = re.compile(r"^[0-9]+-[0-9a-f]{8}$")
+
+# Leaf frames of threads that are parked rather than working: the event loop
+# waiting in select(), idle executor workers and threads blocked on a lock
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+}
+
+
+class _Capture:
+    __slots__ = ("reason", "stacks", "samples", "started")
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = time.monotonic()
+
+
+class _InFlight:
+    __slots__ = ("started", "capture", "done")
+
+    def __init__(self, started: float, capture: Optional[_Capture]):
+        self.started = started
+        self.capture = capture
+        self.done = False
+
+
+class RequestProfiler:
+    """
+    Stack-sampling profiler for individual requests.
+
+    A single daemon thread samples the stacks of every thread through
+    sys._current_frames() every `interval` seconds, but only while some
+    request is being captured:
+      * requests that asked for a profile are sampled from the start
+      * any other request is sampled once it has run longer than
+        `slow_threshold` seconds (0 disables this)
+    When nothing is in flight the thread sleeps, and while requests are in
+    flight but none is due it sleeps until the next one would cross the
+    threshold, so the fast path costs a dict insert and removal.
+
+    Samples cover all threads, including the worker threads that run
+    embedding and PDF parsing, so a capture taken while several requests
+    overlap shows their combined work. Finished captures are written as JSON
+    (collapsed stacks plus self/inclusive top lists) to `profile_dir`, which
+    keeps only the newest `ring_size` profiles.
+    """
+
+    def __init__(self, profile_dir: str, ring_size: int = 50, slow_threshold: float = 10.0,
+                 interval: float = 0.01, admin_token: Optional[str] = None, top_n: int = 25):
+        self.profile_dir = profile_dir
+        self.ring_size = ring_size
+        self.slow_threshold = slow_threshold
+        self.interval = interval
+        self.admin_token = admin_token
+        self.top_n = top_n
+        os.makedirs(profile_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._inflight: Dict[int, _InFlight] = {}
+        self._next_token = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        """
+        On-demand profiles and the stored ring are only available to callers
+        presenting the configured admin token.
+        """
+        if not self.admin_token or not token:
+            return False
+        return hmac.compare_digest(token.encode(), self.admin_token.encode())
+
+    def begin(self, requested: bool = False) -> int:
+        """
+        Register a request; returns a token to pass to finish().
+        """
+        with self._lock:
+            self._next_token += 1
+            token = self._next_token
+            self._inflight[token] = _InFlight(time.monotonic(), _Capture("requested") if requested else None)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return token
+
+    def finish(self, token: int) -> Optional[Tuple[_Capture, float]]:
+        """
+        Unregister a request. Returns its capture and duration when one was
+        taken, for save(), or None. Only a dict removal, so it is safe to call
+        on the event loop for every request.
+        """
+        with self._lock:
+            entry = self._inflight.pop(token, None)
+            if entry is not None:
+                entry.done = True
+        if entry is None or entry.capture is None:
+            return None
+        return entry.capture, time.monotonic() - entry.started
+
+    def save(self, capture: _Capture, duration: float, method: str, path: str, status_code: int) -> Optional[str]:
+        """
+        Write a capture returned by finish() to disk. Returns the profile id,
+        or None if it could not be saved.
+        """
+        try:
+            return self._write(capture, method, path, status_code, duration)
+        except OSError as e:
+            logger.error(f"Could not save request profile: {str(e)}")
+            return None
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stopped:
+            with self._lock:
+                now = time.monotonic()
+                active: List[_InFlight] = []
+                next_due = None
+                for entry in self._inflight.values():
+                    if entry.capture is None and self.slow_threshold > 0:
+                        due = entry.started + self.slow_threshold
+                        if now >= due:
+                            entry.capture = _Capture("slow")
+                        elif next_due is None or due < next_due:
+                            next_due = due
+                    if entry.capture is not None:
+                        active.append(entry)
+                # Cleared under the lock so a begin() racing with the wait still wakes us
+                self._wake.clear()
+
+            if active:
+                stacks = self._sample(own_ident)
+                with self._lock:
+                    # Requests that finished while we sampled are already being written
+                    for entry in active:
+                        if not entry.done:
+                            entry.capture.stacks.update(stacks)
+                            entry.capture.samples += 1
+                time.sleep(self.interval)
+            else:
+                self._wake.wait(None if next_due is None else max(next_due - now, 0.0))
+
+    @staticmethod
+    def _sample(own_ident: int) -> Counter:
+        stacks: Counter = Counter()
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            names.reverse()
+            stacks[";".join(names)] += 1
+        return stacks
+
+    def _write(self, capture: _Capture, method: str, path: str, status_code: int, duration: float) -> str:
+        self_counts: Counter = Counter()
+        inclusive_counts: Counter = Counter()
+        for stack, count in capture.stacks.items():
+            frames = stack.split(";")
+            self_counts[frames[-1]] += count
+            for name in set(frames):
+                inclusive_counts[name] += count
+
+        profile_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        profile = {
+            "id": profile_id,
+            "reason": capture.reason,
+            "method": method,
+            "path": path,
+            "status_code": status_code,
+            "duration_ms": round(duration * 1000, 1),
+            "sampled_ms": round((time.monotonic() - capture.started) * 1000, 1),
+            "interval_ms": self.interval * 1000,
+            "samples": capture.samples,
+            "top_self": self_counts.most_common(self.top_n),
+            "top_inclusive": inclusive_counts.most_common(self.top_n),
+            # "frame;frame;frame count" lines, as read by flamegraph.pl and speedscope
+            "collapsed": [f"{stack} {count}" for stack, count in capture.stacks.most_common()],
+        }
+
+        path_on_disk = os.path.join(self.profile_dir, f"{profile_id}.json")
+        with open(path_on_disk, "w") as f:
+            json.dump(profile, f)
+        self._prune()
+
+        logger.info(f"Saved {capture.reason} profile {profile_id} for {method} {path} ({duration * 1000:.0f} ms)")
+        return profile_id
+
+    def _profile_files(self) -> List[str]:
+        # Ids start with a millisecond timestamp, so name order is age order
+        return sorted(name for name in os.listdir(self.profile_dir)
+                      if name.endswith(".json") and _PROFILE_ID.match(name[:-5]))
+
+    def _prune(self):
+        files = self._profile_files()
+        for name in files[:max(len(files) - self.ring_size, 0)]:
+            try:
+                os.remove(os.path.join(self.profile_dir, name))
+            except OSError:
+                pass
+
+    def list_profiles(self) -> List[Dict]:
+        """
+        Headline fields of the stored profiles, newest first.
+        """
+        profiles = []
+        for name in reversed(self._profile_files()):
+            profile = self.get_profile(name[:-5])
+            if profile is not None:
+                profiles.append({key: profile[key] for key in
+                                 ("id", "reason", "method", "path", "status_code", "duration_ms", "samples")})
+        return profiles
+
+    def get_profile(self, profile_id: str) -> Optional[Dict]:
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.profile_dir, f"{profile_id}.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
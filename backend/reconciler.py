@@ -0,0 +1,312 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from document_manager import DocumentManager
+from executors import Executors, run_blocking
+
+logger = logging.getLogger(__name__)
+
+CHILD_INDEX_CLAIM = "child_index_claim"
+
+
+class Reconciler:
+    """
+    Incrementally checks that document metadata, source files and vectors agree.
+
+    Every pass looks at a fixed-size batch, so the cost does not grow with
+    the corpus:
+      * the least recently verified documents are compared against their
+        manifest entry (file presence, size/mtime, checksum when those
+        changed, and chunk count in the vector store); missing vectors are
+        rebuilt from the stored chunks
+      * one page of the vector collection is scanned for chunks whose
+        document no longer exists; they are deleted once they have stayed
+        orphaned for `orphan_grace` seconds, so in-flight uploads are safe;
+        streaming ingests, which can outlast the grace period, are skipped
+        while their manifest entry shows recent progress
+      * manifest entries left behind by deleted documents are dropped
+      * the shared change log is trimmed, keeping what live workers have
+        yet to replay
+      * documents missing their routing vector for hierarchical search
+        get one, computed from their stored chunk embeddings; a library
+        indexed before routing vectors existed is backfilled in one pass
+        at startup
+      * likewise, documents without small-to-big children get them; search
+        only switches to children once every document has them
+    The scan position is kept in the metadata store, so successive passes
+    (and restarts) cover the whole corpus over time.
+    """
+
+    # A backfill claim not refreshed for this long belongs to a dead worker
+    backfill_claim_ttl = 600.0
+
+    def __init__(self, document_manager: DocumentManager, batch_size: int = 20,
+                 scan_page_size: int = 500, interval: float = 60.0, orphan_grace: float = 600.0,
+                 executors: Optional[Executors] = None):
+        self.document_manager = document_manager
+        self.vector_store = document_manager.vector_store
+        self.store = document_manager.store
+        self.batch_size = batch_size
+        self.scan_page_size = scan_page_size
+        self.interval = interval
+        self.orphan_grace = orphan_grace
+        # Jobs that can embed go to the cpu pool, the rest to the io pool
+        self._cpu = executors.cpu if executors else None
+        self._io = executors.io if executors else None
+
+        self._suspected_orphans: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.last_result: Dict[str, int] = {}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info("Started background reconciler")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        # Work that can embed runs one document per cpu job, so chats and
+        # uploads queue between documents rather than behind a whole pass
+        try:
+            # Only reads stored embeddings, no inference
+            await run_blocking(self._io, self.backfill_document_index)
+            await self._backfill_children()
+        except Exception as e:
+            logger.error(f"Index backfill failed: {str(e)}")
+
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if self.vector_store.small_to_big and not self.vector_store.child_index_ready:
+                    # Another worker holds the backfill; pick up its result, or take over if it died
+                    await self._backfill_children()
+                await self._run_pass()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Reconciliation pass failed: {str(e)}")
+
+    async def _backfill_children(self):
+        """
+        Give every document its small-to-big children, then mark the child
+        index complete so search can use it. Unlike the routing vectors this
+        embeds the children, so it can take a while on a large library. One
+        worker claims the job in the metadata store and refreshes the claim as
+        it goes; the others leave it alone unless the claim goes stale, and
+        the completion flag is shared, so it only ever runs once.
+        """
+        doc_ids = await run_blocking(self._io, self._claim_child_backfill)
+        if doc_ids is None:
+            return
+        built = 0
+        try:
+            for doc_id in doc_ids:
+                built += await run_blocking(self._cpu, self._build_children, doc_id)
+            await run_blocking(self._io, self._finish_child_backfill, built)
+        finally:
+            await run_blocking(self._io, self.store.release_claim, CHILD_INDEX_CLAIM)
+
+    async def _run_pass(self) -> Dict[str, int]:
+        result = self._new_result()
+        for doc_id in await run_blocking(self._io, self.store.least_recently_verified, self.batch_size):
+            # A repair re-embeds the document, so verification goes to the cpu pool
+            self._tally(result, await run_blocking(self._cpu, self.verify_document, doc_id))
+        result["orphan_chunks"] = await run_blocking(self._io, self._scan_for_orphans)
+        result["stale_manifest"] = await run_blocking(self._io, self._drop_stale_manifest)
+        # Every worker reconciles, so this doubles as its change log heartbeat
+        await run_blocking(self._io, self.document_manager.prune_changes, self._reader_ttl())
+        return self._finish_pass(result)
+
+    def backfill_document_index(self) -> int:
+        """
+        Build routing vectors for the whole library once, for libraries
+        indexed before they existed. Reads the stored embeddings, so no model
+        inference is needed. The shared completion flag keeps this a one-off:
+        later gaps (a document whose vectors went missing, say) are filled
+        one document at a time by verify_document.
+        """
+        if self.store.get_meta("document_index_complete"):
+            return 0
+        built = 0
+        if self.vector_store.get_document_vector_count() < self.document_manager.get_document_count():
+            built = self.vector_store.rebuild_document_index()
+        self.store.set_meta("document_index_complete", "1")
+        return built
+
+    def _claim_child_backfill(self) -> Optional[List[str]]:
+        """The documents to backfill, or None if there is nothing for this worker to do."""
+        if not self.vector_store.small_to_big:
+            # Documents added while small-to-big is off get no children
+            self.store.set_meta("child_index_complete", "")
+            return None
+        if self.store.get_meta("child_index_complete"):
+            self.vector_store.child_index_ready = True
+            return None
+        if not self.store.claim(CHILD_INDEX_CLAIM, self.backfill_claim_ttl):
+            return None
+        return list(self.document_manager.documents)
+
+    def _build_children(self, doc_id: str) -> int:
+        built = self.vector_store.count_children(doc_id) == 0 and self.vector_store.index_children(doc_id)
+        self.store.touch_claim(CHILD_INDEX_CLAIM)
+        return int(built)
+
+    def _finish_child_backfill(self, built: int):
+        self.store.set_meta("child_index_complete", "1")
+        self.vector_store.child_index_ready = True
+        logger.info(f"Built small-to-big children for {built} documents")
+
+    def run_once(self) -> Dict[str, int]:
+        result = self._new_result()
+        for doc_id in self.store.least_recently_verified(self.batch_size):
+            self._tally(result, self.verify_document(doc_id))
+        result["orphan_chunks"] = self._scan_for_orphans()
+        result["stale_manifest"] = self._drop_stale_manifest()
+        return self._finish_pass(result)
+
+    @staticmethod
+    def _new_result() -> Dict[str, int]:
+        return {"verified": 0, "repaired": 0, "missing_files": 0, "orphan_chunks": 0, "stale_manifest": 0}
+
+    @staticmethod
+    def _tally(result: Dict[str, int], status: str):
+        result["verified"] += 1
+        if status == "repaired":
+            result["repaired"] += 1
+        elif status == "missing_file":
+            result["missing_files"] += 1
+
+    def _reader_ttl(self) -> float:
+        # A live worker reports at least once per pass
+        return max(self.store.READER_TTL, 3 * self.interval)
+
+    def _drop_stale_manifest(self) -> int:
+        stale = self.store.stale_manifest_ids(self.batch_size, time.time() - self.orphan_grace)
+        if stale:
+            self.store.delete_manifest(stale)
+        return len(stale)
+
+    def _finish_pass(self, result: Dict[str, int]) -> Dict[str, int]:
+        if any(result[key] for key in ("repaired", "missing_files", "orphan_chunks", "stale_manifest")):
+            logger.info(f"Reconciliation pass: {result}")
+        self.last_result = result
+        return result
+
+    def run_full_pass(self) -> Dict[str, int]:
+        """
+        Verify every document and scan the whole collection once. For
+        offline repair scripts; the server only ever runs incremental passes.
+        """
+        totals: Dict[str, int] = {}
+        documents = self.document_manager.get_document_count()
+        pages = self.vector_store.get_chunk_count() // self.scan_page_size + 1
+        for _ in range(max(documents // self.batch_size + 1, pages)):
+            for key, value in self.run_once().items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def verify_document(self, doc_id: str) -> str:
+        # Claimed like a version upload, so neither rewrites vectors under the other
+        try:
+            previous_status = self.store.begin_update(doc_id)
+        except KeyError:
+            return "gone"
+        if previous_status is None:
+            # A new version is being written; check it on a later pass
+            return "updating"
+        try:
+            return self._verify_claimed(doc_id)
+        except Exception:
+            self.store.set_manifest_status(doc_id, previous_status)
+            raise
+
+    def _verify_claimed(self, doc_id: str) -> str:
+        document = self.document_manager.get_record(doc_id)
+        if document is None:
+            return "gone"
+
+        manifest = self.store.get_manifest(doc_id)
+        status = "ok"
+        checksum = manifest["checksum"] if manifest else None
+        file_size = file_mtime = None
+
+        try:
+            stat = os.stat(document.file_path)
+            file_size, file_mtime = stat.st_size, stat.st_mtime
+            # Only re-hash when the cheap signals say the file changed
+            if not manifest or (file_size, file_mtime) != (manifest["file_size"], manifest["file_mtime"]):
+                new_checksum = self.document_manager.pdf_processor.file_checksum(document.file_path)
+                if checksum and new_checksum != checksum:
+                    logger.warning(f"Source file for {doc_id} changed on disk since ingestion")
+                    status = "file_changed"
+                checksum = new_checksum
+        except OSError:
+            logger.warning(f"Source file missing for document {doc_id}: {document.file_path}")
+            status = "missing_file"
+
+        expected = document.chunk_count
+        actual = self.vector_store.count_chunks(doc_id)
+        if actual != expected:
+            # Only a repair needs the chunks; streamed documents keep most
+            # chunk text only in the vector store
+            full = self.document_manager.get_document(doc_id) if expected else None
+            if full is not None and all(chunk.content for chunk in full.chunks):
+                logger.warning(f"Document {doc_id} has {actual} vectors, expected {expected}; rebuilding")
+                self.vector_store.delete_document(doc_id)
+                if self.vector_store.add_document(full):
+                    status = "repaired" if status == "ok" else status
+                else:
+                    status = "vectors_missing"
+            else:
+                status = "vectors_missing"
+        elif actual:
+            if not self.vector_store.has_document_vector(doc_id):
+                self.vector_store.index_document(doc_id)
+            if self.vector_store.small_to_big and not self.vector_store.count_children(doc_id):
+                self.vector_store.index_children(doc_id)
+
+        self.store.put_manifest(doc_id, checksum, expected, document.file_path, file_size, file_mtime, status)
+        return status
+
+    def _scan_for_orphans(self) -> int:
+        offset = int(self.store.get_meta("reconcile_offset") or 0)
+        page = self.vector_store.scan_chunks(offset, self.scan_page_size)
+
+        document_ids = {doc_id for _, doc_id in page if doc_id}
+        now = time.time()
+        known = self.store.has_documents(list(document_ids))
+        known |= self.store.ingesting_ids(list(document_ids - known), now - self.orphan_grace)
+
+        orphan_docs = set()
+        for doc_id in document_ids - known:
+            first_seen = self._suspected_orphans.setdefault(doc_id, now)
+            if now - first_seen >= self.orphan_grace:
+                orphan_docs.add(doc_id)
+        for doc_id in known:
+            self._suspected_orphans.pop(doc_id, None)
+
+        orphan_chunks = [chunk_id for chunk_id, doc_id in page if doc_id in orphan_docs or not doc_id]
+        if orphan_chunks and self.vector_store.delete_chunks(orphan_chunks):
+            logger.warning(f"Deleted {len(orphan_chunks)} orphaned chunks from {len(orphan_docs)} documents")
+            self.vector_store.delete_document_vectors(list(orphan_docs))
+            for doc_id in orphan_docs:
+                self._suspected_orphans.pop(doc_id, None)
+        else:
+            orphan_chunks = []
+
+        # Deleted chunks shift later ones down, so only advance past the survivors
+        next_offset = offset + len(page) - len(orphan_chunks)
+        if len(page) < self.scan_page_size:
+            next_offset = 0
+        self.store.set_meta("reconcile_offset", str(next_offset))
+        return len(orphan_chunks)
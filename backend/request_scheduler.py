@@ -0,0 +1,212 @@
+import heapq
+import random
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes; lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# HTTP statuses worth retrying: rate limited, overloaded or transient server errors
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class TokenBucket:
+    """
+    Continuously refilling bucket holding up to `capacity` units, refilled
+    at `capacity` units per `period` seconds. Not thread-safe on its own.
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 if available now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta: float):
+        # Correct an estimate after the fact; may go negative to delay later calls
+        self.level = min(self.capacity, self.level - delta)
+
+
+class RequestScheduler:
+    """
+    Admission control for outbound Claude API calls.
+
+    Every call waits in a priority queue until it is at the head of the
+    queue, a concurrency slot is free, and both the request-rate and
+    token-rate buckets can cover it. Interactive calls therefore always
+    overtake queued background work. Retryable failures are retried with
+    jittered exponential backoff; a retry-after from the API pauses all
+    callers, since the limit it reports is shared.
+
+    Thread-safe: calls block the calling thread, so async code should invoke
+    it through a thread pool.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        requests_per_minute: float = 50,
+        tokens_per_minute: float = 40000,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._blocked_until = 0.0
+
+        self._retries = 0
+        self._completed = 0
+        self._failed = 0
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        priority: int = INTERACTIVE,
+        estimated_tokens: int = 1000,
+        actual_tokens: Optional[Callable[[Any], int]] = None,
+    ) -> Any:
+        """
+        Run `fn` under the scheduler and return its result, retrying
+        retryable errors. `actual_tokens` maps the result to the tokens it
+        really used so the token bucket can be corrected.
+        """
+        attempt = 0
+        while True:
+            self._acquire(priority, estimated_tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                self._release()
+                delay, retry_after = self._retry_delay(e, attempt)
+                if delay is None or attempt >= self.max_retries:
+                    with self._cond:
+                        self._failed += 1
+                    raise
+                attempt += 1
+                with self._cond:
+                    self._retries += 1
+                    if retry_after is not None:
+                        self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+                        self._cond.notify_all()
+                logger.warning(f"Claude call failed ({e.__class__.__name__}), retry {attempt} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            used = None
+            if actual_tokens is not None:
+                try:
+                    used = actual_tokens(result)
+                except Exception:
+                    used = None
+            self._release(None if used is None else used - estimated_tokens)
+            with self._cond:
+                self._completed += 1
+            return result
+
+    def _acquire(self, priority: int, tokens: int):
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    if self._waiting[0] != ticket or self._active >= self.max_concurrency:
+                        self._cond.wait()
+                        continue
+
+                    now = time.monotonic()
+                    wait = max(
+                        self._blocked_until - now,
+                        self._requests.wait_time(1, now),
+                        self._tokens.wait_time(tokens, now),
+                    )
+                    if wait <= 0:
+                        self._requests.consume(1, now)
+                        self._tokens.consume(tokens, now)
+                        self._active += 1
+                        return
+                    self._cond.wait(wait)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def _release(self, token_correction: Optional[float] = None):
+        with self._cond:
+            self._active -= 1
+            if token_correction:
+                self._tokens.adjust(token_correction)
+            self._cond.notify_all()
+
+    def _retry_delay(self, error: Exception, attempt: int):
+        """
+        Return (delay, retry_after) for a retryable error, or (None, None).
+        """
+        status = getattr(error, "status_code", None)
+        retryable = status in RETRYABLE_STATUSES or error.__class__.__name__ in (
+            "APIConnectionError", "APITimeoutError"
+        )
+        if not retryable:
+            return None, None
+
+        retry_after = self._retry_after(error)
+        # Equal jitter: at least half the exponential step, so retries spread out but still back off
+        step = min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay = step / 2 + random.uniform(0, step / 2)
+        if retry_after is not None:
+            delay = max(delay, retry_after + random.uniform(0, self.base_delay))
+        return delay, retry_after
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+        value = headers.get("retry-after")
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "active": self._active,
+                "waiting_interactive": sum(1 for p, _ in self._waiting if p == INTERACTIVE),
+                "waiting_background": sum(1 for p, _ in self._waiting if p != INTERACTIVE),
+                "completed": self._completed,
+                "failed": self._failed,
+                "retries": self._retries,
+            }
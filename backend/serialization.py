@@ -0,0 +1,72 @@
+import logging
+from typing import Any, Dict, List, Optional, Set
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+    logger.info("orjson not installed, falling back to the standard JSON encoder")
+
+
+def fast_json_response(content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Serialize plain (already dumped) model data with orjson when available.
+    orjson handles datetimes natively, so no jsonable_encoder pass is needed.
+    """
+    if orjson is not None:
+        body = orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
+    return JSONResponse(content=jsonable_encoder(content), status_code=status_code, headers=headers)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Dict[str, Optional[Set[str]]]]:
+    """
+    Parse a `fields=` query value such as "answer,sources.document_name" into
+    {"answer": None, "sources": {"document_name"}}. None means "all fields".
+    """
+    if not fields:
+        return None
+
+    selection: Dict[str, Optional[Set[str]]] = {}
+    for field in fields.split(","):
+        field = field.strip()
+        if not field:
+            continue
+        top, _, sub = field.partition(".")
+        if not sub:
+            selection[top] = None
+        elif top not in selection or selection[top] is not None:
+            selection.setdefault(top, set()).add(sub)
+    return selection or None
+
+
+def project(data: Dict[str, Any], selection: Optional[Dict[str, Optional[Set[str]]]]) -> Dict[str, Any]:
+    """
+    Keep only the selected keys of a serialized model. Nested selections
+    apply to dicts and to each dict in a list.
+    """
+    if selection is None:
+        return data
+
+    projected = {}
+    for key, sub in selection.items():
+        if key not in data:
+            continue
+        value = data[key]
+        if sub is not None:
+            if isinstance(value, list):
+                value = [{k: v for k, v in item.items() if k in sub} for item in value]
+            elif isinstance(value, dict):
+                value = {k: v for k, v in value.items() if k in sub}
+        projected[key] = value
+    return projected
+
+
+def project_list(items: List[Dict[str, Any]], selection: Optional[Dict[str, Optional[Set[str]]]]) -> List[Dict[str, Any]]:
+    if selection is None:
+        return items
+    return [project(item, selection) for item in items]
@@ -0,0 +1,488 @@
+"""
+Snapshot export and restore for the document library.
+
+A snapshot is a single gzip-compressed tar stream holding everything needed
+to rebuild the library on another host without re-embedding:
+
+    header.json            format version, embedding model and dtype, counts
+    documents.jsonl        document metadata; chunk text that also lives in
+                           the vector store is stripped and restored from it
+    chunks/NNNNNN.jsonl    chunk ids, text and vector metadata, one batch
+    chunks/NNNNNN.bin      that batch's embeddings, packed little-endian
+                           float32 (or float16) rows
+    children/NNNNNN.*      the same for small-to-big children, whose text is
+                           rebuilt from their parent chunk on restore
+    sources/<file>         the original PDFs
+    checksums.json         SHA-256 of every member above
+
+Both directions stream, so memory is bounded by one batch of chunks.
+Restore bulk-loads the stored embeddings straight into the vector store,
+writes the source files, and only after every checksum has been verified
+commits the document metadata. Vectors of documents that already exist
+(with --replace) are parked in a temporary file until then. A corrupt or
+truncated archive therefore leaves no documents behind and existing ones
+untouched; its partial vectors and files are removed.
+Run it with the API stopped, or at least with no uploads in flight.
+
+    python snapshot.py export library.snap.tgz
+    python snapshot.py import library.snap.tgz
+    python snapshot.py export - | ssh newhost 'cd able2/backend && python snapshot.py import -'
+"""
+
+import io
+import os
+import sys
+import gzip
+import json
+import time
+import hashlib
+import logging
+import tarfile
+import tempfile
+from typing import TYPE_CHECKING, BinaryIO, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from models import Document, DocumentRecord
+
+if TYPE_CHECKING:
+    # Imported lazily by main() so nothing can print to stdout before it is redirected
+    from document_manager import DocumentManager
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class _HashingReader:
+    """
+    File wrapper that hashes what tarfile reads from it.
+    """
+
+    def __init__(self, fileobj: BinaryIO):
+        self.fileobj = fileobj
+        self.digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.fileobj.read(size)
+        self.digest.update(data)
+        return data
+
+
+class _DeferredBatches:
+    """
+    Vector batches parked in a temporary file, so memory stays bounded by
+    one batch, and replayed in order later.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._batches: List[Tuple[bool, int, Tuple[int, int]]] = []
+
+    def add(self, is_child: bool, records: List[Dict], embeddings: np.ndarray):
+        data = "\n".join(json.dumps(record) for record in records).encode()
+        rows = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self._file.write(data)
+        self._file.write(rows.tobytes())
+        self._batches.append((is_child, len(data), rows.shape))
+
+    def __iter__(self) -> Iterator[Tuple[bool, List[Dict], np.ndarray]]:
+        self._file.seek(0)
+        for is_child, size, shape in self._batches:
+            records = [json.loads(line) for line in self._file.read(size).decode().splitlines()]
+            rows = np.frombuffer(self._file.read(4 * shape[0] * shape[1]), dtype=np.float32).reshape(shape)
+            yield is_child, records, rows
+
+    def close(self):
+        self._file.close()
+
+
+def _model_family(name: str) -> str:
+    # "all-MiniLM-L6-v2 (onnx-int8)" and "all-MiniLM-L6-v2" produce compatible vectors
+    return name.split(" (")[0]
+
+
+class SnapshotWriter:
+    def __init__(self, out: BinaryIO, compresslevel: int = 6):
+        # tarfile's own "w|gz" only takes a compression level from Python 3.12
+        self._gzip = gzip.GzipFile(fileobj=out, mode="wb", compresslevel=compresslevel)
+        self._tar = tarfile.open(fileobj=self._gzip, mode="w|")
+        self.checksums: Dict[str, str] = {}
+
+    def add_bytes(self, name: str, data: bytes):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self._tar.addfile(info, io.BytesIO(data))
+        self.checksums[name] = hashlib.sha256(data).hexdigest()
+
+    def add_file(self, name: str, path: str) -> str:
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            info = tarfile.TarInfo(name)
+            info.size = stat.st_size
+            info.mtime = int(stat.st_mtime)
+            reader = _HashingReader(f)
+            self._tar.addfile(info, reader)
+        self.checksums[name] = reader.digest.hexdigest()
+        return self.checksums[name]
+
+    def close(self):
+        self.add_bytes("checksums.json", json.dumps(self.checksums).encode())
+        self._tar.close()
+        self._gzip.close()
+
+
+def export_snapshot(document_manager: "DocumentManager", out: BinaryIO, batch_size: int = 500,
+                    float16: bool = False, include_sources: bool = True) -> Dict[str, int]:
+    """
+    Write a snapshot of every document to `out`. float16 halves the size of
+    the embeddings at a cosine-similarity error of around 1e-3.
+    """
+    vector_store = document_manager.vector_store
+    document_manager.refresh()
+    documents = dict(document_manager.documents)
+    dtype = "<f2" if float16 else "<f4"
+
+    writer = SnapshotWriter(out)
+    writer.add_bytes("header.json", json.dumps({
+        "format_version": FORMAT_VERSION,
+        "embedding_model": vector_store.embedding_model.name,
+        "dtype": dtype,
+        "documents": len(documents),
+        "created_at": time.time(),
+    }).encode())
+
+    # Chunk text kept in metadata duplicates the vector store; drop it and flag the chunk
+    lines = []
+    for doc_id in documents:
+        # The registry holds records only; read each full Document on its own
+        document = document_manager.store.get(doc_id)
+        if document is None:
+            continue
+        data = json.loads(document.json())
+        for chunk in data["chunks"]:
+            if chunk["content"]:
+                chunk["content"] = ""
+                chunk["content_from_vectors"] = True
+        lines.append(json.dumps(data))
+    writer.add_bytes("documents.jsonl", "\n".join(lines).encode())
+
+    chunk_count = _export_collection(writer, vector_store.collection, "chunks", documents, batch_size, dtype)
+    child_count = _export_collection(writer, vector_store.child_collection, "children", documents, batch_size, dtype,
+                                     keep_text=False)
+
+    source_count = 0
+    if include_sources:
+        for document in documents.values():
+            try:
+                writer.add_file(f"sources/{os.path.basename(document.file_path)}", document.file_path)
+                source_count += 1
+            except OSError as e:
+                logger.warning(f"Source file for {document.id} not included: {e}")
+
+    writer.close()
+    result = {"documents": len(documents), "chunks": chunk_count, "children": child_count, "sources": source_count}
+    logger.info(f"Exported snapshot: {result}")
+    return result
+
+
+def _export_collection(writer: SnapshotWriter, collection, prefix: str, documents: Dict[str, DocumentRecord],
+                       batch_size: int, dtype: str, keep_text: bool = True) -> int:
+    count = batch_number = offset = 0
+    while True:
+        page = collection.get(offset=offset, limit=batch_size, include=["documents", "metadatas", "embeddings"])
+        if not page["ids"]:
+            break
+        offset += len(page["ids"])
+
+        records, rows = [], []
+        for record_id, text, metadata, embedding in zip(
+            page["ids"], page["documents"], page["metadatas"], page["embeddings"]
+        ):
+            # Vectors without metadata are orphans the reconciler would delete anyway
+            if metadata.get("document_id") in documents:
+                record = {"id": record_id, "metadata": metadata}
+                if keep_text:
+                    record["text"] = text
+                records.append(json.dumps(record))
+                rows.append(embedding)
+        if records:
+            batch_number += 1
+            embeddings = np.asarray(rows, dtype=np.float32).astype(dtype)
+            writer.add_bytes(f"{prefix}/{batch_number:06d}.jsonl", "\n".join(records).encode())
+            writer.add_bytes(f"{prefix}/{batch_number:06d}.bin", embeddings.tobytes())
+            count += len(records)
+    return count
+
+
+def _child_texts(vector_store, records: List[Dict]) -> List[str]:
+    """
+    Rebuild children's text from their restored parent chunks.
+    """
+    parent_ids = list(dict.fromkeys(record["metadata"]["parent_id"] for record in records))
+    stored = vector_store.collection.get(ids=parent_ids, include=["documents"])
+    parent_words = {chunk_id: content.split() for chunk_id, content in zip(stored["ids"], stored["documents"])}
+    texts = []
+    for record in records:
+        metadata = record["metadata"]
+        words = parent_words.get(metadata["parent_id"])
+        if words is None:
+            raise SnapshotError(f"Child {record['id']} has no parent chunk")
+        texts.append(" ".join(words[metadata["word_start"]:metadata["word_end"]]))
+    return texts
+
+
+def _load_batch(vector_store, is_child: bool, records: List[Dict], embeddings: np.ndarray):
+    collection = vector_store.child_collection if is_child else vector_store.collection
+    # Upsert, so vectors left behind by an earlier failed restore are overwritten
+    collection.upsert(
+        ids=[record["id"] for record in records],
+        documents=_child_texts(vector_store, records) if is_child else [record["text"] for record in records],
+        metadatas=[record["metadata"] for record in records],
+        embeddings=embeddings.tolist()
+    )
+
+
+def import_snapshot(document_manager: "DocumentManager", src: BinaryIO, replace: bool = False,
+                    force: bool = False) -> Dict[str, int]:
+    """
+    Restore a snapshot written by export_snapshot. Documents that already
+    exist are skipped unless `replace` is set. Refuses snapshots made with a
+    different embedding model unless `force` is set.
+    """
+    vector_store = document_manager.vector_store
+    sources_path = document_manager.pdf_processor.sources_path
+
+    document_manager.refresh()
+    existing = set(document_manager.documents)
+    header: Optional[Dict] = None
+    documents: Dict[str, Dict] = {}
+    wanted_sources: set = set()
+    # Batches for documents that already exist wait until the archive is verified
+    deferred = _DeferredBatches()
+    pending_records: Optional[List[Dict]] = None
+    checksums: Dict[str, str] = {}
+    stored_checksums: Optional[Dict[str, str]] = None
+    loaded_doc_ids = set()
+    written_files: List[str] = []
+    # Existing source files are overwritten only once the archive is verified
+    staged_files: List[str] = []
+    source_checksums: Dict[str, str] = {}
+    chunk_count = child_count = source_count = 0
+
+    try:
+        with tarfile.open(fileobj=src, mode="r|gz") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                data = tar.extractfile(member).read() if not member.name.startswith("sources/") else None
+
+                if member.name == "checksums.json":
+                    stored_checksums = json.loads(data)
+                    continue
+
+                if data is not None:
+                    checksums[member.name] = hashlib.sha256(data).hexdigest()
+
+                if member.name == "header.json":
+                    header = json.loads(data)
+                    if header.get("format_version") != FORMAT_VERSION:
+                        raise SnapshotError(f"Unsupported snapshot format {header.get('format_version')}")
+                    current = vector_store.embedding_model.name
+                    if _model_family(header["embedding_model"]) != _model_family(current) and not force:
+                        raise SnapshotError(
+                            f"Snapshot was embedded with {header['embedding_model']}, this store uses {current}"
+                        )
+
+                elif header is None:
+                    raise SnapshotError("Snapshot does not start with a header")
+
+                elif member.name == "documents.jsonl":
+                    for line in data.decode().splitlines():
+                        doc = json.loads(line)
+                        if replace or doc["id"] not in existing:
+                            documents[doc["id"]] = doc
+                    wanted_sources = {os.path.basename(doc["file_path"]) for doc in documents.values()}
+
+                elif member.name.endswith(".jsonl"):
+                    pending_records = [json.loads(line) for line in data.decode().splitlines()]
+
+                elif member.name.endswith(".bin"):
+                    if pending_records is None:
+                        raise SnapshotError(f"Embeddings {member.name} without chunk records")
+                    embeddings = np.frombuffer(data, dtype=header["dtype"]).astype(np.float32)
+                    embeddings = embeddings.reshape(len(pending_records), -1)
+                    is_child = member.name.startswith("children/")
+                    new, replaced = [], []
+                    for i, record in enumerate(pending_records):
+                        doc_id = record["metadata"]["document_id"]
+                        if doc_id in documents:
+                            (replaced if doc_id in existing else new).append(i)
+                    if new:
+                        _load_batch(vector_store, is_child, [pending_records[i] for i in new], embeddings[new])
+                        loaded_doc_ids.update(pending_records[i]["metadata"]["document_id"] for i in new)
+                    if replaced:
+                        deferred.add(is_child, [pending_records[i] for i in replaced], embeddings[replaced])
+                    if is_child:
+                        child_count += len(new) + len(replaced)
+                    else:
+                        chunk_count += len(new) + len(replaced)
+                    pending_records = None
+
+                elif member.name.startswith("sources/"):
+                    basename = os.path.basename(member.name)
+                    path = os.path.join(sources_path, basename)
+                    reader = _HashingReader(tar.extractfile(member))
+                    # Only restore files some restored document points at
+                    if basename in wanted_sources:
+                        is_new = not os.path.exists(path)
+                        target = path if is_new else path + ".restore"
+                        with open(target + ".partial", "wb") as f:
+                            for block in iter(lambda: reader.read(1024 * 1024), b""):
+                                f.write(block)
+                        os.replace(target + ".partial", target)
+                        source_count += 1
+                        (written_files if is_new else staged_files).append(path)
+                    else:
+                        for _ in iter(lambda: reader.read(1024 * 1024), b""):
+                            pass
+                    checksums[member.name] = source_checksums[basename] = reader.digest.hexdigest()
+
+        if stored_checksums is None:
+            raise SnapshotError("Snapshot is truncated: no checksums found")
+        if stored_checksums != checksums:
+            bad = sorted(name for name in set(stored_checksums) | set(checksums)
+                         if stored_checksums.get(name) != checksums.get(name))
+            raise SnapshotError(f"Checksum mismatch in {', '.join(bad[:5])}")
+
+    except (SnapshotError, tarfile.TarError, OSError, EOFError, ValueError, KeyError) as e:
+        # Existing documents have not been touched; undo the new ones
+        deferred.close()
+        logger.error(f"Snapshot restore failed, rolling back: {str(e)}")
+        vector_store.delete_documents(list(loaded_doc_ids))
+        for path in written_files:
+            document_manager.pdf_processor.delete_file(path)
+        for path in staged_files:
+            document_manager.pdf_processor.delete_file(path + ".restore")
+        for name in os.listdir(sources_path):
+            if name.endswith(".partial"):
+                os.remove(os.path.join(sources_path, name))
+        if isinstance(e, SnapshotError):
+            raise
+        raise SnapshotError(f"Snapshot is corrupt: {str(e)}") from e
+
+    try:
+        # Parents come before their children, as in the archive
+        for is_child, records, embeddings in deferred:
+            _load_batch(vector_store, is_child, records, embeddings)
+    finally:
+        deferred.close()
+    for path in staged_files:
+        os.replace(path + ".restore", path)
+
+    _commit_documents(document_manager, documents, source_checksums, existing, has_children=child_count > 0)
+    result = {"documents": len(documents), "chunks": chunk_count, "children": child_count, "sources": source_count}
+    logger.info(f"Restored snapshot: {result}")
+    return result
+
+
+def _commit_documents(document_manager: "DocumentManager", documents: Dict[str, Dict],
+                      source_checksums: Dict[str, str], existing: set, has_children: bool = True):
+    """
+    Refill the chunk text stripped at export from the vector store, for
+    the chunks that had text in metadata when exported, point documents at
+    their restored files and store them with their manifest.
+    Replaced documents lose any old chunks the snapshot does not have.
+    Snapshots taken before small-to-big retrieval carry no children, so
+    those are embedded here.
+    """
+    vector_store = document_manager.vector_store
+    sources_path = document_manager.pdf_processor.sources_path
+    restored = []
+    for data in documents.values():
+        # Only chunks that had text in the exported metadata get it back;
+        # streamed documents keep the rest of theirs in the vector store alone
+        flagged = {chunk["id"]: chunk for chunk in data["chunks"] if chunk.pop("content_from_vectors", False)}
+        if flagged:
+            stored = vector_store.collection.get(ids=list(flagged), include=["documents"])
+            for chunk_id, text in zip(stored["ids"], stored["documents"]):
+                flagged[chunk_id]["content"] = text
+        data["file_path"] = os.path.join(sources_path, os.path.basename(data["file_path"]))
+        restored.append(Document.parse_obj(data))
+
+        if data["id"] in existing:
+            chunk_ids = {chunk["id"] for chunk in data["chunks"]}
+            current = vector_store.collection.get(where={"document_id": data["id"]}, include=[])
+            vector_store.delete_chunks([chunk_id for chunk_id in current["ids"] if chunk_id not in chunk_ids])
+
+    store = document_manager.store
+    store.put_many(restored)
+    for document in restored:
+        vector_store.index_document(document.id)
+        if vector_store.small_to_big and not has_children:
+            vector_store.index_children(document.id)
+        checksum = source_checksums.get(os.path.basename(document.file_path))
+        if checksum:
+            stat = os.stat(document.file_path)
+            store.put_manifest(document.id, checksum, len(document.chunks), document.file_path,
+                               stat.st_size, stat.st_mtime)
+        else:
+            document_manager.record_manifest(document)
+    document_manager.refresh()
+
+
+def main():
+    import argparse
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Export or restore a snapshot of the document library")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export", help="write a snapshot (use - for stdout)")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--batch-size", type=int, default=500)
+    export_parser.add_argument("--float16", action="store_true", help="store embeddings at half precision")
+    export_parser.add_argument("--no-sources", action="store_true", help="leave the PDFs out")
+    import_parser = sub.add_parser("import", help="restore a snapshot (use - for stdin)")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--replace", action="store_true", help="overwrite documents that already exist")
+    import_parser.add_argument("--force", action="store_true", help="accept a different embedding model")
+    args = parser.parse_args()
+
+    archive_out = None
+    if args.command == "export" and args.path == "-":
+        # Keep stdout for the archive alone: anything else printing there (PyMuPDF
+        # warns on import) goes to stderr
+        archive_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    from document_manager import DocumentManager
+    from vector_store import VectorStore
+    from document_processor import PDFProcessor
+
+    load_dotenv()
+    # Progress goes to stderr so stdout can carry the archive
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    sources_path = os.getenv("SOURCES_PATH", "./sources")
+    vector_store = VectorStore(os.getenv("VECTOR_DB_PATH", "./data/vectordb"))
+    document_manager = DocumentManager(sources_path, vector_store, PDFProcessor(sources_path))
+
+    try:
+        if args.command == "export":
+            out = archive_out or open(args.path, "wb")
+            with out:
+                result = export_snapshot(document_manager, out, args.batch_size, args.float16, not args.no_sources)
+        else:
+            src = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+            with src:
+                result = import_snapshot(document_manager, src, replace=args.replace, force=args.force)
+    except SnapshotError as e:
+        print(f"Snapshot {args.command} failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(result), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+from document_manager import DocumentManager
+from llm_client import ClaudeClient
+from executors import Executors, run_blocking
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryQueue:
+    """
+    Background pipeline that replaces the extractive upload-time summary with
+    a Claude-generated one.
+
+    Jobs live in the metadata database, so they survive restarts and are
+    shared safely between worker processes. Each poll claims a batch of jobs,
+    runs them with bounded concurrency off the event loop, and writes all
+    resulting summaries back in a single metadata commit. Claude calls run
+    on the llm pool and metadata reads and writes on the io pool.
+    """
+
+    def __init__(
+        self,
+        document_manager: DocumentManager,
+        claude_client: ClaudeClient,
+        concurrency: int = 2,
+        batch_size: int = 8,
+        poll_interval: float = 5.0,
+        max_attempts: int = 3,
+        stale_after: float = 600.0,
+        executors: Optional[Executors] = None,
+    ):
+        self.document_manager = document_manager
+        self.claude_client = claude_client
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.stale_after = stale_after
+        self._io = executors.io if executors else None
+        self._llm = executors.llm if executors else None
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def store(self):
+        return self.document_manager.store
+
+    def enqueue(self, doc_id: str):
+        """
+        Schedule a document for summarization. Only a row insert, so it is
+        safe to call on the upload path, from the event loop or a worker thread.
+        """
+        self.store.enqueue_summary(doc_id)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def start(self):
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run())
+            logger.info("Started background summary queue")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.process_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Summary queue error: {str(e)}")
+                processed = 0
+
+            # Keep draining while there is work; otherwise sleep until woken
+            if processed:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def process_batch(self) -> int:
+        """
+        Claim and process one batch of jobs. Returns the number claimed.
+        """
+        jobs = await run_blocking(self._io, self.store.claim_summary_jobs, self.batch_size, self.stale_after)
+        if not jobs:
+            return 0
+
+        results = await asyncio.gather(*(self._summarize(doc_id) for doc_id, _, _ in jobs))
+
+        summaries: Dict[str, Tuple[int, str]] = {}
+        done: List[Tuple[str, float]] = []
+        retry: List[Tuple[str, float]] = []
+        failed: List[Tuple[str, float]] = []
+        for (doc_id, attempts, claimed_at), result in zip(jobs, results):
+            if result is not None:
+                version, summary = result
+                if version:
+                    summaries[doc_id] = (version, summary)
+                done.append((doc_id, claimed_at))
+            elif attempts >= self.max_attempts:
+                failed.append((doc_id, claimed_at))
+            else:
+                retry.append((doc_id, claimed_at))
+
+        superseded = set()
+        if summaries:
+            superseded = await run_blocking(self._io, self.document_manager.update_summaries, summaries)
+        # A new version landed mid-job; summarize it afresh
+        requeue = [job for job in done if job[0] in superseded]
+        done = [job for job in done if job[0] not in superseded]
+        await run_blocking(self._io, self.store.finish_summary_jobs, done, retry, failed, requeue)
+
+        logger.info(
+            f"Summary batch: {len(done)} updated, {len(requeue)} superseded, "
+            f"{len(retry)} retrying, {len(failed)} failed"
+        )
+        return len(jobs)
+
+    async def _summarize(self, doc_id: str) -> Optional[Tuple[int, str]]:
+        """
+        The summary and the document version it was generated from, or None
+        if Claude failed.
+        """
+        document = await run_blocking(self._io, self.document_manager.get_document, doc_id)
+        if document is None:
+            # Deleted since it was queued; nothing to write
+            return 0, ""
+
+        text, name = self._document_text(document)
+        async with self._semaphore:
+            try:
+                summary = await run_blocking(
+                    self._llm, self.claude_client.generate_document_summary, text, name, False
+                )
+            except Exception as e:
+                logger.warning(f"Summary generation failed for {doc_id}: {str(e)}")
+                return None
+        return document.version, summary
+
+    @staticmethod
+    def _document_text(document) -> Tuple[str, str]:
+        # The summary prompt only looks at the opening of the document
+        text = " ".join(chunk.content for chunk in document.chunks[:3])
+        return text, document.name
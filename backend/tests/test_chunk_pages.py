@@ -0,0 +1,31 @@
+import pytest
+
+from document_processor import PDFProcessor
+
+
+@pytest.fixture
+def processor(tmp_path):
+    return PDFProcessor(str(tmp_path))
+
+
+@pytest.mark.parametrize("page_lengths", [
+    [400, 400, 400],
+    [1500],
+    [250, 0, 0, 700, 30, 30, 900],
+    [0, 800, 0],
+])
+def test_page_breaks_map_every_word_to_its_page(processor, page_lengths):
+    # Words name their page, e.g. "p3w17", so each one's true page is known
+    words, page_word_offsets = [], []
+    for page, length in enumerate(page_lengths, start=1):
+        page_word_offsets.append(len(words))
+        words.extend(f"p{page}w{i}" for i in range(length))
+
+    chunks = processor._create_chunks(" ".join(words), "doc", page_word_offsets)
+
+    assert chunks
+    for chunk in chunks:
+        chunk_words = chunk.content.split()
+        pages = [PDFProcessor.page_in_chunk(chunk.page_start, chunk.page_breaks, i) for i in range(len(chunk_words))]
+        assert pages == [int(word[1:word.index("w")]) for word in chunk_words]
+        assert (pages[0], pages[-1]) == (chunk.page_start, chunk.page_end)
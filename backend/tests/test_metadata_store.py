@@ -0,0 +1,100 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from metadata_store import MetadataStore
+from models import Document
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MetadataStore(str(tmp_path / "metadata.db"))
+    yield store
+    store.close()
+
+
+def make_document(doc_id, summary="extractive"):
+    return Document(
+        id=doc_id, name=f"{doc_id}.pdf", file_type="pdf", file_path=f"/sources/{doc_id}.pdf",
+        summary=summary, chunks=[], created_at=datetime.now(), file_size=1
+    )
+
+
+def add_changes(store, count):
+    for i in range(count):
+        store.put(make_document(f"doc{i}"), replace=True)
+
+
+def test_prune_keeps_retention_window(store, monkeypatch):
+    monkeypatch.setattr(MetadataStore, "CHANGE_LOG_RETENTION", 5)
+    add_changes(store, 20)
+
+    assert store.prune_changes() == 15
+    changes, seq = store.changes_since(15)
+    assert seq == 20 and len(changes) == 5
+    assert store.changes_since(14) is None
+
+
+def test_prune_keeps_what_a_live_worker_has_not_replayed(store, monkeypatch):
+    monkeypatch.setattr(MetadataStore, "CHANGE_LOG_RETENTION", 5)
+    add_changes(store, 20)
+    store.report_position("lagging", 8)
+
+    assert store.prune_changes() == 8
+    changes, seq = store.changes_since(8)
+    assert seq == 20 and len(changes) == 12
+
+
+def test_prune_ignores_workers_that_stopped_reporting(store, monkeypatch):
+    monkeypatch.setattr(MetadataStore, "CHANGE_LOG_RETENTION", 5)
+    add_changes(store, 20)
+    store.report_position("gone", 3)
+    time.sleep(0.05)
+
+    assert store.prune_changes(reader_ttl=0.01) == 15
+    # The next prune does not wait on it either
+    add_changes(store, 1)
+    assert store.prune_changes(reader_ttl=0.01) == 1
+
+
+def test_live_readers_drop_out_on_removal_or_expiry(store):
+    store.report_position("server", 1)
+    store.report_position("script", 1)
+    assert sorted(store.live_readers()) == ["script", "server"]
+
+    store.remove_reader("script")
+    assert store.live_readers() == ["server"]
+    time.sleep(0.05)
+    assert store.live_readers(reader_ttl=0.01) == []
+
+
+def test_summary_for_an_old_version_is_not_written(store):
+    store.put(make_document("doc"))
+    store.update(make_document("doc").copy(update={"version": 2, "summary": "new version"}))
+
+    assert store.update_summaries({"doc": (1, "about version 1"), "gone": (1, "deleted")}) == {"doc"}
+    assert store.get("doc").summary == "new version"
+
+    assert store.update_summaries({"doc": (2, "about version 2")}) == set()
+    assert store.get("doc").summary == "about version 2"
+
+
+def test_finishing_a_job_keeps_a_job_enqueued_while_it_ran(store):
+    store.enqueue_summary("doc")
+    [(doc_id, attempts, claimed_at)] = store.claim_summary_jobs(10, stale_after=600)
+    # A new version is uploaded while the summary is generated
+    store.enqueue_summary("doc")
+
+    store.finish_summary_jobs([(doc_id, claimed_at)], [], [])
+    assert store.claim_summary_jobs(10, stale_after=600)[0][:2] == ("doc", 1)
+
+
+def test_superseded_job_is_requeued_with_fresh_attempts(store):
+    store.enqueue_summary("doc")
+    store.claim_summary_jobs(10, stale_after=0)
+    [(doc_id, attempts, claimed_at)] = store.claim_summary_jobs(10, stale_after=0)
+    assert attempts == 2
+
+    store.finish_summary_jobs([], [], [], requeue=[(doc_id, claimed_at)])
+    assert store.claim_summary_jobs(10, stale_after=600)[0][:2] == ("doc", 1)
@@ -0,0 +1,114 @@
+import random
+
+import pytest
+
+from document_processor import PDFProcessor
+
+VOCABULARY = [f"w{i}" for i in range(400)] + ["end.", "stop!"]
+
+
+@pytest.fixture
+def processor(tmp_path):
+    return PDFProcessor(str(tmp_path))
+
+
+def random_words(rng, count):
+    return [rng.choice(VOCABULARY) for _ in range(count)]
+
+
+def plan(processor, old_words, new_words):
+    """Chunk old_words as an upload would, then plan new_words as its next version."""
+    old_chunks = processor._create_chunks(" ".join(old_words), "doc")
+    processor._extract_text_with_pages = lambda file_path: (" ".join(new_words), [0])
+    chunks, reused = processor.plan_new_version("doc", old_chunks, "new.pdf")
+    return old_chunks, chunks, reused
+
+
+def assert_tiles(processor, chunks, new_words):
+    """Chunks overlap like fresh chunking does, so the next version can be diffed too."""
+    words, ranges = processor._join_chunks(chunks)
+    assert ranges, "chunks do not overlap by OVERLAP_SIZE words"
+    assert words == new_words
+    text = " ".join(new_words)
+    for index, chunk in enumerate(chunks):
+        assert chunk.chunk_index == index
+        assert text[chunk.start_char:chunk.end_char] == chunk.content
+        if len(chunks) > 1:
+            assert len(chunk.content.split()) > processor.OVERLAP_SIZE
+
+
+def test_unchanged_document_keeps_every_chunk(processor):
+    old = random_words(random.Random(1), 3000)
+    old_chunks, chunks, reused = plan(processor, old, old)
+    assert_tiles(processor, chunks, old)
+    assert [c.id for c in chunks] == [c.id for c in old_chunks]
+    assert len(reused) == len(old_chunks)
+
+
+def test_prefix_edit_keeps_suffix_chunks_and_shifts_them(processor):
+    rng = random.Random(2)
+    old = random_words(rng, 3000)
+    new = random_words(rng, 40) + old[5:]
+    old_chunks, chunks, reused = plan(processor, old, new)
+    assert_tiles(processor, chunks, new)
+    # Everything after the first chunk or two is carried over, at new offsets
+    assert [c.id for c in chunks[-4:]] == [c.id for c in old_chunks[-4:]]
+    assert chunks[-1].start_char != old_chunks[-1].start_char
+    assert len(reused) >= len(old_chunks) - 2
+
+
+def test_suffix_edit_keeps_prefix_chunks(processor):
+    rng = random.Random(3)
+    old = random_words(rng, 3000)
+    new = old[:-20] + random_words(rng, 300)
+    old_chunks, chunks, reused = plan(processor, old, new)
+    assert_tiles(processor, chunks, new)
+    assert [c.id for c in chunks[:4]] == [c.id for c in old_chunks[:4]]
+    assert [(c.start_char, c.end_char) for c in chunks[:4]] == \
+        [(c.start_char, c.end_char) for c in old_chunks[:4]]
+
+
+def test_middle_edit_only_rechunks_the_changed_stretch(processor):
+    rng = random.Random(4)
+    old = random_words(rng, 5000)
+    new = old[:2500] + random_words(rng, 10) + old[2520:]
+    old_chunks, chunks, reused = plan(processor, old, new)
+    assert_tiles(processor, chunks, new)
+    assert chunks[0].id == old_chunks[0].id
+    assert chunks[-1].id == old_chunks[-1].id
+    assert len(chunks) - len(reused) <= 3
+
+
+@pytest.mark.parametrize("old_size, new_words", [
+    (50, lambda old, extra: extra[:30] + old),
+    (50, lambda old, extra: old + extra[:30]),
+    (50, lambda old, extra: extra[:700] + old),
+    (80, lambda old, extra: extra[:300] + old[10:] + extra[300:400]),
+    (8, lambda old, extra: old[:4] + extra[:600] + old[4:]),
+    (1, lambda old, extra: extra[:500] + old),
+])
+def test_tiny_document_edits(processor, old_size, new_words):
+    rng = random.Random(old_size)
+    old = random_words(rng, old_size)
+    new = new_words(old, random_words(rng, 1000))
+    _, chunks, _ = plan(processor, old, new)
+    assert_tiles(processor, chunks, new)
+
+
+def test_random_edits_keep_the_tiling(processor):
+    rng = random.Random(5)
+    for _ in range(300):
+        old = random_words(rng, rng.choice([rng.randint(1, 150), rng.randint(1, 3000)]))
+        new = list(old)
+        for _ in range(rng.randint(1, 3)):
+            position, size = rng.randint(0, len(new)), rng.randint(1, rng.choice([5, 80, 700]))
+            operation = rng.choice("ids")
+            if operation == "i":
+                new[position:position] = random_words(rng, size)
+            elif operation == "d":
+                del new[position:position + size]
+            else:
+                new[position:position + size] = random_words(rng, size)
+        if new:
+            _, chunks, _ = plan(processor, old, new)
+            assert_tiles(processor, chunks, new)
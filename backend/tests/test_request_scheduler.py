@@ -0,0 +1,85 @@
+import time
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import anthropic
+import pytest
+
+from benchmarks.fake_claude_api import FakeClaudeAPI
+from llm_client import ClaudeClient
+from models import SourceInfo
+from request_scheduler import RequestScheduler
+
+
+@pytest.fixture
+def fake_api():
+    api = FakeClaudeAPI(latency=0.05)
+    yield api
+    api.stop()
+
+
+def make_client(api, **scheduler_options):
+    options = dict(
+        max_concurrency=2, requests_per_minute=600, tokens_per_minute=10**6,
+        max_retries=8, base_delay=0.05, max_delay=0.5
+    )
+    options.update(scheduler_options)
+    scheduler = RequestScheduler(**options)
+    return ClaudeClient("test-key", scheduler=scheduler, base_url=api.start()), scheduler
+
+
+def test_calls_succeed_through_429s_and_overloads(fake_api):
+    fake_api.rate_limit_fraction, fake_api.overload_fraction, fake_api.retry_after = 0.3, 0.1, 0.1
+    client, scheduler = make_client(fake_api)
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        summaries = list(pool.map(
+            lambda i: client.generate_document_summary("text " * 300, f"doc-{i}.pdf", fallback=False),
+            range(20)
+        ))
+
+    assert all(summary.startswith("Stub answer") for summary in summaries)
+    stats = scheduler.stats()
+    assert stats["completed"] == 20 and stats["failed"] == 0
+    assert stats["retries"] == fake_api.counts["rate_limited"] + fake_api.counts["overloaded"] > 0
+
+
+def test_interactive_calls_overtake_background_work(fake_api):
+    fake_api.rate_limit_fraction, fake_api.overload_fraction, fake_api.retry_after = 0.2, 0.1, 0.2
+    client, scheduler = make_client(fake_api)
+    sources = [SourceInfo(document_id="d", document_name="Doc.pdf", chunk_content="text " * 100, relevance_score=0.9)]
+
+    def background(i):
+        start = time.monotonic()
+        client.generate_document_summary("text " * 300, f"doc-{i}.pdf", fallback=False)
+        return time.monotonic() - start
+
+    def interactive(i):
+        start = time.monotonic()
+        response = client.generate_response(f"question {i}", sources)
+        assert not response.answer.startswith("I apologize"), response.answer
+        return time.monotonic() - start
+
+    with ThreadPoolExecutor(max_workers=40) as pool:
+        background_futures = [pool.submit(background, i) for i in range(20)]
+        time.sleep(0.05)  # let background work queue up first
+        interactive_futures = [pool.submit(interactive, i) for i in range(10)]
+        background_times = [f.result() for f in background_futures]
+        interactive_times = [f.result() for f in interactive_futures]
+
+    assert scheduler.stats()["failed"] == 0
+    assert statistics.median(interactive_times) < statistics.median(background_times)
+
+
+def test_retry_after_is_respected_until_retries_run_out(fake_api):
+    fake_api.rate_limit_fraction, fake_api.retry_after = 1.0, 0.2
+    client, scheduler = make_client(fake_api, max_retries=2)
+
+    start = time.monotonic()
+    with pytest.raises(anthropic.RateLimitError):
+        client.generate_document_summary("text", "doc.pdf", fallback=False)
+
+    assert time.monotonic() - start >= 2 * fake_api.retry_after
+    assert fake_api.counts["rate_limited"] == 3
+    stats = scheduler.stats()
+    assert stats["retries"] == 2 and stats["failed"] == 1 and stats["active"] == 0
@@ -1,27 +1,99 @@
 import chromadb
 from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
 from typing import List, Dict, Tuple, Optional
+import bisect
 import logging
 import os
-from models import Document, DocumentChunk, SourceInfo
+import numpy as np
+from models import Document, DocumentChunk, SourceInfo, ChunkInfo
+from embeddings import create_embedding_backend
+from document_processor import PDFProcessor
 
 logger = logging.getLogger(__name__)
 
 
+def mmr_select(query_embedding: np.ndarray, embeddings: np.ndarray, k: int, lambda_mult: float) -> List[int]:
+    """
+    Maximal marginal relevance: greedily pick k rows of `embeddings` that
+    balance similarity to the query (weight lambda_mult) against similarity
+    to rows already picked. Returns indices in selection order.
+    """
+    if len(embeddings) == 0:
+        return []
+    k = min(k, len(embeddings))
+
+    vectors = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+    query = query_embedding / max(np.linalg.norm(query_embedding), 1e-12)
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of each candidate to anything selected so far
+    redundancy = similarity[selected[0]].copy()
+    available = np.ones(len(vectors), dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+
+    return selected
+
+
+def _page_breaks(metadata: Dict) -> Optional[List[int]]:
+    """
+    A chunk's page breaks from its vector metadata, or None for chunks
+    indexed before they were recorded.
+    """
+    value = metadata.get('page_breaks')
+    if value is None:
+        return None
+    return [int(i) for i in value.split(",")] if value else []
+
+
+def _word_starts(words: List[str]) -> List[int]:
+    """
+    Character offset of each word in " ".join(words).
+    """
+    starts = []
+    position = 0
+    for word in words:
+        starts.append(position)
+        position += len(word) + 1
+    return starts
+
+
 class VectorStore:
+    # Children fetched per requested result in small-to-big search, before
+    # they are expanded and merged
+    CHILD_FANOUT = 4
+    
     def __init__(self, db_path: str):
         self.db_path = db_path
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # PyTorch by default; EMBEDDING_BACKEND=onnx / onnx-int8 avoids loading torch
+        self.embedding_model = create_embedding_backend()
         
         # Create directory if it doesn't exist
         os.makedirs(db_path, exist_ok=True)
         
-        # Initialize ChromaDB with persistent storage
-        self.client = chromadb.PersistentClient(
-            path=db_path,
-            settings=Settings(anonymized_telemetry=False)
-        )
+        # With several API workers, point every worker at one Chroma server so
+        # they share a single index; otherwise use embedded persistent storage
+        chroma_host = os.getenv("CHROMA_HOST")
+        if chroma_host:
+            self.client = chromadb.HttpClient(
+                host=chroma_host,
+                port=int(os.getenv("CHROMA_PORT", "8001")),
+                settings=Settings(anonymized_telemetry=False)
+            )
+        else:
+            self.client = chromadb.PersistentClient(
+                path=db_path,
+                settings=Settings(anonymized_telemetry=False)
+            )
         
         # Get or create collection
         self.collection = self.client.get_or_create_collection(
@@ -29,73 +101,432 @@ class VectorStore:
             metadata={"hnsw:space": "cosine"}
         )
         
+        # One pooled vector per document, used to route queries to the most
+        # relevant documents before searching their chunks
+        self.document_index = self.client.get_or_create_collection(
+            name="document_vectors",
+            metadata={"hnsw:space": "cosine"}
+        )
+        # Route through the document index once the library holds at least
+        # hierarchical_min_documents documents; 0 top documents disables routing
+        self.hierarchical_top_docs = int(os.getenv("HIERARCHICAL_TOP_DOCS", "50"))
+        self.hierarchical_min_documents = int(os.getenv("HIERARCHICAL_MIN_DOCUMENTS", "1000"))
+        
+        # Small-to-big retrieval: sentence-window children of each chunk are
+        # embedded and searched, and hits are expanded back to parent text
+        self.child_collection = self.client.get_or_create_collection(
+            name="child_chunks",
+            metadata={"hnsw:space": "cosine"}
+        )
+        self.small_to_big = os.getenv("SMALL_TO_BIG", "true").lower() == "true"
+        # Words of parent text added on each side of a child hit; "parent" expands to the whole chunk
+        context_words = os.getenv("SMALL_TO_BIG_CONTEXT_WORDS", "150")
+        self.context_words = None if context_words == "parent" else int(context_words)
+        # Search stays on whole chunks until every document has children;
+        # Reconciler._backfill_children sets this for existing libraries
+        self.child_index_ready = self.collection.count() == 0
+        
         logger.info(f"Initialized vector store at {db_path}")
     
-    def add_document(self, document: Document) -> bool:
+    def add_document(self, document: Document, batch_size: int = 64) -> bool:
         """
         Add a document and its chunks to the vector store.
+        Chunks are embedded and written in batches so only one batch of
+        embeddings is held in memory at a time.
         """
         try:
-            # Prepare data for ChromaDB
-            chunk_texts = [chunk.content for chunk in document.chunks]
-            chunk_ids = [chunk.id for chunk in document.chunks]
+            for start in range(0, len(document.chunks), batch_size):
+                self.add_chunks(
+                    document.id, document.name, document.file_type,
+                    document.chunks[start:start + batch_size]
+                )
+            self.index_document(document.id)
             
-            # Generate embeddings
-            embeddings = self.embedding_model.encode(chunk_texts).tolist()
+            logger.info(f"Added document {document.name} with {len(document.chunks)} chunks to vector store")
+            return True
             
-            # Prepare metadata for each chunk
-            metadatas = []
-            for chunk in document.chunks:
+        except Exception as e:
+            logger.error(f"Error adding document to vector store: {str(e)}")
+            return False
+    
+    def add_chunks(self, document_id: str, document_name: str, file_type: str, chunks: List[DocumentChunk]):
+        """
+        Embed and add one batch of chunks. Raises on failure so callers can
+        roll back the chunks already written for the document.
+        """
+        if not chunks:
+            return
+        
+        # Prepare data for ChromaDB
+        chunk_texts = [chunk.content for chunk in chunks]
+        chunk_ids = [chunk.id for chunk in chunks]
+        
+        # Generate embeddings
+        embeddings = self.embedding_model.encode(chunk_texts).tolist()
+        
+        # Prepare metadata for each chunk
+        metadatas = [self._chunk_metadata(document_id, document_name, file_type, chunk) for chunk in chunks]
+        
+        # Add to collection
+        self.collection.add(
+            embeddings=embeddings,
+            documents=chunk_texts,
+            metadatas=metadatas,
+            ids=chunk_ids
+        )
+        
+        if self.small_to_big:
+            self._add_children(document_id, document_name, file_type, chunks)
+    
+    @staticmethod
+    def _chunk_metadata(document_id: str, document_name: str, file_type: str, chunk: DocumentChunk) -> Dict:
+        metadata = {
+            "document_id": document_id,
+            "document_name": document_name,
+            "chunk_index": chunk.chunk_index,
+            "start_char": chunk.start_char,
+            "end_char": chunk.end_char,
+            "file_type": file_type
+        }
+        # Chroma metadata values cannot be None, nor lists
+        if chunk.page_start is not None:
+            metadata["page_start"] = chunk.page_start
+            metadata["page_end"] = chunk.page_end
+            if chunk.page_breaks is not None:
+                metadata["page_breaks"] = ",".join(map(str, chunk.page_breaks))
+        return metadata
+    
+    def _add_children(self, document_id: str, document_name: str, file_type: str, chunks: List[DocumentChunk]):
+        """
+        Embed and add the small-to-big children of a batch of chunks. Child
+        offsets are absolute, in the same character space as the chunks'.
+        """
+        child_ids, child_texts, metadatas = [], [], []
+        for chunk in chunks:
+            words = chunk.content.split()
+            starts = _word_starts(words)
+            for n, (first, last) in enumerate(PDFProcessor.child_spans(words, chunk.chunk_index)):
+                child_ids.append(f"{chunk.id}:{n}")
+                child_texts.append(" ".join(words[first:last]))
                 metadata = {
-                    "document_id": document.id,
-                    "document_name": document.name,
+                    "document_id": document_id,
+                    "document_name": document_name,
+                    "parent_id": chunk.id,
                     "chunk_index": chunk.chunk_index,
-                    "start_char": chunk.start_char,
-                    "end_char": chunk.end_char,
-                    "file_type": document.file_type
+                    "word_start": first,
+                    "word_end": last,
+                    "start_char": chunk.start_char + starts[first],
+                    "end_char": chunk.start_char + starts[last - 1] + len(words[last - 1]),
+                    "file_type": file_type
                 }
+                if chunk.page_start is not None:
+                    metadata["page_start"] = chunk.page_start
+                    metadata["page_end"] = chunk.page_end
                 metadatas.append(metadata)
-            
-            # Add to collection
-            self.collection.add(
-                embeddings=embeddings,
-                documents=chunk_texts,
+        
+        if child_ids:
+            self.child_collection.add(
+                embeddings=self.embedding_model.encode(child_texts).tolist(),
+                documents=child_texts,
                 metadatas=metadatas,
-                ids=chunk_ids
+                ids=child_ids
             )
+    
+    def index_children(self, document_id: str, batch_size: int = 64) -> bool:
+        """
+        (Re)build a document's children from the chunk text in the vector
+        store, for documents indexed before small-to-big retrieval.
+        """
+        results = self.collection.get(where={"document_id": document_id}, include=["metadatas"], limit=1)
+        if not results['ids']:
+            return False
+        
+        self.child_collection.delete(where={"document_id": document_id})
+        chunks = self.get_document_chunks(document_id)
+        metadata = results['metadatas'][0]
+        for start in range(0, len(chunks), batch_size):
+            self._add_children(document_id, metadata['document_name'], metadata['file_type'],
+                               chunks[start:start + batch_size])
+        return True
+    
+    def get_document_chunks(self, document_id: str) -> List[DocumentChunk]:
+        """
+        A document's chunks, with their text, as stored in the vector store,
+        in chunk order.
+        """
+        results = self.collection.get(where={"document_id": document_id}, include=["documents", "metadatas"])
+        chunks = [
+            DocumentChunk(
+                id=chunk_id,
+                document_id=document_id,
+                content=content,
+                chunk_index=metadata['chunk_index'],
+                start_char=metadata['start_char'],
+                end_char=metadata['end_char'],
+                page_start=metadata.get('page_start'),
+                page_end=metadata.get('page_end'),
+                page_breaks=_page_breaks(metadata)
+            )
+            for chunk_id, content, metadata in zip(results['ids'], results['documents'], results['metadatas'])
+        ]
+        return sorted(chunks, key=lambda c: c.chunk_index)
+    
+    def apply_version(
+        self,
+        document_id: str,
+        document_name: str,
+        file_type: str,
+        chunks: List[DocumentChunk],
+        reused: Dict[str, DocumentChunk],
+        batch_size: int = 64
+    ):
+        """
+        Bring a document's vectors in line with a new version planned by
+        PDFProcessor.plan_new_version. Only chunks not in `reused` are
+        embedded; carried-over chunks and their children are moved to their
+        new offsets with metadata updates, and chunks the new version no
+        longer has are deleted last.
+        
+        New chunks are removed again if anything fails before the deletion,
+        leaving the previous version as it was. Raises on failure.
+        """
+        added = [chunk for chunk in chunks if chunk.id not in reused]
+        keep_ids = {chunk.id for chunk in chunks}
+        removed = [chunk_id for chunk_id in self.collection.get(where={"document_id": document_id}, include=[])['ids']
+                   if chunk_id not in keep_ids]
+        moved = [
+            chunk for chunk in chunks
+            if chunk.id in reused and
+            (chunk.chunk_index, chunk.start_char, chunk.page_start, chunk.page_end, chunk.page_breaks) !=
+            (reused[chunk.id].chunk_index, reused[chunk.id].start_char, reused[chunk.id].page_start,
+             reused[chunk.id].page_end, reused[chunk.id].page_breaks)
+        ]
+        # A chunk that becomes, or stops being, the first one gains or loses
+        # its overlap words, so its children must be rebuilt
+        rechild = [chunk for chunk in moved if (chunk.chunk_index == 0) != (reused[chunk.id].chunk_index == 0)]
+        
+        applied = moved_children = False
+        try:
+            for start in range(0, len(added), batch_size):
+                self.add_chunks(document_id, document_name, file_type, added[start:start + batch_size])
             
-            logger.info(f"Added document {document.name} with {len(document.chunks)} chunks to vector store")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error adding document to vector store: {str(e)}")
+            if moved:
+                self.collection.update(
+                    ids=[chunk.id for chunk in moved],
+                    metadatas=[self._chunk_metadata(document_id, document_name, file_type, chunk) for chunk in moved]
+                )
+                applied = True
+                self._move_children(moved, reused)
+                moved_children = True
+            if rechild:
+                self.child_collection.delete(where={"parent_id": {"$in": [chunk.id for chunk in rechild]}})
+                if self.small_to_big:
+                    for start in range(0, len(rechild), batch_size):
+                        self._add_children(document_id, document_name, file_type, rechild[start:start + batch_size])
+        except Exception:
+            if added:
+                self.delete_chunks([chunk.id for chunk in added])
+            if applied:
+                # Put carried-over chunks back where the previous version had them
+                previous = [reused[chunk.id] for chunk in moved]
+                self.collection.update(
+                    ids=[chunk.id for chunk in previous],
+                    metadatas=[self._chunk_metadata(document_id, document_name, file_type, chunk) for chunk in previous]
+                )
+                if moved_children:
+                    self._move_children(previous, {chunk.id: chunk for chunk in moved})
+            raise
+        
+        self.delete_chunks(removed)
+        self.index_document(document_id)
+        logger.info(
+            f"Applied new version of document {document_id}: {len(added)} chunks embedded, "
+            f"{len(moved)} moved, {len(removed)} deleted"
+        )
+    
+    def _move_children(self, chunks: List[DocumentChunk], previous: Dict[str, DocumentChunk]):
+        """
+        Shift the children of moved chunks by their parent's change in offset.
+        """
+        by_id = {chunk.id: chunk for chunk in chunks}
+        results = self.child_collection.get(where={"parent_id": {"$in": list(by_id)}}, include=["metadatas"])
+        if not results['ids']:
+            return
+        metadatas = []
+        for metadata in results['metadatas']:
+            chunk = by_id[metadata['parent_id']]
+            offset = chunk.start_char - previous[chunk.id].start_char
+            metadata = dict(metadata, chunk_index=chunk.chunk_index,
+                            start_char=metadata['start_char'] + offset, end_char=metadata['end_char'] + offset)
+            if chunk.page_start is not None:
+                metadata["page_start"] = chunk.page_start
+                metadata["page_end"] = chunk.page_end
+            metadatas.append(metadata)
+        self.child_collection.update(ids=results['ids'], metadatas=metadatas)
+    
+    def count_children(self, document_id: str) -> int:
+        results = self.child_collection.get(where={"document_id": document_id}, include=[])
+        return len(results['ids'])
+    
+    @staticmethod
+    def _unit_rows(embeddings) -> np.ndarray:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    
+    def index_document(self, document_id: str) -> bool:
+        """
+        (Re)compute a document's routing vector: the normalized mean of its
+        chunk embeddings. Call once all of the document's chunks are stored.
+        """
+        results = self.collection.get(where={"document_id": document_id}, include=["embeddings", "metadatas"])
+        if not results['ids']:
+            self.delete_document_vectors([document_id])
             return False
+        
+        pooled = self._unit_rows(results['embeddings']).mean(axis=0)
+        pooled /= max(np.linalg.norm(pooled), 1e-12)
+        self.document_index.upsert(
+            ids=[document_id],
+            embeddings=[pooled.tolist()],
+            metadatas=[{
+                "document_id": document_id,
+                "document_name": results['metadatas'][0]['document_name'],
+                "chunk_count": len(results['ids'])
+            }]
+        )
+        return True
+    
+    def rebuild_document_index(self, page_size: int = 1000) -> int:
+        """
+        Recompute every routing vector in one pass over the chunk collection,
+        without any model inference. Used to backfill libraries indexed
+        before hierarchical retrieval existed.
+        """
+        sums: Dict[str, np.ndarray] = {}
+        counts: Dict[str, int] = {}
+        names: Dict[str, str] = {}
+        offset = 0
+        while True:
+            page = self.collection.get(offset=offset, limit=page_size, include=["embeddings", "metadatas"])
+            if not page['ids']:
+                break
+            offset += len(page['ids'])
+            for vector, metadata in zip(self._unit_rows(page['embeddings']), page['metadatas']):
+                doc_id = metadata['document_id']
+                if doc_id in sums:
+                    sums[doc_id] += vector
+                else:
+                    sums[doc_id] = vector.copy()
+                    names[doc_id] = metadata['document_name']
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+        
+        doc_ids = list(sums)
+        for start in range(0, len(doc_ids), page_size):
+            batch = doc_ids[start:start + page_size]
+            pooled = self._unit_rows([sums[doc_id] for doc_id in batch])
+            self.document_index.upsert(
+                ids=batch,
+                embeddings=pooled.tolist(),
+                metadatas=[{"document_id": d, "document_name": names[d], "chunk_count": counts[d]} for d in batch]
+            )
+        
+        stale = [doc_id for doc_id in self.document_index.get(include=[])['ids'] if doc_id not in sums]
+        self.delete_document_vectors(stale)
+        logger.info(f"Rebuilt document index: {len(doc_ids)} documents, {len(stale)} stale entries removed")
+        return len(doc_ids)
     
-    def search(self, query: str, n_results: int = 5, document_ids: Optional[List[str]] = None) -> List[SourceInfo]:
+    def has_document_vector(self, document_id: str) -> bool:
+        return bool(self.document_index.get(ids=[document_id], include=[])['ids'])
+    
+    def get_document_vector_count(self) -> int:
+        return self.document_index.count()
+    
+    def delete_document_vectors(self, document_ids: List[str]):
+        if document_ids:
+            self.document_index.delete(ids=list(document_ids))
+    
+    def route_documents(
+        self,
+        query_embedding: List[float],
+        document_ids: Optional[List[str]] = None,
+        top_documents: Optional[int] = None
+    ) -> Optional[List[str]]:
+        """
+        Return the `top_documents` documents whose routing vectors are nearest
+        the query, or None when the chunk search should stay flat: routing
+        disabled, the library below hierarchical_min_documents (unless
+        top_documents is given explicitly), or a document filter that is
+        already no larger than the route.
+        """
+        top = self.hierarchical_top_docs if top_documents is None else top_documents
+        if top <= 0 or (document_ids and len(document_ids) <= top):
+            return None
+        if top_documents is None and self.document_index.count() < self.hierarchical_min_documents:
+            return None
+        
+        results = self.document_index.query(
+            query_embeddings=[query_embedding],
+            n_results=top,
+            where={"document_id": {"$in": document_ids}} if document_ids else None,
+            include=[]
+        )
+        return results['ids'][0] or None
+    
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a search query with the same model used for the chunks.
+        """
+        return self.embedding_model.encode([query]).tolist()[0]
+    
+    def search(
+        self,
+        query: str,
+        n_results: int = 5,
+        document_ids: Optional[List[str]] = None,
+        query_embedding: Optional[List[float]] = None,
+        mmr_lambda: Optional[float] = None,
+        fetch_k: Optional[int] = None,
+        top_documents: Optional[int] = None
+    ) -> List[SourceInfo]:
         """
         Search for relevant chunks based on query.
+        Pass query_embedding to reuse an embedding computed by the caller.
+        
+        With mmr_lambda set, `fetch_k` candidates (default 4 * n_results)
+        are retrieved and n_results of them chosen by maximal marginal
+        relevance; 1.0 is pure relevance, lower values favour diversity.
+        
+        Large libraries are searched hierarchically: the query is first
+        routed to the nearest documents (see route_documents) and the chunk
+        search runs only inside them. top_documents overrides the configured
+        route size; 0 forces a flat search.
         """
         try:
             # Generate query embedding
-            query_embedding = self.embedding_model.encode([query]).tolist()[0]
+            if query_embedding is None:
+                query_embedding = self.embed_query(query)
+            
+            routed_ids = self.route_documents(query_embedding, document_ids, top_documents)
+            if routed_ids is not None:
+                document_ids = routed_ids
             
             # Prepare where clause for filtering by document IDs
             where_clause = None
             if document_ids:
                 where_clause = {"document_id": {"$in": document_ids}}
             
-            # Search in collection
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                where=where_clause,
-                include=["documents", "metadatas", "distances"]
-            )
+            if self.small_to_big and self.child_index_ready:
+                sources = self._search_small_to_big(query_embedding, n_results, where_clause, mmr_lambda, fetch_k)
+                logger.info(f"Search query '{query}' returned {len(sources)} expanded results")
+                return sources
+            
+            results = self._query(self.collection, query_embedding, n_results, where_clause, mmr_lambda, fetch_k)
             
             # Convert results to SourceInfo objects
             sources = []
             if results['documents'] and results['documents'][0]:
-                for i, (doc, metadata, distance) in enumerate(zip(
+                for i, (chunk_id, doc, metadata, distance) in enumerate(zip(
+                    results['ids'][0],
                     results['documents'][0],
                     results['metadatas'][0],
                     results['distances'][0]
@@ -107,7 +538,11 @@ class VectorStore:
                         document_id=metadata['document_id'],
                         document_name=metadata['document_name'],
                         chunk_content=doc,
-                        relevance_score=relevance_score
+                        relevance_score=relevance_score,
+                        chunk_id=chunk_id,
+                        chunk_index=metadata.get('chunk_index'),
+                        page_start=metadata.get('page_start'),
+                        page_end=metadata.get('page_end')
                     )
                     sources.append(source)
             
@@ -118,11 +553,251 @@ class VectorStore:
             logger.error(f"Error searching vector store: {str(e)}")
             return []
     
+    @staticmethod
+    def _query(collection, query_embedding: List[float], n_results: int, where_clause: Optional[Dict],
+               mmr_lambda: Optional[float], fetch_k: Optional[int]) -> Dict:
+        """
+        Nearest-neighbour query against `collection`, reordered and cut to
+        n_results by MMR when mmr_lambda is set.
+        """
+        use_mmr = mmr_lambda is not None
+        include = ["documents", "metadatas", "distances"]
+        if use_mmr:
+            include.append("embeddings")
+        
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=max(fetch_k or 4 * n_results, n_results) if use_mmr else n_results,
+            where=where_clause,
+            include=include
+        )
+        
+        if use_mmr and results['ids'] and results['ids'][0]:
+            order = mmr_select(
+                np.asarray(query_embedding, dtype=np.float32),
+                np.asarray(results['embeddings'][0], dtype=np.float32),
+                n_results,
+                mmr_lambda
+            )
+            for key in ('ids', 'documents', 'metadatas', 'distances'):
+                results[key] = [[results[key][0][i] for i in order]]
+        return results
+    
+    def _search_small_to_big(self, query_embedding: List[float], n_results: int, where_clause: Optional[Dict],
+                             mmr_lambda: Optional[float], fetch_k: Optional[int]) -> List[SourceInfo]:
+        """
+        Search children, expand each hit to `context_words` of surrounding
+        parent text (or the whole parent), and merge windows that overlap or
+        touch within a document. Returns the n_results best merged spans.
+        """
+        results = self._query(self.child_collection, query_embedding, n_results * self.CHILD_FANOUT,
+                              where_clause, mmr_lambda, fetch_k)
+        if not results['ids'] or not results['ids'][0]:
+            return []
+        hits = list(zip(results['metadatas'][0], results['distances'][0]))
+        
+        parent_ids = list(dict.fromkeys(metadata['parent_id'] for metadata, _ in hits))
+        stored = self.collection.get(ids=parent_ids, include=["documents", "metadatas"])
+        parents = {
+            chunk_id: (content, metadata, content.split())
+            for chunk_id, content, metadata in zip(stored['ids'], stored['documents'], stored['metadatas'])
+        }
+        
+        # Context windows per document as [start_char, end_char, distance, parent ids]
+        windows: Dict[str, List[list]] = {}
+        for metadata, distance in hits:
+            parent = parents.get(metadata['parent_id'])
+            if parent is None:
+                continue
+            _, parent_metadata, words = parent
+            first, last = 0, len(words)
+            if self.context_words is not None:
+                first = max(metadata['word_start'] - self.context_words, 0)
+                last = min(metadata['word_end'] + self.context_words, len(words))
+            starts = _word_starts(words)
+            base = parent_metadata['start_char']
+            windows.setdefault(metadata['document_id'], []).append([
+                base + starts[first], base + starts[last - 1] + len(words[last - 1]), distance, [metadata['parent_id']]
+            ])
+        
+        spans = []
+        for document_windows in windows.values():
+            document_windows.sort(key=lambda w: w[0])
+            merged = [document_windows[0]]
+            for window in document_windows[1:]:
+                current = merged[-1]
+                # Words are separated by one space, so a window starting one character after
+                # the previous one ends is adjacent text
+                if window[0] <= current[1] + 1:
+                    current[1] = max(current[1], window[1])
+                    current[2] = min(current[2], window[2])
+                    current[3] = current[3] + [p for p in window[3] if p not in current[3]]
+                else:
+                    merged.append(window)
+            spans.extend(merged)
+        spans.sort(key=lambda w: w[2])
+        
+        # A span is identified by its first parent and its offsets, which
+        # get_chunk serves
+        sources = []
+        for start, end, distance, span_parents in spans[:n_results]:
+            span_parents = [parents[p][:2] + (p,) for p in span_parents]
+            span_parents.sort(key=lambda parent: parent[1]['start_char'])
+            text, page_start, page_end = self._span([parent[:2] for parent in span_parents], start, end)
+            first_metadata = span_parents[0][1]
+            sources.append(SourceInfo(
+                document_id=first_metadata['document_id'],
+                document_name=first_metadata['document_name'],
+                chunk_content=text,
+                relevance_score=max(0, 1 - distance),
+                chunk_id=span_parents[0][2],
+                chunk_index=first_metadata['chunk_index'],
+                page_start=page_start,
+                page_end=page_end,
+                start_char=start,
+                end_char=end
+            ))
+        return sources
+    
+    @classmethod
+    def _span(cls, parents: List[Tuple[str, Dict]], start: int, end: int) -> Tuple[str, Optional[int], Optional[int]]:
+        """
+        Text and page range of the document between absolute offsets start
+        and end, from the (content, metadata) of the chunks covering it in
+        order. Pages come from the words at either end of the span; chunks
+        indexed without page breaks fall back to their own page range.
+        """
+        text = cls._stitch([(metadata['start_char'], content) for content, metadata in parents], start, end)
+        page_start, page_end = cls._page_at(parents, start), cls._page_at(parents, end - 1)
+        if page_start is None or page_end is None:
+            pages = [metadata for _, metadata in parents if metadata.get('page_start') is not None]
+            page_start = min(m['page_start'] for m in pages) if pages else None
+            page_end = max(m['page_end'] for m in pages) if pages else None
+        return text, page_start, page_end
+    
+    @staticmethod
+    def _page_at(parents: List[Tuple[str, Dict]], offset: int) -> Optional[int]:
+        """Page of the word at document offset `offset`, if a chunk covering it records its page breaks."""
+        for content, metadata in parents:
+            if not metadata['start_char'] <= offset < metadata['end_char']:
+                continue
+            page_breaks = _page_breaks(metadata)
+            if metadata.get('page_start') is None or page_breaks is None:
+                return None
+            word = bisect.bisect_right(_word_starts(content.split()), offset - metadata['start_char']) - 1
+            return PDFProcessor.page_in_chunk(metadata['page_start'], page_breaks, word)
+        return None
+    
+    @staticmethod
+    def _stitch(parents: List[Tuple[int, str]], start: int, end: int) -> str:
+        """
+        Text of the document between absolute offsets start and end, pieced
+        together from overlapping (start_char, content) parents in order.
+        """
+        pieces = []
+        covered = start
+        for parent_start, content in parents:
+            parent_end = parent_start + len(content)
+            if parent_end <= covered:
+                continue
+            if parent_start > covered:
+                # Adjacent parents' windows are joined by the separating space
+                pieces.append(" ")
+                covered = parent_start
+            pieces.append(content[covered - parent_start:min(end, parent_end) - parent_start])
+            covered = min(end, parent_end)
+            if covered >= end:
+                break
+        return "".join(pieces)
+    
+    @staticmethod
+    def _to_chunk_info(chunk_id: str, content: str, metadata: Dict) -> ChunkInfo:
+        return ChunkInfo(
+            id=chunk_id,
+            document_id=metadata['document_id'],
+            document_name=metadata['document_name'],
+            chunk_index=metadata['chunk_index'],
+            content=content,
+            page_start=metadata.get('page_start'),
+            page_end=metadata.get('page_end'),
+            start_char=metadata.get('start_char'),
+            end_char=metadata.get('end_char')
+        )
+    
+    def get_chunk(self, chunk_id: str, neighbors: int = 0, start: Optional[int] = None,
+                  end: Optional[int] = None) -> Optional[Tuple[ChunkInfo, List[ChunkInfo]]]:
+        """
+        Fetch a single chunk's full text, plus up to `neighbors` chunks on
+        either side of it in the same document (ordered by chunk index).
+        
+        With start and end, fetch instead the small-to-big span between those
+        document offsets that begins in this chunk, as returned by search:
+        its text, stitched from every chunk it covers, and its page range.
+        Neighbours are then the chunks either side of the covered ones.
+        Raises ValueError if the span does not begin in the chunk.
+        """
+        try:
+            results = self.collection.get(ids=[chunk_id], include=["documents", "metadatas"])
+            if not results['ids']:
+                return None
+            
+            metadata = results['metadatas'][0]
+            first_index = last_index = metadata['chunk_index']
+            if start is None:
+                chunk = self._to_chunk_info(chunk_id, results['documents'][0], metadata)
+            else:
+                if not metadata['start_char'] <= start < min(end, metadata['end_char']):
+                    raise ValueError("Span does not begin in this chunk")
+                covering = self.collection.get(
+                    where={"$and": [
+                        {"document_id": metadata['document_id']},
+                        {"start_char": {"$lt": end}},
+                        {"end_char": {"$gt": start}}
+                    ]},
+                    include=["documents", "metadatas"]
+                )
+                parents = sorted(zip(covering['documents'], covering['metadatas']), key=lambda p: p[1]['start_char'])
+                text, page_start, page_end = self._span(parents, start, end)
+                chunk = self._to_chunk_info(chunk_id, text, metadata).copy(update={
+                    "page_start": page_start, "page_end": page_end,
+                    "start_char": start, "end_char": min(end, parents[-1][1]['end_char'])
+                })
+                last_index = max(p[1]['chunk_index'] for p in parents)
+            
+            neighbor_chunks = []
+            if neighbors > 0:
+                wanted = [i for i in range(first_index - neighbors, first_index) if i >= 0]
+                wanted += list(range(last_index + 1, last_index + neighbors + 1))
+                nearby = self.collection.get(
+                    where={"$and": [
+                        {"document_id": metadata['document_id']},
+                        {"chunk_index": {"$in": wanted}}
+                    ]},
+                    include=["documents", "metadatas"]
+                ) if wanted else {'ids': [], 'documents': [], 'metadatas': []}
+                neighbor_chunks = sorted(
+                    (self._to_chunk_info(cid, doc, meta) for cid, doc, meta in zip(
+                        nearby['ids'], nearby['documents'], nearby['metadatas']
+                    )),
+                    key=lambda c: c.chunk_index
+                )
+            
+            return chunk, neighbor_chunks
+            
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Error fetching chunk {chunk_id}: {str(e)}")
+            return None
+    
     def delete_document(self, document_id: str) -> bool:
         """
         Delete all chunks belonging to a document from the vector store.
         """
         try:
+            self.delete_document_vectors([document_id])
+            self.child_collection.delete(where={"document_id": document_id})
+            
             # Get all chunk IDs for this document
             results = self.collection.get(
                 where={"document_id": document_id},
@@ -144,6 +819,54 @@ class VectorStore:
             logger.error(f"Error deleting document from vector store: {str(e)}")
             return False
     
+    def delete_documents(self, document_ids: List[str]) -> bool:
+        """
+        Delete all chunks belonging to any of the given documents in a single call.
+        """
+        if not document_ids:
+            return True
+        try:
+            self.collection.delete(
+                where={"document_id": {"$in": list(document_ids)}}
+            )
+            self.delete_document_vectors(document_ids)
+            self.child_collection.delete(
+                where={"document_id": {"$in": list(document_ids)}}
+            )
+            logger.info(f"Deleted chunks for {len(document_ids)} documents")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error bulk deleting documents from vector store: {str(e)}")
+            return False
+
+    def count_chunks(self, document_id: str) -> int:
+        """
+        Count the chunks stored for a document without fetching their data.
+        """
+        results = self.collection.get(where={"document_id": document_id}, include=[])
+        return len(results['ids'])
+    
+    def get_chunk_count(self) -> int:
+        return self.collection.count()
+    
+    def scan_chunks(self, offset: int, limit: int) -> List[Tuple[str, str]]:
+        """
+        Return (chunk_id, document_id) pairs for one page of the collection.
+        """
+        results = self.collection.get(offset=offset, limit=limit, include=["metadatas"])
+        return [(chunk_id, metadata.get('document_id')) for chunk_id, metadata in zip(results['ids'], results['metadatas'])]
+    
+    def delete_chunks(self, chunk_ids: List[str]) -> bool:
+        try:
+            if chunk_ids:
+                self.collection.delete(ids=list(chunk_ids))
+                self.child_collection.delete(where={"parent_id": {"$in": list(chunk_ids)}})
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting chunks from vector store: {str(e)}")
+            return False
+    
     def get_document_count(self) -> int:
         """
         Get the total number of unique documents in the vector store.
@@ -193,15 +916,16 @@ class VectorStore:
         Check the health of the vector store.
         """
         try:
-            # Test basic operations
+            # Test basic operations; counts only, so this stays cheap on a
+            # large corpus (one routing vector per indexed document)
             chunk_count = self.collection.count()
-            document_count = self.get_document_count()
+            document_count = self.get_document_vector_count()
             
             return {
                 "status": "healthy",
                 "chunk_count": chunk_count,
                 "document_count": document_count,
-                "embedding_model": "all-MiniLM-L6-v2"
+                "embedding_model": self.embedding_model.name
             }
             
         except Exception as e:
@@ -223,6 +947,16 @@ class VectorStore:
                 name="documents",
                 metadata={"hnsw:space": "cosine"}
             )
+            self.client.delete_collection(name="document_vectors")
+            self.document_index = self.client.get_or_create_collection(
+                name="document_vectors",
+                metadata={"hnsw:space": "cosine"}
+            )
+            self.client.delete_collection(name="child_chunks")
+            self.child_collection = self.client.get_or_create_collection(
+                name="child_chunks",
+                metadata={"hnsw:space": "cosine"}
+            )
             
             logger.info("Cleared all documents from vector store")
             return True
@@ -6,95 +6,73 @@ Script to diagnose and fix document processing issues in Able2
 
 import os
 import sys
-import json
 from dotenv import load_dotenv
 
-# Add current directory to path to import our modules
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Backend modules import each other by bare name, so put the backend on the path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
 
-from backend.document_manager import DocumentManager
-from backend.vector_store import VectorStore
-from backend.document_processor import PDFProcessor
+from document_manager import DocumentManager
+from vector_store import VectorStore
+from document_processor import PDFProcessor
+from reconciler import Reconciler
 
 def main():
     # Load environment variables
     load_dotenv('backend/.env')
-    
+
     # Initialize components
     sources_path = './sources'
     vector_db_path = './data/vectordb'
-    
+
     print("🔍 Diagnosing Able2 document processing...")
     print()
-    
+
+    doc_manager = None
     try:
         vector_store = VectorStore(vector_db_path)
         pdf_processor = PDFProcessor(sources_path)
         doc_manager = DocumentManager(sources_path, vector_store, pdf_processor)
-        
-        # Check metadata file
-        print("📄 Document Metadata:")
-        with open('document_metadata.json', 'r') as f:
-            metadata = json.load(f)
-        
-        for doc_id, doc_info in metadata.items():
-            print(f"  • {doc_info['name']}")
-            print(f"    - ID: {doc_id}")
-            print(f"    - Chunks: {doc_info['chunk_count']}")
-            print(f"    - File exists: {os.path.exists(doc_info['file_path'])}")
-            print()
-        
-        # Check vector store
-        print("🔍 Vector Store Contents:")
-        vector_docs = vector_store.get_all_documents()
-        print(f"  Documents in vector store: {len(vector_docs)}")
-        for doc in vector_docs:
-            print(f"  • {doc}")
+
+        print(f"📄 Documents in metadata: {doc_manager.get_document_count()}")
+        print(f"🔍 Chunks in vector store: {vector_store.get_chunk_count()}")
         print()
-        
-        # Find documents with 0 chunks and reprocess them
-        print("🔧 Fixing documents with 0 chunks...")
-        for doc_id, doc_info in metadata.items():
-            if doc_info['chunk_count'] == 0:
-                print(f"  ⚠️  Found document with 0 chunks: {doc_info['name']}")
-                
-                if os.path.exists(doc_info['file_path']):
-                    print(f"  🔄 Reprocessing {doc_info['name']}...")
-                    
-                    # Remove from vector store if exists
-                    vector_store.delete_document(doc_id)
-                    
-                    # Reprocess the document
-                    document = pdf_processor.process_pdf(doc_info['file_path'], doc_info['name'])
-                    
-                    # Add to vector store
-                    if vector_store.add_document(document):
-                        print(f"  ✅ Successfully reprocessed {doc_info['name']} with {len(document.chunks)} chunks")
-                        
-                        # Update metadata
-                        doc_manager.documents_db[doc_id] = document
-                        doc_manager._save_metadata()
-                    else:
-                        print(f"  ❌ Failed to add {doc_info['name']} to vector store")
-                else:
-                    print(f"  ❌ File not found: {doc_info['file_path']}")
-        
+
+        # With no grace period, vectors of uploads still in flight would look
+        # orphaned, so only sweep while no server is using the same data
+        live_workers = doc_manager.other_live_workers()
+        if live_workers:
+            print(f"❌ {live_workers} running server worker(s) share this data; stop the server and try again.")
+            print("   (The server repairs documents incrementally on its own.)")
+            sys.exit(1)
+
+        # The server runs these checks incrementally; here we sweep everything at once
+        print("🔧 Checking files, vectors and manifest...")
+        reconciler = Reconciler(doc_manager, orphan_grace=0)
+        totals = reconciler.run_full_pass()
+
+        print(f"  • Documents verified: {totals.get('verified', 0)}")
+        print(f"  • Documents with rebuilt vectors: {totals.get('repaired', 0)}")
+        print(f"  • Documents with missing source files: {totals.get('missing_files', 0)}")
+        print(f"  • Orphaned chunks removed: {totals.get('orphan_chunks', 0)}")
+        print(f"  • Stale manifest entries removed: {totals.get('stale_manifest', 0)}")
         print()
         print("✅ Document processing diagnosis and repair complete!")
-        
+
         # Final verification
         print("🔍 Final Status:")
-        with open('document_metadata.json', 'r') as f:
-            updated_metadata = json.load(f)
-        
-        for doc_id, doc_info in updated_metadata.items():
-            status = "✅" if doc_info['chunk_count'] > 0 else "❌"
-            print(f"  {status} {doc_info['name']}: {doc_info['chunk_count']} chunks")
-        
+        for summary in doc_manager.get_all_documents():
+            manifest = doc_manager.store.get_manifest(summary.id) or {}
+            status = manifest.get('status', 'unknown')
+            icon = "✅" if status == 'ok' else "❌"
+            print(f"  {icon} {summary.name}: {manifest.get('chunk_count', 0)} chunks ({status})")
+
     except Exception as e:
         print(f"❌ Error during diagnosis: {str(e)}")
         import traceback
         traceback.print_exc()
+    finally:
+        if doc_manager is not None:
+            doc_manager.unregister_worker()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,11 +1,44 @@
-import React from 'react';
+import React, { useState } from 'react';
+import { getChunk } from '../utils/api';
 
 const SourceCard = ({ source }) => {
+  const [fullText, setFullText] = useState(null);
+  const [isExpanded, setIsExpanded] = useState(false);
+  const [isLoadingChunk, setIsLoadingChunk] = useState(false);
+
   const truncateText = (text, maxLength = 200) => {
+    if (!text) return '';
     if (text.length <= maxLength) return text;
     return text.substring(0, maxLength) + '...';
   };
 
+  // Compact sources carry only a snippet; the full text is fetched on demand
+  const toggleFullText = async () => {
+    if (isExpanded) {
+      setIsExpanded(false);
+      return;
+    }
+    if (fullText === null && !source.chunk_content) {
+      setIsLoadingChunk(true);
+      try {
+        const data = await getChunk(source.chunk_id, {
+          start: source.start_char,
+          end: source.end_char,
+        });
+        setFullText(data.chunk.content);
+      } catch (error) {
+        return;
+      } finally {
+        setIsLoadingChunk(false);
+      }
+    }
+    setIsExpanded(true);
+  };
+
+  const canExpand = source.chunk_content
+    ? source.chunk_content.length > 200
+    : Boolean(source.chunk_id);
+
   const formatRelevanceScore = (score) => {
     return Math.round(score * 100);
   };
@@ -18,6 +51,13 @@ const SourceCard = ({ source }) => {
           <span className="text-sm font-semibold text-able-textPrimary">
             {source.document_name}
           </span>
+          {source.page_start && (
+            <span className="text-xs text-able-textSecondary">
+              {source.page_start === source.page_end
+                ? `p. ${source.page_start}`
+                : `pp. ${source.page_start}-${source.page_end}`}
+            </span>
+          )}
         </div>
         <div className="bg-able-primary text-white text-xs px-2 py-1 rounded font-medium">
           {formatRelevanceScore(source.relevance_score)}% relevant
@@ -25,8 +65,20 @@ const SourceCard = ({ source }) => {
       </div>
       
       <div className="text-small text-able-textSecondary leading-relaxed bg-gray-50 p-3 rounded-card border border-able-cardBorder">
-        {truncateText(source.chunk_content)}
+        {isExpanded
+          ? (fullText || source.chunk_content)
+          : truncateText(source.chunk_content || source.snippet)}
       </div>
+      
+      {canExpand && (
+        <button
+          onClick={toggleFullText}
+          disabled={isLoadingChunk}
+          className="mt-2 text-xs font-medium text-able-primary hover:underline disabled:opacity-50"
+        >
+          {isLoadingChunk ? 'Loading...' : isExpanded ? 'Show less' : 'Show full text'}
+        </button>
+      )}
     </div>
   );
 };
@@ -45,6 +45,16 @@ export const chatWithDocuments = async (question, documentIds = null) => {
   const response = await api.post('/chat', {
     question,
     document_ids: documentIds,
+    compact_sources: true,
+  });
+  return response.data;
+};
+
+// Small-to-big sources span several chunks; pass their start/end offsets
+// to get the span rather than the chunk it begins in
+export const getChunk = async (chunkId, { neighbors = 0, start, end } = {}) => {
+  const response = await api.get(`/chunks/${chunkId}`, {
+    params: { neighbors, start, end },
   });
   return response.data;
 };